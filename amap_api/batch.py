@@ -0,0 +1,184 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 多城市批量下载POI
+@Desc    :
+    1. 一次并发请求，获取所有城市的边界与范围（已保存在本地的城市直接读取）
+    2. 所有城市共用一个请求代理（同一个限额器与Key池），额度按Key统一计算
+    3. 各城市交替下载（每次一个方格），输出到各自的文件夹<out_dir>/<city>，并各自记录进度
+    4. 每下载一个方格，更新汇总的进度报告<out_dir>/progress.geodoer.json
+    5. 行政区边界默认保存到<out_dir>/boundary.geodoer.sqlite，重新运行时不再请求；可开启运行指标的日志与HTTP接口
+"""
+from amap_api import defines
+from amap_api import poi
+from amap_api import region
+from amap_api import utils
+from common import limiter
+
+import os
+import json
+import time
+
+batch_params = {
+    "key" : defines.AMAP_KEYS,    #一个Key，或多个Key（Key池），所有城市共用
+
+    # 城市：名称、citycode或adcode
+    "cities" : ["上海", "苏州", "330100"],
+
+    # 输出文件夹，每个城市输出到<out_dir>/<city>
+    "out_dir" : "batch_gcj02",
+
+    # 以下参数见poi.poi_params
+    "typenamecodes" : poi.poi_params["typenamecodes"],
+    "save_field" : poi.poi_params["save_field"],
+    "num_per_save" : 200,
+    "out_format" : "geojsonl",
+    "num_row" : 5,
+    "num_col" : 5,
+    "clip" : True,
+    "adaptive" : True,
+    "num_workers" : 4,
+    "http_cache" : "cache-http.geodoer",
+    "boundary_store" : None,    #None为<out_dir>/boundary.geodoer.sqlite
+    "dedup" : True,
+    "metrics_log" : None,
+    "metrics_port" : None
+}
+
+class AMapPOIBatch(object):
+    """多城市批量下载POI
+    :param key:         一个Key，或多个Key（Key池），所有城市共用
+    :param cities:      多个城市（名称、citycode或adcode）
+    :param out_dir:     输出文件夹，每个城市输出到<out_dir>/<city>
+    :param num_workers: 并发请求数
+    :param http_cache:  响应缓存的文件夹，None为不缓存
+    :param boundary_store: 行政区边界的本地存储（SQLite文件），已保存的城市不再请求行政区接口
+        None为<out_dir>/boundary.geodoer.sqlite，False为不保存
+    :param metrics_log:  下载时每METRICS_INTERVAL秒追加一行运行指标（所有城市共用）到此文件，None为不记录
+    :param metrics_port: 下载时开启Prometheus文本格式的HTTP接口（/metrics）的端口，None为不开启
+    :param poi_kwargs:  其他参数，见poi.AMapPOIAPI
+    """
+    BOUNDARY_STORE = "boundary.geodoer.sqlite"
+
+    def __init__(self, key, cities, out_dir="poi", num_workers=1, http_cache=None, boundary_store=None
+        , metrics_log=None, metrics_port=None, **poi_kwargs) -> None:
+        self.out_dir = out_dir
+        self.agent = utils.create_agent(key, num_workers, http_cache, poi.AMapPOIAPI.cache_ttl())
+        self.metrics_log = metrics_log
+        self.metrics_port = metrics_port
+
+        if boundary_store is None:
+            os.makedirs(out_dir, exist_ok=True)
+            boundary_store = os.path.join(out_dir, AMapPOIBatch.BOUNDARY_STORE)
+        elif boundary_store is False:
+            boundary_store = None
+
+        # 一次并发请求，获取所有城市的边界与范围
+        regionutil = region.AMapRegionAPI(key, agent=self.agent, boundary_store=boundary_store)
+        boundaries = regionutil.get_boundaries(cities)
+
+        self.tasks = {}     #city -> AMapPOIAPI
+        for city, boundary in zip(cities, boundaries):
+            if boundary is None:
+                print("未找到行政区{}，跳过".format(city))
+                continue
+
+            self.tasks[city] = poi.AMapPOIAPI(key, city
+                , out_dir = os.path.join(out_dir, str(city))
+                , num_workers = num_workers
+                , http_cache = http_cache
+                , agent = self.agent
+                , rect = region.AMapRegionAPI.boundary_to_rect(boundary)
+                , boundary = boundary
+                , **poi_kwargs
+            )
+
+    def start(self):
+        """开始下载：各城市交替，每次下载一个方格
+        """
+        start_time = time.time()
+        request_count = self.__total("request_count")
+
+        self.__start_metrics()
+        try:
+            active = [city for city, task in self.tasks.items() if not task.state["over"]]
+            while len(active)>0:
+                for city in list(active):
+                    task = self.tasks[city]
+                    if not task.step():
+                        task.finish()
+                        active.remove(city)
+                    self.report(start_time, request_count)
+
+            self.report(start_time, request_count)
+        finally:
+            self.agent.metrics.close()
+
+    def __start_metrics(self):
+        """开启运行指标的日志与HTTP接口（所有城市共用代理的运行指标）
+        """
+        if self.metrics_log is not None:
+            self.agent.metrics.start_log(self.metrics_log, poi.AMapPOIAPI.METRICS_INTERVAL)
+        if self.metrics_port is not None:
+            port = self.agent.metrics.serve(self.metrics_port)
+            print("运行指标：http://127.0.0.1:{}/metrics".format(port))
+
+    def report(self, start_time=None, request_count=0):
+        """汇总的进度报告，保存到<out_dir>/progress.geodoer.json
+        :param start_time:      此次运行的开始时间，用于计算请求速率
+        :param request_count:   此次运行开始时的请求数
+        :return: 进度报告
+        """
+        cities = {}
+        for city, task in self.tasks.items():
+            cities[city] = {
+                "over" : task.state["over"],
+                "grid" : [task.state["grid_cursor"], len(task.state["grid"])],   #[已完成的方格数, 方格数]
+                "poi_count" : task.state["poi_count"],
+                "request_count" : task.state["request_count"],
+                "split_count" : task.state["split_count"],
+                "dup_count" : task.state["dup_count"]
+            }
+
+        total = {name : self.__total(name) for name in ("poi_count", "request_count", "split_count", "dup_count")}
+        total["cities"] = [sum(city["over"] for city in cities.values()), len(cities)]
+        if start_time is not None:
+            elapsed = time.time() - start_time
+            total["elapsed"] = round(elapsed, 1)
+            total["requests_per_second"] = round((total["request_count"] - request_count) / max(elapsed, 1e-6), 2)
+
+        quota = {}
+        if self.agent.key_pool is not None:
+            for key, (used, limit, retired) in self.agent.key_pool.usage().items():
+                quota[f"...{key[-6:]}-{limiter.KeyPool.key_id(key)}"] = {"used" : used, "limit" : limit, "retired" : retired}
+
+        report = {
+            "time" : time.strftime("%Y-%m-%d %H:%M:%S"),
+            "total" : total,
+            "cities" : cities,
+            "quota" : quota,
+            "metrics" : self.agent.metrics.stats()     #所有城市共用的运行指标（见common.metrics）
+        }
+
+        if not os.path.exists(self.out_dir):
+            os.makedirs(self.out_dir)
+        with open(os.path.join(self.out_dir, "progress.geodoer.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+        print("[Progress] 城市{}/{}，POI {}个，请求{}次，今日额度已用{}".format(
+            total["cities"][0], total["cities"][1], total["poi_count"], total["request_count"],
+            sum(item["used"] for item in quota.values())
+        ))
+        return report
+
+    def __total(self, name):
+        return sum(task.state[name] for task in self.tasks.values())
+
+if __name__ == '__main__':
+    try:
+        batch = AMapPOIBatch(**batch_params)
+        batch.start()
+    except Exception as e:
+        print(f"Error: {e}")
+    pass
@@ -1,4 +1,10 @@
 
 AMAP_KEY = "e28ed3ab9b8b955626b7a0247d6cea68"
 #e28ed3ab9b8b955626b7a0247d6cea68
-#efdaa20612fea6092643acd3c1fd7756
\ No newline at end of file
+#efdaa20612fea6092643acd3c1fd7756
+
+# Key池：可填入多个Key，请求时选择余量最多的Key，额度用尽的Key自动停用
+AMAP_KEYS = [
+    AMAP_KEY
+    #,"efdaa20612fea6092643acd3c1fd7756"
+]
@@ -1,16 +1,23 @@
 from amap_api import defines
 from amap_api import region
 from amap_api import utils
-from common import urllibagent
+from common import sinks
+from common import idset
+from common import journal
+from common import workqueue
+from common import poibuffer
 
 import os
 import json
-import jsonpickle
+import math
+import time
+import socket
 
 import geopandas
+import shapely
 
 poi_params = {
-    "key" : defines.AMAP_KEY,
+    "key" : defines.AMAP_KEYS,    #一个Key，或多个Key（Key池）
 
     #输出路径（不要后缀名，程序会自动加json）
     "out_dir": "上海_gcj02",
@@ -56,22 +63,63 @@ poi_params = {
     # 每一次存储到文件的数据量
     "num_per_save" : 200,    #10页保存一次
 
+    # 输出格式
+    #geojsonl：追加写入同一个换行分隔的GeoJSON文件（<out_dir>/<city>.geojsonl）
+    #parquet：GeoParquet（<out_dir>/<city>.parquet、<city>-<n>.parquet），字段有类型，每次存储写一个新文件
+    #geojson：每次存储写一个新的GeoJSON文件
+    "out_format" : "geojsonl",
+
     # 将城市范围的矩形分成row_num行、col_num列的小矩阵
     #如果城市范围较大，划分的要尽可能大，不然可能会漏下载（因为一次参数最多有1000条）
     "num_row" : 5,
-    "num_col" : 5
+    "num_col" : 5,
+
+    # 按行政区边界裁剪网格：丢弃边界外（如海上）的方格，并以方格与边界的交集作为请求的多边形
+    "clip" : True,
+
+    # 自适应划分（四叉树）：某方格某类型的POI总数达到max_count时，将该方格四等分后再请求
+    #开启后num_row、num_col仅作为初始网格，可设得较小
+    "adaptive" : False,
+    "max_count" : 900,          #官方单次查询最多返回约1000条，留一些余量
+    "min_cell_size" : 0.002,    #方格边长（度）小于此值时不再划分
+
+    # 并发请求数（同时在途的请求数），所有请求共享同一个限额器
+    "num_workers" : 1,
+
+    # 响应缓存的文件夹：重新运行时，相同的请求直接从磁盘读取，不消耗额度。None为不缓存
+    "http_cache" : "cache-http.geodoer",
+
+    # 行政区边界的本地存储（SQLite文件）：获取过的城市边界保存在本地，之后不再请求行政区接口。None为不保存
+    "boundary_store" : "boundary.geodoer.sqlite",
+
+    # 按POI的id去重（相邻方格、不同类型会返回相同的POI）
+    "dedup" : True,
+
+    # 运行指标（请求速率、耗时分布、限额等待、每次请求的POI数、解析与保存耗时、重复率等）
+    #metrics_log：定期追加一行JSON到此文件，None为不记录；metrics_port：Prometheus文本格式的HTTP接口（/metrics）的端口，None为不开启
+    "metrics_log" : None,
+    "metrics_port" : None,
+
+    # 任务队列（SQLite文件）：由expand()分解为(方格, 类型, 页)任务，多个进程run_worker()共同下载。None为单进程start()
+    "queue" : None
 }
 
 class AMapPOIAPI(object):
     URL = 'https://restapi.amap.com/v3/place/polygon'
-    params = {}     #AMap POI Http Parameters
-    state = {}      #AMap POI Http State
-    dataset = {}    #AMap POI Http Result
+    CACHE_TTL = 7 * 24 * 60 * 60    #POI缓存7天
+    JOURNAL_FILE = "cache-journal.geodoer.jsonl"    #进度日志（位于out_dir中）
+    METRICS_INTERVAL = 60   #运行指标写入日志的间隔，单位：秒
+    MAX_RETRIES = 5         #请求失败（status不为'1'，如超出QPS）的页的重试次数
+    RETRY_BACKOFF = 1.0     #第一次重试的延迟，单位：秒，之后每次翻倍
+    PART_ROWS = 100000      #GeoParquet输出：每个文件的POI数，达到后关闭此文件、写入新文件
+    POIS_PER_REQUEST_BUCKETS = (0, 1, 5, 10, 15, 19, 20)   #每次请求的POI数的分桶（每页最多20个）
 
     """init(Class constructor)
     Download the AMap POI using HTTP
 
-    :param key:             your amap key(See the AMap's website and apply)
+    :param key:             your amap key(See the AMap's website and apply),
+                            or a list of keys. Each key has its own quota; requests go to the key
+                            with the most headroom, and exhausted keys are retired
     :param city:            your target city
     :param typenamecodes:   your target poi types(See AMap's POI category table)
                     a list of pair, pair is ('<typename>', '<typecode>')
@@ -84,7 +132,41 @@ class AMapPOIAPI(object):
     :param out_dir:         The path to the output folder
     :param num_row,num_col: the number of rows and columns in a city
     :param num_per_flush:   When the number of POIs reaches num_per_flush, the cache is flushed
-    :param load_cache:      If there is a cache, the state is loaded from the cache
+    :param out_format:      "geojsonl": append every flush to one newline-delimited GeoJSON file;
+                            "parquet": append every flush to a GeoParquet file with typed columns, as one row group.
+                            A file is closed (and becomes readable) every PART_ROWS POIs, then a new one is started;
+                            "geojson": write every flush to a new GeoJSON file
+    :param load_cache:      If there is a progress journal in out_dir, resume from it.
+                            Every page is journaled as it is parsed, so a crash loses at most the pages in flight.
+                            Otherwise a new job starts, and the previous output of the city in out_dir is removed
+    :param adaptive:        Adaptive quadtree tiling. A cell whose reported count reaches max_count
+                            is split into four and requested again (per type)
+    :param max_count:       The count at which a cell is considered saturated
+    :param min_cell_size:   Cells smaller than this (in degrees) are never split
+    :param num_workers:     The number of concurrent requests. The (cell, type) units of a grid cell
+                            and their pages are fanned out over a thread pool
+    :param http_cache:      The folder of the on-disk response cache (None to disable).
+                            Re-runs replay cached pages without spending quota
+    :param dedup:           Drop POIs whose id was already downloaded (in another cell or type).
+                            The ids are journaled, and the index is rebuilt on resume. In queue mode each
+                            worker only knows its own ids, so merge the outputs with
+                            post_processing.merge_dataset(dedup_field="id") to drop cross-worker duplicates
+    :param queue:           The SQLite work queue file (None to disable). expand() decomposes the job into
+                            (cell, type, page) tasks, and any number of processes sharing the file drain it
+                            with run_worker(). The queue holds the progress, so no journal is kept
+    :param agent:           A shared request agent (see utils.create_agent), so that several cities or APIs
+                            draw from one limiter and key pool. None to create one
+    :param rect:            The rect of the city (minlng, maxlng, minlat, maxlat). None to look it up
+    :param clip:            Clip the grid to the district boundary. Cells outside the boundary are dropped,
+                            and each cell is requested with its intersection with the boundary
+    :param boundary:        The district boundary (a shapely polygon), used with clip. None to look it up
+    :param boundary_store:  The local district boundary store (a SQLite file, see common.boundarystore).
+                            Looked-up boundaries are saved there and read back without a district request.
+                            None to disable
+    :param metrics_log:     Append the run metrics (see common.metrics) as a JSON line to this file
+                            every METRICS_INTERVAL seconds while running. None to disable
+    :param metrics_port:    Serve the run metrics in the Prometheus text format at http://127.0.0.1:<port>/metrics
+                            while running. None to disable
     """
     def __init__(self
         , key 
@@ -96,19 +178,68 @@ class AMapPOIAPI(object):
         , num_col = 4
         , num_per_save = 500
         , load_cache = True
+        , adaptive = False
+        , max_count = 900
+        , min_cell_size = 0.002
+        , num_workers = 1
+        , http_cache = None
+        , out_format = "geojson"
+        , dedup = True
+        , queue = None
+        , agent = None
+        , rect = None
+        , clip = False
+        , boundary = None
+        , boundary_store = None
+        , metrics_log = None
+        , metrics_port = None
         ):
-        
-        if load_cache and os.path.exists(self.__cache_file): #State cache, whether rollback
-            with open(self.__cache_file, encoding="utf-8") as f:
-                self = jsonpickle.decode(f.read())
-            pass    #Roll back the success
-        else:
-            self.__urllib = urllibagent.UrllibAgent(
-                self.__class__.__name__
-                ,urllibagent.RequestLimitsRule(50, 1)               #50/秒
-                ,urllibagent.RequestLimitsRule(30000, 24 * 60 * 60) #30000/天
-            )
+        self.params = {}    #AMap POI Http Parameters
+        self.state = {}     #AMap POI Http State
+        self.dataset = None     #AMap POI Http Result（见common.poibuffer，由__reset_dataset创建）
+        self.__sink = None
+        self.__journal = None
+        self.__queue = None
+        self.__held = []    #任务队列：已处理、但结果尚未保存的任务
+
+        if agent is None:
+            agent = utils.create_agent(key, num_workers, http_cache, AMapPOIAPI.cache_ttl())
+        self.__urllib = agent
+        self.metrics = agent.metrics    #运行指标，与请求代理共用（见common.metrics），stats()获取汇总
+        self.__metrics_log = metrics_log
+        self.__metrics_port = metrics_port
+        self.__rect = rect
+        self.__boundary = boundary
+        self.__boundary_store = boundary_store
+        self.__clipper = None
 
+        records = []
+        if queue is not None:   #任务队列：进度保存在队列中
+            self.__queue = workqueue.WorkQueue(queue)
+        else:                   #进度日志：每解析一页追加一条记录
+            self.__journal = journal.Journal(os.path.join(out_dir, AMapPOIAPI.JOURNAL_FILE))
+            records = list(self.__journal.replay()) if load_cache else []
+
+        if self.__queue is not None and self.__queue.get_meta("params") is not None:
+            self.params = self.__queue.get_meta("params")   #参数以expand()时为准
+            self.params["key"] = key
+            self.params["num_workers"] = num_workers
+            self.params["http_cache"] = http_cache
+            self.__init_state()
+            self.state["boundary"] = self.__queue.get_meta("boundary")
+            self.__init_clipper()
+            self.__reset_dataset()
+            self.__ids = idset.IdSet()
+        elif len(records)>0 and records[0]["op"]=="start": #存在进度日志，恢复状态
+            self.params = records[0]["params"]
+            self.params["key"] = key                #Key、并发数、缓存以此次运行为准
+            self.params["num_workers"] = num_workers
+            self.params["http_cache"] = http_cache
+            self.__load_journal(records)
+            print("已从{}恢复进度：{}个POI，{}次请求".format(
+                self.__journal.fp, self.state["poi_count"], self.state["request_count"]
+            ))
+        else:
             '''
             get parameters
             '''
@@ -125,21 +256,38 @@ class AMapPOIAPI(object):
             self.params["col_num"] = num_col
             self.params["row_num"] = num_row
             self.params["num_per_save"] = num_per_save
+            self.params["adaptive"] = adaptive
+            self.params["max_count"] = max_count
+            self.params["min_cell_size"] = min_cell_size
+            self.params["num_workers"] = num_workers
+            self.params["http_cache"] = http_cache
+            self.params["out_format"] = out_format
+            self.params["dedup"] = dedup
+            self.params["clip"] = clip
 
             '''
             init:
             '''
-            self.state["over"] = False          #task is over
-            self.state["poi_count"] = 0         #Number of downloaded POIs
-            self.state["out_file_cnt"] = 0      #Number of output files
-            
-            ##grid > type > page
-            self.__compute_grid()
-            self.state["grid_cursor"] = 0
-            self.state["typenamecodes_cursor"] = 0
-            self.state["poi_page_cursor"] = 0   #poi page index
-
+            self.__init_state()
             self.__reset_dataset()
+            self.__ids = idset.IdSet()          #已下载的POI id
+
+            if self.__journal is not None:      #任务队列：由expand()划分网格，由run_worker()创建输出
+                self.__compute_grid()
+                self.__sink = self.__create_sink()
+
+                #新任务：先清空进度日志，再删除上次任务的输出（只在恢复进度时追加写入）
+                self.__journal.clear()
+                if self.__sink is not None:
+                    self.__sink.reset()
+                self.__journal.append({
+                    "op" : "start",
+                    "params" : self.params,
+                    "rect" : self.state["rect"],
+                    "grid" : self.state["grid"],
+                    "boundary" : self.state["boundary"],
+                    "sink" : self.__sink_mark()
+                })
 
         if not os.path.exists(self.params["out_dir"]):
             os.makedirs(self.params["out_dir"])
@@ -155,134 +303,766 @@ class AMapPOIAPI(object):
         
         super(AMapPOIAPI, self).__init__()
 
-    @property
-    def __cache_file(self)->str:
-        return f"cache-{self.__class__.__name__}.geodoer.json"
+    def __init_state(self):
+        self.state["over"] = False          #task is over
+        self.state["poi_count"] = 0         #Number of downloaded POIs
+        self.state["out_file_cnt"] = 0      #Number of output files
+        self.state["boundary"] = None       #裁剪网格的行政区边界（WKB的十六进制字符串）
+
+        ##grid > (type, cell) > page
+        self.state["grid_cursor"] = 0
+        self.state["units"] = None          #此方格待请求的[type index, cell rect]（自适应划分时，追加子方格）。None为此方格未开始
+        self.state["resume_pages"] = []     #恢复进度时，此方格未完成的页：[type index, cell rect, page, 是否为计划的最后一页]
+        self.state["page_plan"] = {}        #已计划的页数（由第一页返回的count计算），"<grid>-<type>" -> 各方格的页数列表
+        self.state["split_count"] = 0       #Number of split cells
+        self.state["request_count"] = 0     #Number of POI requests
+        self.state["saved_request_count"] = 0   #Number of requests saved by page planning
+        self.state["dup_count"] = 0         #Number of duplicate POIs
+        self.state["dup_stats"] = {         #去重统计，[POI数, 重复数]
+            "cell" : {},    #<grid> -> [total, dup]
+            "type" : {}     #<typecode> -> [total, dup]
+        }
 
     def start(self):
         """Start the download
         """
+        if self.__queue is not None:    #任务队列：分解任务，并在此进程中下载
+            self.expand()
+            self.run_worker()
+            return
+
         if self.state["over"]:
             self.__success()
             return
 
-        cnt = 0
+        request_count = self.state["request_count"]
+        saved_request_count = self.state["saved_request_count"]
+
+        self.__start_metrics()
+        try:
+            #grid
+            while self.step():
+                pass
 
-        #grid
-        while self.state["grid_cursor"] < len(self.state["grid"]):
-            print("正在第{}个方格区搜索".format(self.state['grid_cursor'] + 1))
+            print("此次运行共请求{}次，根据总数少请求{}次".format(
+                self.state["request_count"] - request_count,
+                self.state["saved_request_count"] - saved_request_count
+            ))
+            self.finish()
+        finally:
+            self.__stop_metrics()
 
-            poly_str = self.state['grid'][self.state["grid_cursor"]]
+    def step(self):
+        """下载一个方格（多个城市可交替调用，见batch.AMapPOIBatch）
+        :return: 是否还有未下载的方格
+        """
+        if self.state["grid_cursor"] >= len(self.state["grid"]):
+            return False
+
+        print("{}：正在第{}个方格区搜索".format(self.params["city"], self.state['grid_cursor'] + 1))
+
+        if self.state["units"] is None:
+            rect = self.state["grid"][self.state["grid_cursor"]]
+            self.state["units"] = [
+                [type_idx, rect] for type_idx in range(len(self.params["typenamecodes"]))
+            ]
 
-            #type
-            while self.state["typenamecodes_cursor"] < len(self.params["typenamecodes"]):
-                typename, typecode = self.params["typenamecodes"][self.state["typenamecodes_cursor"]]
+        #恢复进度：先请求此方格中未完成的页
+        if len(self.state["resume_pages"])>0:
+            self.__fetch_pages(self.state["resume_pages"])
+            self.state["resume_pages"] = []
 
-                #page
-                page_over = False #Todo: 请求会返回总数，可根据总数来判断是否结束，如此就不会浪费一次请求
+        #(type, cell)：每批num_workers个，并发请求
+        while len(self.state["units"])>0:
+            batch = self.state["units"][:self.params["num_workers"]]
 
-                while not page_over:
-                    pois = self.get_page_poi(self.params["key"],
-                        self.params["city"],
-                        poly_str, 
-                        typename, 
-                        typecode, 
-                        self.state["poi_page_cursor"]
-                    )
-                    print("\t一次请求，获得{}个POI点，正在解析".format(len(pois)))
+            #first page
+            rest = []       #剩余的页：[type index, cell rect, page, 是否为计划的最后一页]
+            first_pages = self.__request_pages([(type_idx, rect, 1) for type_idx, rect in batch])
 
-                    for poi in pois:
-                        self.__parse_poi(poi)
+            for (type_idx, rect), (pois, count) in zip(batch, first_pages):
+                plan = self.__plan_first_page(self.state["grid_cursor"], type_idx, rect, pois, count)
+                if plan is None:
+                    self.__split(type_idx, rect)
+                    continue
 
-                        cnt+=1
-                        if cnt==self.params["num_per_save"]:
-                            self.flush()
-                            cnt=0
+                page_num, rest_pages = plan
+                self.__handle_page(self.state["grid_cursor"], type_idx, rect, 1, pois, page_num==1, (page_num, rest_pages))
 
-                        self.state["poi_count"] += 1
+                rest += [[type_idx, rect, page, page==page_num] for page in rest_pages]
 
-                    if len(pois)<20:    #此页小于20条 => 结束了
-                        page_over = True
-                        self.state["poi_page_cursor"] = 0
-                        break
-                    else:
-                        self.state["poi_page_cursor"] += 1
+            #other pages
+            self.__fetch_pages(rest)
 
-                self.state["typenamecodes_cursor"] += 1
+            del self.state["units"][:len(batch)]
 
-            self.state["typenamecodes_cursor"] = 0
-            self.state["grid_cursor"] += 1
+        self.state["units"] = None
+        self.state["grid_cursor"] += 1
 
-        self.flush()
+        return self.state["grid_cursor"] < len(self.state["grid"])
+
+    def finish(self):
+        """所有方格下载完成：保存结果，记录任务结束
+        """
+        self.flush(close=True)
         self.__success()
 
-    def flush(self):
-        if len(self.dataset["geom"])==0:
+    def expand(self, priorities=None):
+        """将任务分解为(cell, type, page)任务，加入任务队列
+        每个方格、每个类型的第一页为一个任务；处理第一页时，再加入其余各页（或四个子方格）的任务
+        :param priorities: {typecode: 优先级}，优先级高的类型先下载，默认为0
+        :return: 新加入的任务数（重复分解时，已存在的任务会被忽略）
+        """
+        priorities = priorities or {}
+
+        self.__compute_grid()
+        params = dict(self.params)
+        params.pop("key")   #Key不保存到队列中，每个进程使用自己的Key
+        self.__queue.set_meta("params", params)
+        self.__queue.set_meta("boundary", self.state["boundary"])
+
+        tasks = []
+        for grid, rect in enumerate(self.state["grid"]):
+            for type_idx, (_, typecode) in enumerate(self.params["typenamecodes"]):
+                tasks.append(self.__task(grid, type_idx, rect, 1, priorities.get(typecode, 0)))
+        num = self.__queue.put_many(tasks)
+        print("分解为{}个方格、{}个类型，新加入{}个任务".format(
+            len(self.state["grid"]), len(self.params["typenamecodes"]), num
+        ))
+        return num
+
+    def run_worker(self, worker=None, poll_interval=1.0):
+        """从任务队列领取任务并下载，直到队列中没有待处理、处理中的任务
+        多个进程（或共享队列文件的多台机器）可同时运行，每个进程写自己的输出文件<城市名>-<worker>
+        去重（dedup）只在此进程内，不同进程的输出中可能有重复的POI，合并时按id去重（merge_dataset的dedup_field="id"）
+        请求失败（status不为'1'或请求出错）的任务按指数退避重试
+        :param worker:          此进程的名称，默认为<主机名>-<进程号>
+        :param poll_interval:   没有可领取的任务（其他进程处理中、或等待重试）时的轮询间隔，单位：秒
+        :return: 此进程处理的任务数
+        """
+        self.state["worker"] = worker or "{}-{}".format(socket.gethostname(), os.getpid())
+        if self.__sink is None:
+            self.__sink = self.__create_sink()
+            files = self.__queue.get_meta(self.__files_meta())
+            if self.__sink is not None and files is None:
+                #此进程第一次处理此队列：删除上次任务的输出
+                self.__sink.reset()
+                self.__queue.set_meta(self.__files_meta(), [])
+            elif self.__sink is not None:
+                #此进程上次崩溃时写了一半的输出：其中的任务未完成，会被重新领取
+                if len(files)>0:
+                    self.__sink.files = files
+                self.__sink.repair()
+
+        self.__start_metrics()
+        try:
+            num_tasks = self.__drain_queue(poll_interval)
+        finally:
+            self.__stop_metrics()
+
+        counts = self.__queue.counts()
+        print("[{}] 处理{}个任务，请求{}次，获得{}个POI；队列中完成{}个，失败{}个".format(
+            self.state["worker"], num_tasks, self.state["request_count"], self.state["poi_count"],
+            counts[workqueue.DONE], counts[workqueue.FAILED]
+        ))
+        return num_tasks
+
+    def __drain_queue(self, poll_interval):
+        """领取任务并下载，直到队列中没有待处理、处理中的任务
+        :return: 处理的任务数
+        """
+        num_tasks = 0
+        while True:
+            tasks = self.__queue.lease(self.state["worker"], self.params["num_workers"])
+            if len(tasks)==0:
+                self.flush(close=True)  #保存结果，完成已处理的任务
+                if self.__queue.is_drained():
+                    break
+                time.sleep(poll_interval)
+                continue
+            self.__queue.extend(self.__held, self.state["worker"])
+
+            pages = [(task.payload["type"], task.payload["rect"], task.payload["page"]) for task in tasks]
+            try:
+                results = self.__request_results(pages)
+            except Exception as e:
+                print("\t请求出错：{}，稍后重试".format(e))
+                for task in tasks:
+                    self.__queue.retry(task, str(e))
+                continue
+
+            for task, result in zip(tasks, results):
+                if not utils.require_success(result):
+                    will_retry = self.__queue.retry(task, result.get("info", None))
+                    print("\t请求失败：{}，{}".format(result.get("info", None), "稍后重试" if will_retry else "已放弃"))
+                    continue
+                self.__run_task(task, *self.__parse_result(result))
+                num_tasks += 1
+
+        self.flush(close=True)
+        return num_tasks
+
+    def __start_metrics(self):
+        """开启运行指标的日志与HTTP接口（见metrics_log、metrics_port）
+        """
+        if self.__metrics_log is not None:
+            self.metrics.start_log(self.__metrics_log, AMapPOIAPI.METRICS_INTERVAL)
+        if self.__metrics_port is not None:
+            port = self.metrics.serve(self.__metrics_port)
+            print("运行指标：http://127.0.0.1:{}/metrics".format(port))
+
+    def __stop_metrics(self):
+        self.metrics.close()
+
+    def __run_task(self, task, pois, count):
+        """处理一个任务（一页）。第一页：划分方格，或加入其余各页的任务
+        结果保存到文件之后，任务才完成
+        """
+        grid, type_idx, rect, page = (task.payload[name] for name in ("grid", "type", "rect", "page"))
+
+        if page != 1:
+            self.__held.append(task)
+            self.__handle_page(grid, type_idx, rect, page, pois, task.payload["is_last"])
             return
 
-        out_dir = self.params["out_dir"]
+        plan = self.__plan_first_page(grid, type_idx, rect, pois, count)
+        if plan is None:
+            #加入四个子方格的任务
+            self.__queue.put_many([
+                self.__task(grid, type_idx, child, 1, task.priority)
+                for child in self.__split_cells(rect)
+            ])
+            self.__held.append(task)
+            return
 
-        fn = "{}_{}_{}.geodoer.json".format(
-            self.state['out_file_cnt'],
-            self.params["city"],
-            self.state["grid_cursor"]
-        )
-        fp = os.path.join(out_dir, fn)
+        page_num, rest_pages = plan
+        self.__queue.put_many([
+            self.__task(grid, type_idx, rect, page, task.priority, page==page_num)
+            for page in rest_pages
+        ])
 
-        gdf = geopandas.GeoDataFrame(
-            self.dataset["attr"],
-            geometry=self.dataset["geom"]
+        self.__held.append(task)
+        self.__handle_page(grid, type_idx, rect, 1, pois, page_num==1, (page_num, rest_pages))
+
+    def __task(self, grid, type_idx, rect, page, priority, is_last=False):
+        """(cell, type, page)任务：(key, payload, priority)
+        """
+        key = "{}|{}|{}".format(
+            self.params["typenamecodes"][type_idx][1],
+            region.AMapRegionAPI.rect_to_polygon_str(rect),
+            page
         )
-        gdf.to_file(fp, driver='GeoJSON', encoding="utf-8")
-        print("\t\t保存结果".format(fp))
+        payload = {"grid" : grid, "type" : type_idx, "rect" : rect, "page" : page, "is_last" : is_last}
+        return key, payload, priority
+
+    def flush(self, close=False):
+        """保存dataset中的POI
+        :param close: 同时关闭输出文件（GeoParquet的文件关闭后才完整）
+        """
+        written = self.dataset is not None and len(self.dataset)>0
+        if written:
+            self.__write_dataset()
+        closing = close and not self.__is_durable()
+        if closing:
+            self.__sink.close()
+
+        # 结果已完整写入磁盘 => 之前各页的POI不必再从日志恢复（未完整时，日志中保留各页的POI）
+        if written or closing:
+            self.__log({
+                "op" : "flush",
+                "out_file_cnt" : self.state["out_file_cnt"],
+                "sink" : self.__sink_mark(),
+                "durable" : self.__is_durable()
+            })
+
+        # 任务队列：结果已完整写入磁盘 => 完成之前处理的任务
+        if self.__queue is not None and len(self.__held)>0 and self.__is_durable():
+            self.__queue.done(self.__held)
+            self.__held = []
+
+    def __write_dataset(self):
+        with self.metrics.timer("flush_seconds"):
+            self.__write_dataset_file()
+        self.metrics.inc("flushed_pois_total", len(self.dataset))
 
         self.state["out_file_cnt"] += 1
-        self.__reset_dataset()
+        self.dataset.clear()
 
-    def __parse_poi(self, poi):
+    def __is_durable(self):
+        return self.__sink is None or self.__sink.is_durable()
+
+    def __write_dataset_file(self):
+        if self.__sink is not None:   #追加写入
+            self.__sink.write(self.dataset.columns(), self.dataset.coords())
+            print("\t\t保存结果{}".format(self.__sink.fp))
+        else:
+            out_dir = self.params["out_dir"]
+
+            fn = "{}_{}_{}.geodoer.json".format(
+                self.state['out_file_cnt'],
+                self.__out_name(),
+                self.state["grid_cursor"]
+            )
+            fp = os.path.join(out_dir, fn)
+
+            gdf = geopandas.GeoDataFrame(self.dataset.columns(), geometry=self.dataset.geometry())
+            gdf.to_file(fp, driver='GeoJSON', encoding="utf-8")
+            print("\t\t保存结果{}".format(fp))
+
+    def __create_sink(self):
+        """创建流式输出，out_format为geojson时不使用
+        """
+        if self.params["out_format"] == "geojsonl":
+            fp = os.path.join(self.params["out_dir"], "{}.{}".format(self.__out_name(), sinks.GeoJSONSeqSink.ext))
+            return sinks.GeoJSONSeqSink(fp, fsync=True)
+        if self.params["out_format"] == "parquet":
+            fp = os.path.join(self.params["out_dir"], "{}.{}".format(self.__out_name(), sinks.GeoParquetSink.ext))
+            return sinks.GeoParquetSink(fp, utils.FIELD_TYPES, part_rows=AMapPOIAPI.PART_ROWS, on_open=self.__record_open)
+        return None
+
+    def __record_open(self, fp):
+        """记录新建的输出文件，崩溃后回滚、修复时只删除此任务新建的文件
+        """
+        if self.__queue is not None:
+            files = self.__queue.get_meta(self.__files_meta(), [])
+            self.__queue.set_meta(self.__files_meta(), files + [fp])
+        else:
+            self.__log({"op" : "open", "file" : fp})
+
+    def __files_meta(self):
+        """任务队列中，记录此进程新建的输出文件的元数据名
+        """
+        return "files-{}".format(self.state["worker"])
+
+    def __out_name(self):
+        """输出文件名：城市名；任务队列中每个进程写自己的文件：<城市名>-<worker>
+        """
+        if self.__queue is None:
+            return self.params["city"]
+        return "{}-{}".format(self.params["city"], self.state["worker"])
+
+    def __sink_mark(self):
+        if self.__sink is None:
+            return None
+        return self.__sink.mark()
+
+    def __parse_poi(self, poi, parsed):
         # if self.params["city"] not in poi["cityname"]:    #请求时，已经设置仅返回该城市的数据
         #     return False
 
-        # 坐标（高德地图为火星坐标）
-        pnt = utils.create_point_from_str(poi["location"])
-        self.dataset["geom"].append(pnt)
+        # 坐标（高德地图为火星坐标），保存时再创建几何对象
+        parsed["geom"].append(utils.parse_point_str(poi["location"]))
         # 属性
         for field in self.params["save_field"]:
-            value = poi.get(field, "")
-            self.dataset["attr"][field].append( str(value) )
+            value = poi.get(field, None)
+            parsed["attr"][field].append( utils.parse_field(field, value) )
 
         return True
 
     def __reset_dataset(self):
-        self.dataset = {   #
-            "attr" : {},    #attribute
-            "geom" : []     #geometry
-        }
-        for field in self.params["save_field"]: #init attribute
-            self.dataset["attr"][field] = []
+        #坐标保存在float64数组中，属性按utils.FIELD_STORAGE紧凑保存
+        self.dataset = poibuffer.POIBuffer(self.params["save_field"], utils.FIELD_STORAGE)
 
     def __del__(self):
-        self.flush()
+        self.flush(close=True)
+        if self.__queue is not None:
+            self.__queue.close()
+        if self.__journal is None:
+            return
+        self.__journal.close()
 
-        if not self.state["over"]:
-            with open(self.__cache_file, "w", encoding="utf-8") as f:
-                _str = jsonpickle.encode(self)
-                f.write(_str)
-                print("任务未结束，但已存档{}".format(self.__cache_file))
+        if not self.state.get("over", True):
+            print("任务未结束，进度已记录在{}".format(self.__journal.fp))
+
+    @staticmethod
+    def cache_ttl():
+        """POI与行政区接口的缓存有效期
+        """
+        return {
+            AMapPOIAPI.URL : AMapPOIAPI.CACHE_TTL,
+            region.AMapRegionAPI.URL : region.AMapRegionAPI.CACHE_TTL
+        }
 
     def __compute_grid(self):
-        regionutil = region.AMapRegionAPI(self.params["key"])
-        self.state["rect"] = regionutil.get_rect(self.params["city"])
-        self.state["grid"] = regionutil.division_grid(self.state["rect"], self.params["col_num"], self.params["row_num"])
+        boundary = self.__boundary
+        if self.params["clip"] and boundary is None:
+            regionutil = region.AMapRegionAPI(self.params["key"], agent=self.__urllib, boundary_store=self.__boundary_store)
+            boundary = regionutil.get_boundary(self.params["city"])
+
+        if self.__rect is not None:
+            self.state["rect"] = list(self.__rect)
+        elif boundary is not None:
+            self.state["rect"] = list(region.AMapRegionAPI.boundary_to_rect(boundary))
+        else:
+            regionutil = region.AMapRegionAPI(self.params["key"], agent=self.__urllib, boundary_store=self.__boundary_store)
+            self.state["rect"] = regionutil.get_rect(self.params["city"])
+        self.state["grid"] = region.AMapRegionAPI.division_rect(self.state["rect"], self.params["col_num"], self.params["row_num"])
+
+        # 按行政区边界裁剪网格
+        if self.params["clip"] and boundary is not None:
+            self.state["boundary"] = shapely.to_wkb(boundary, hex=True)
+            self.__init_clipper()
+
+            num = len(self.state["grid"])
+            self.state["grid"] = self.__clipper.clip(self.state["grid"])
+            print("按行政区边界裁剪网格：{}个方格中，丢弃边界外的{}个".format(num, num - len(self.state["grid"])))
+
+    def __init_clipper(self):
+        if self.state["boundary"] is not None:
+            self.__clipper = region.GridClipper(shapely.from_wkb(self.state["boundary"]))
+
+    def __split_cells(self, rect):
+        """自适应划分：四个子方格（裁剪网格时，丢弃边界外的子方格）
+        """
+        cells = region.AMapRegionAPI.split_rect(rect)
+        if self.__clipper is not None:
+            cells = self.__clipper.clip(cells)
+        return cells
+
+    def __polygon_str(self, rect):
+        """方格 => 请求的多边形（裁剪网格时，为方格与边界的交集）
+        """
+        if self.__clipper is not None:
+            return self.__clipper.polygon_str(rect)
+        return region.AMapRegionAPI.rect_to_polygon_str(rect)
+
+    def __request_pages(self, pages):
+        """并发请求多页POI
+        :param pages: [(type index, cell rect, page), ...]
+        请求失败（status不为'1'）的页按指数退避重试，重试MAX_RETRIES次仍失败则抛出异常
+        失败的页不会记录到进度日志，重新运行时会再次请求
+        :return: [(pois, count), ...]
+        """
+        results = self.__request_results(pages)
+        failed = [i for i, result in enumerate(results) if not utils.require_success(result)]
+        for attempt in range(AMapPOIAPI.MAX_RETRIES):
+            if len(failed)==0:
+                break
+            delay = AMapPOIAPI.RETRY_BACKOFF * 2 ** attempt
+            print("\t{}页请求失败：{}，{}秒后重试".format(len(failed), results[failed[0]].get("info", None), delay))
+            time.sleep(delay)
+
+            for i, result in zip(failed, self.__request_results([pages[i] for i in failed])):
+                results[i] = result
+            failed = [i for i in failed if not utils.require_success(results[i])]
+
+        if len(failed)>0:
+            raise Exception("请求失败：{}（已重试{}次）。进度已记录，重新运行即可继续".format(
+                results[failed[0]].get("info", None), AMapPOIAPI.MAX_RETRIES
+            ))
+        return [self.__parse_result(result) for result in results]
+
+    def __request_results(self, pages):
+        """并发请求多页POI
+        :param pages: [(type index, cell rect, page), ...]
+        :return: 原始的请求结果
+        """
+        many_params = []
+        for type_idx, rect, page in pages:
+            typename, typecode = self.params["typenamecodes"][type_idx]
+            many_params.append(self.__page_params(self.params["key"],
+                self.params["city"],
+                self.__polygon_str(rect),
+                typename,
+                typecode,
+                page
+            ))
+
+        results = self.__urllib.request_many(AMapPOIAPI.URL, many_params, project=self.__project())
+        self.state["request_count"] += len(results)
+        return results
+
+    def __fetch_pages(self, pages):
+        """并发请求并解析第一页之后的页
+        :param pages: [[type index, cell rect, page, 是否为计划的最后一页], ...]
+        """
+        results = self.__request_pages([(type_idx, rect, page) for type_idx, rect, page, _ in pages])
+        for (type_idx, rect, page, is_last), (pois, count) in zip(pages, results):
+            self.__handle_page(self.state["grid_cursor"], type_idx, rect, page, pois, is_last)
+
+    def __handle_page(self, grid, type_idx, rect, page, pois, is_last, plan=None):
+        """解析一页POI，并追加到进度日志
+        :param grid:    所属的网格序号
+        :param is_last: 是否为计划的最后一页
+        :param plan:    第一页：(计划的页数, 继续请求的页)
+        """
+        ids, dup, parsed = self.__parse_page(pois, type_idx, grid)
+
+        saved = is_last and len(pois)==20   #已到计划的页数 => 结束了（原本需要再请求一页）
+        if saved:
+            self.state["saved_request_count"] += 1
+            self.metrics.inc("saved_requests_total")
+
+        # 记录此页，以及此页新增的POI（保存到文件之前，崩溃后由日志恢复）
+        if self.__journal is not None:
+            record = {
+                "op" : "page",
+                "grid" : grid,
+                "type" : type_idx,
+                "rect" : rect,
+                "page" : page,
+                "total" : len(pois),
+                "dup" : dup,
+                "saved" : saved,
+                "ids" : ids if self.params["dedup"] else [],
+                "attr" : parsed["attr"],
+                "geom" : parsed["geom"]
+            }
+            if plan is not None:
+                record["page_num"], record["rest"] = plan
+            self.__log(record)
+
+        if len(self.dataset) >= self.params["num_per_save"]:
+            self.flush()
+
+    def __split(self, type_idx, rect):
+        """自适应划分：将方格划分为四个子方格，加入待请求
+        """
+        self.state["units"] += [
+            [type_idx, child] for child in self.__split_cells(rect)
+        ]
+        self.__log({
+            "op" : "split",
+            "grid" : self.state["grid_cursor"],
+            "type" : type_idx,
+            "rect" : rect
+        })
+
+    def __log(self, record):
+        """追加到进度日志（任务队列中不记录）
+        """
+        if self.__journal is not None:
+            self.__journal.append(record)
+
+    def __parse_page(self, pois, type_idx, grid):
+        """解析一页POI，整页加入dataset
+        :return: (新的POI的id, 重复的POI数, 新的POI{"attr", "geom"})
+        """
+        print("\t一次请求，获得{}个POI点，正在解析".format(len(pois)))
+
+        typecode = self.params["typenamecodes"][type_idx][1]
+        ids = []
+        dup = 0
+        parsed = {"attr" : {field : [] for field in self.params["save_field"]}, "geom" : []}
+        with self.metrics.timer("parse_seconds"):
+            for poi in pois:
+                _id = poi.get("id", "")
+                if self.params["dedup"] and not self.__ids.add(_id):
+                    dup += 1
+                    continue
+
+                self.__parse_poi(poi, parsed)
+                ids.append(_id)
+
+            self.dataset.extend(parsed["attr"], parsed["geom"])
+        self.state["poi_count"] += len(ids)
+        self.__record_dup(grid, typecode, len(pois), dup)
+
+        self.metrics.observe("pois_per_request", len(pois), AMapPOIAPI.POIS_PER_REQUEST_BUCKETS)
+        self.metrics.inc("pois_total", len(ids))
+        self.metrics.inc("duplicates_total", dup)
+        total = self.state["poi_count"] + self.state["dup_count"]
+        self.metrics.set("duplicate_rate", round(self.state["dup_count"] / max(1, total), 6))
+        return ids, dup, parsed
+
+    def __record_dup(self, grid, typecode, total, dup):
+        """记录去重统计
+        """
+        for name, key in (("cell", str(grid)), ("type", typecode)):
+            stats = self.state["dup_stats"][name].setdefault(key, [0, 0])
+            stats[0] += total
+            stats[1] += dup
+        self.state["dup_count"] += dup
+
+    def dup_rate(self, by="type"):
+        """重复率
+        :param by: "type"（每个类型）或 "cell"（每个方格）
+        :return: {typecode或方格序号: 重复率}
+        """
+        return {
+            key : dup / total if total else 0
+            for key, (total, dup) in self.state["dup_stats"][by].items()
+        }
+
+    def __record_page_plan(self, grid, type_idx, page_num):
+        """记录计划的页数
+        """
+        key = "{}-{}".format(grid, type_idx)
+        self.state["page_plan"].setdefault(key, []).append(page_num)
+
+    def __plan_first_page(self, grid, type_idx, rect, pois, count):
+        """第一页：方格已饱和则需划分（丢弃此页），否则根据总数计划页数
+        :return: None（需划分）或 (计划的页数, 其余待请求的页)
+        """
+        # 自适应划分：此方格已饱和 => 划分为四个子方格，丢弃此页
+        if self.__need_split(rect, count):
+            print("\t方格POI总数{}，已饱和，划分为4个子方格".format(count))
+            self.state["split_count"] += 1
+            self.metrics.inc("splits_total")
+            return None
+
+        # 根据总数计划页数，不必再多请求一页来判断是否结束
+        page_num = max(1, math.ceil(count / 20))
+        self.__record_page_plan(grid, type_idx, page_num)
+
+        #此页小于20条 => 结束了
+        rest_pages = list(range(2, page_num + 1)) if len(pois)==20 else []
+        return page_num, rest_pages
+
+    def __need_split(self, rect, count):
+        """自适应划分：方格是否需要划分
+        """
+        if not self.params["adaptive"] or count < self.params["max_count"]:
+            return False
+
+        minlng, maxlng, minlat, maxlat = rect
+        size = min(maxlng - minlng, maxlat - minlat)
+        return size / 2 >= self.params["min_cell_size"]
+
+    def __load_journal(self, records):
+        """重放进度日志，恢复状态
+        1. 计数、页数计划、去重统计与id索引
+        2. 上次完整保存之后解析的POI（放回dataset），输出文件回滚到上次完整保存的位置
+        3. 待请求的方格与页
+        """
+        start = records[0]
+        self.__init_state()
+        self.state["rect"] = start["rect"]
+        self.state["grid"] = start["grid"]
+        self.state["boundary"] = start.get("boundary", None)
+        self.__init_clipper()
+
+        self.__reset_dataset()
+        self.__sink = self.__create_sink()
+        self.__ids = idset.IdSet()
+
+        ids = []
+        sink_mark = start["sink"]
+        opened = []         #此任务新建的输出文件
+        unflushed = []      #上次保存之后的页
+        splits = set()      #已划分的(grid, type, cell)
+        first_pages = {}    #已请求第一页的(grid, type, cell) -> 继续请求的页
+        done_pages = set()  #已完成的(grid, type, cell, page)
+        for record in records[1:]:
+            if record["op"]=="split":
+                splits.add((record["grid"], record["type"], tuple(record["rect"])))
+                self.state["split_count"] += 1
+                self.state["request_count"] += 1
+            elif record["op"]=="page":
+                unit = (record["grid"], record["type"], tuple(record["rect"]))
+                done_pages.add(unit + (record["page"],))
+                if record["page"]==1:
+                    first_pages[unit] = record["rest"]
+                    self.__record_page_plan(record["grid"], record["type"], record["page_num"])
+
+                typecode = self.params["typenamecodes"][record["type"]][1]
+                self.__record_dup(record["grid"], typecode, record["total"], record["dup"])
+                self.state["request_count"] += 1
+                self.state["saved_request_count"] += int(record["saved"])
+                self.state["poi_count"] += record["total"] - record["dup"]
+                ids += record["ids"]
+                unflushed.append(record)
+            elif record["op"]=="flush":
+                self.state["out_file_cnt"] = record["out_file_cnt"]
+                sink_mark = record["sink"]
+                if record.get("durable", True):     #输出文件未关闭时，之前各页的POI仍需恢复
+                    unflushed = []
+            elif record["op"]=="open":
+                opened.append(record["file"])
+            elif record["op"]=="over":
+                self.state["over"] = True
+
+        if self.params["dedup"]:
+            self.__ids.add_many(ids)
+
+        # 撤销上次保存之后（未记录）写入的内容，并放回上次保存之后的POI
+        if self.__sink is not None and sink_mark is not None:
+            if len(opened)>0:
+                self.__sink.files = opened
+            self.__sink.rollback(sink_mark)
+        for record in unflushed:
+            self.dataset.extend(record["attr"], record["geom"])
+
+        self.__resume_units(splits, first_pages, done_pages)
+        self.__compact_journal(records, unflushed)
+
+    def __resume_units(self, splits, first_pages, done_pages):
+        """由已完成的页，计算第一个未完成的方格，及其待请求的(type, cell)与页
+        """
+        for grid, grid_rect in enumerate(self.state["grid"]):
+            units = []
+            pages = []
+            queue = [[type_idx, grid_rect] for type_idx in range(len(self.params["typenamecodes"]))]
+            while len(queue)>0:
+                type_idx, rect = queue.pop(0)
+                unit = (grid, type_idx, tuple(rect))
+                if unit in splits:
+                    queue += [[type_idx, child] for child in self.__split_cells(rect)]
+                elif unit not in first_pages:
+                    units.append([type_idx, rect])
+                else:
+                    rest = first_pages[unit]
+                    pages += [
+                        [type_idx, rect, page, page==rest[-1]] for page in rest
+                        if unit + (page,) not in done_pages
+                    ]
+
+            if len(units)>0 or len(pages)>0:
+                self.state["grid_cursor"] = grid
+                self.state["units"] = units
+                self.state["resume_pages"] = pages
+                return
+
+        self.state["grid_cursor"] = len(self.state["grid"])
+
+    def __compact_journal(self, records, unflushed=()):
+        """压缩进度日志：已保存到文件的页，不再保留其POI
+        """
+        keep = set(id(record) for record in unflushed)
+        compacted = []
+        for record in records:
+            if record["op"]=="page" and id(record) not in keep:
+                record = {key : value for key, value in record.items() if key not in ("attr", "geom")}
+            compacted.append(record)
+        self.__journal.compact(compacted)
 
     def __success(self):
-        self.state["over"] = True
+        if not self.state["over"]:
+            self.state["over"] = True
+            self.__journal.append({"op" : "over"})
+            self.__compact_journal(list(self.__journal.replay()))
+
         print(f"[Success] A total of {self.state['poi_count']} POIs were downloaded.")
 
+        print(f"[Success] {self.state['request_count']} requests were sent, "
+            f"{self.state['saved_request_count']} were saved by page planning.")
+        if self.params["adaptive"]:
+            print(f"[Success] {self.state['split_count']} cells were split.")
+        if self.params["dedup"]:
+            total = self.state["poi_count"] + self.state["dup_count"]
+            print(f"[Success] {self.state['dup_count']} duplicate POIs were dropped "
+                f"({self.state['dup_count'] / max(1, total):.1%}).")
+            for typecode, rate in self.dup_rate("type").items():
+                print(f"\t{typecode}: {rate:.1%}")
+        if self.__urllib.timing["count"] > 0:
+            timing = self.__urllib.mean_timing()
+            print(f"[Success] Mean request time: connect {timing['connect'] * 1000:.1f} ms, "
+                f"ttfb {timing['ttfb'] * 1000:.1f} ms, body {timing['body'] * 1000:.1f} ms, "
+                f"decode {timing['decode'] * 1000:.2f} ms ({self.__urllib.decoder.backend}).")
+        histograms = self.metrics.stats()["histograms"]
+        spent = {name : histograms[name]["sum"] if name in histograms else 0.0
+            for name in ("limiter_wait_seconds", "request_seconds", "parse_seconds", "flush_seconds")}
+        print(f"[Success] Time spent (summed over threads): limiter wait {spent['limiter_wait_seconds']:.1f} s, "
+            f"network {spent['request_seconds']:.1f} s, parse {spent['parse_seconds']:.1f} s, "
+            f"flush {spent['flush_seconds']:.1f} s.")
+        cache = self.__urllib.cache
+        if cache is not None:
+            print(f"[Success] Response cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses "
+                f"({cache.hit_rate():.1%}), {cache.size / 1024 / 1024:.1f} MB.")
+
         fp = os.path.join(self.params["out_dir"], "task.geodoer.json")
         with open(fp, "w", encoding="utf-8") as f:
-            _str = jsonpickle.encode(self)
-            f.write(_str)
+            json.dump({"params" : self.params, "state" : self.state}, f, ensure_ascii=False, indent=4)
 
     def get_all_type(poicode_file = "amap_poicode.xlsx"):
         """get all poi types
@@ -304,7 +1084,26 @@ class AMapPOIAPI(object):
         return typelist
 
     def get_page_poi(self, key, city, polygon_str, typename, typecode, page_num):
-        params = {
+        pois, _ = self.get_page(key, city, polygon_str, typename, typecode, page_num)
+        return pois
+
+    def get_page(self, key, city, polygon_str, typename, typecode, page_num):
+        """请求一页POI
+        :return: (pois, count) 此页的POI、此查询的POI总数
+        """
+        params = self.__page_params(key, city, polygon_str, typename, typecode, page_num)
+        # 请求报错不管，让它抛出去
+        result = self.__urllib.request(AMapPOIAPI.URL, params, project=self.__project())
+        return self.__parse_result(result)
+
+    def __project(self):
+        """投影：每个POI只保留要保存的字段，以及id、坐标
+        """
+        return {"pois" : list(dict.fromkeys(["id", "location"] + list(self.params["save_field"])))}
+
+    @staticmethod
+    def __page_params(key, city, polygon_str, typename, typecode, page_num):
+        return {
             "key" : key,
             'polygon' : polygon_str,  #左上右下两顶点坐标对
             "keywords" : typename,
@@ -316,19 +1115,32 @@ class AMapPOIAPI(object):
             "city" : city,
             "citylimit" : True      #仅返回城市数据
         }
-        # 请求报错不管，让它抛出去
-        result = self.__urllib.request(AMapPOIAPI.URL, params)
 
+    @staticmethod
+    def __parse_result(result):
         if utils.require_success(result):
             if result.get('pois')!=None:
-                return result['pois']
+                return result['pois'], utils.parse_count(result)
                 
-        return []
+        return [], 0
 
 if __name__ == '__main__':
+    import argparse
+    from common import metrics
+
+    parser = argparse.ArgumentParser(description="下载高德地图POI，参数见poi_params")
+    parser.add_argument("--profile", nargs="?", const="profile.geodoer.prof", default=None,
+        help="用cProfile运行，结果保存到此文件（默认profile.geodoer.prof），并打印网络、限额等待、CPU的耗时")
+    parser.add_argument("--metrics-log", default=poi_params.get("metrics_log"), help="定期追加运行指标（JSON）到此文件")
+    parser.add_argument("--metrics-port", type=int, default=poi_params.get("metrics_port"), help="Prometheus文本格式的HTTP接口的端口")
+    args = parser.parse_args()
+
     try:
-        poi = AMapPOIAPI(**poi_params)
-        poi.start()
+        poi = AMapPOIAPI(**dict(poi_params, metrics_log=args.metrics_log, metrics_port=args.metrics_port))
+        if args.profile is not None:
+            metrics.profile(poi.start, args.profile)
+        else:
+            poi.start()
     except Exception as e:
         print(f"Error: {e}")
     pass
@@ -341,4 +1153,15 @@ if __name__ == '__main__':
 
 #     from common import getchar
 #     getchar.getchar("键入任意字符结束下载……")
-#     pass
\ No newline at end of file
+#     pass
+
+# if __name__ == '__main__':
+#     # 任务队列：先分解任务，再由多个进程共同下载（每个进程写自己的输出文件）
+#     from multiprocessing import Process
+#     params = dict(poi_params, queue="queue.geodoer.sqlite")
+#     AMapPOIAPI(**params).expand()
+#     workers = [Process(target=lambda: AMapPOIAPI(**params).run_worker()) for _ in range(4)]
+#     for worker in workers:
+#         worker.start()
+#     for worker in workers:
+#         worker.join()
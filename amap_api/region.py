@@ -9,23 +9,35 @@
 """
 from amap_api import defines
 from amap_api import utils
-from common import urllibagent
+from common import boundarystore
+
+import shapely
 
 params = {
-    "key" : defines.AMAP_KEY
+    "key" : defines.AMAP_KEYS
     ,"keyword" : "厦门"
 }
 
 class AMapRegionAPI(object):
     URL = 'https://restapi.amap.com/v3/config/district'
+    CACHE_TTL = 30 * 24 * 60 * 60   #行政区边界变化很少，缓存30天
 
-    def __init__(self, key) -> None:
-        self.__key = key
-        self.__urllib = urllibagent.UrllibAgent(
-            self.__class__.__name__
-            ,urllibagent.RequestLimitsRule(50, 1)
-            ,urllibagent.RequestLimitsRule(30000, 24 * 60 * 60)
-        )
+    def __init__(self, key, num_workers = 1, http_cache = None, agent = None, boundary_store = None) -> None:
+        """
+        :param key: 一个Key，或多个Key（Key池）
+        :param http_cache: 响应缓存的文件夹，None为不缓存
+        :param agent: 共用的请求代理（见utils.create_agent），None则新建
+        :param boundary_store: 行政区边界的本地存储（见common.boundarystore），文件路径或BoundaryStore，None为不保存
+            已保存的行政区，获取边界、Rect时直接从磁盘读取，不请求接口
+        """
+        self.__key = utils.key_list(key)[0]
+        if agent is None:
+            agent = utils.create_agent(key, num_workers, http_cache, {AMapRegionAPI.URL : AMapRegionAPI.CACHE_TTL})
+        self.__urllib = agent
+
+        if isinstance(boundary_store, str):
+            boundary_store = boundarystore.BoundaryStore(boundary_store)
+        self.store = boundary_store
 
     def get_region(self, keyword, rec_level = 1):
         """按keyword搜索行政区，并获取边界
@@ -38,55 +50,152 @@ class AMapRegionAPI(object):
         
         :return [] 多个匹配结果
         """
-        params = {
+        result = self.__urllib.request(AMapRegionAPI.URL, self.__region_params(keyword, rec_level))
+        return self.__parse_region(result)
+
+    def get_regions(self, keywords, rec_level = 1):
+        """并发搜索多个行政区（见get_region）
+        :param keywords: 多个行政区名称、citycode、adcode
+
+        :return [[], ...] 与keywords顺序一致，每个keyword的匹配结果
+        """
+        results = self.__urllib.request_many(
+            AMapRegionAPI.URL,
+            [self.__region_params(keyword, rec_level) for keyword in keywords]
+        )
+        return [self.__parse_region(result) for result in results]
+
+    def __region_params(self, keyword, rec_level):
+        return {
             'key': self.__key,
             'keywords': keyword,
             'subdistrict' : rec_level,
             'extensions': 'all'
         }
 
-        result = self.__urllib.request(AMapRegionAPI.URL, params)
-        
+    @staticmethod
+    def __parse_region(result):
         if utils.require_success(result):
             return result.get("districts", [])
 
         return[]
 
-
     def get_rect(self, keyword):
         """根据keyword搜索行政区，获取其Rect
         :param keyword: 行政区名称、citycode、adcode
         :return: minlng, maxlng, minlat, maxlat（最小经度，最大经度，最小纬度，最大纬度）
         """
-        try:
-            disctrict = self.get_region(keyword)
+        return self.get_rects([keyword])[0]
 
-            bestresult = disctrict[0]
-            polyline = bestresult.get("polyline", None)
-            lines = utils.parse_polyline_str(polyline)
+    def get_rects(self, keywords):
+        """并发搜索多个行政区，获取其Rect（见get_rect）
+        :param keywords: 多个行政区名称、citycode、adcode
+        :return: 与keywords顺序一致的Rect，搜索不到时为[]
+        """
+        if self.store is not None:
+            #边界会保存到本地，之后直接读取
+            return [[] if boundary is None else self.boundary_to_rect(boundary) for boundary in self.get_boundaries(keywords)]
+        return [self.__region_rect(districts) for districts in self.get_regions(keywords, 0)]  #只有最上一级返回边界，不必返回下级行政区
+
+    def get_boundary(self, keyword):
+        """根据keyword搜索行政区，获取其边界
+        :param keyword: 行政区名称、citycode、adcode
+        :return: shapely的(Multi)Polygon，搜索不到时为None
+        """
+        return self.get_boundaries([keyword])[0]
 
-            minlng, maxlng, minlat, maxlat = 200, -1, 200, -1
-            for line in lines:
-                for lng,lat in line:
-                    maxlng = max(lng, maxlng)
-                    minlng = min(lng, minlng)
-                    maxlat = max(lat, maxlat)
-                    minlat = min(lat, minlat)
+    def get_boundaries(self, keywords):
+        """并发搜索多个行政区，获取其边界（见get_boundary）
+            已保存在本地的行政区直接读取，其余的并发请求，并保存到本地
+        :param keywords: 多个行政区名称、citycode、adcode
+        :return: 与keywords顺序一致的边界，搜索不到时为None
+        """
+        boundaries = [None] * len(keywords)
+        missing = []    #本地没有的keyword的下标
+        for i, keyword in enumerate(keywords):
+            code = None if self.store is None else self.store.resolve(keyword)
+            boundary = None if code is None else self.store.geometry(code)
+            if boundary is None:
+                missing.append(i)
+            else:
+                boundaries[i] = boundary
+
+        if len(missing)==0:
+            return boundaries
+
+        #保存到本地时，一并保存下一级行政区（用于查询下级）
+        rec_level = 0 if self.store is None else 1
+        results = self.get_regions([keywords[i] for i in missing], rec_level)
+        for i, districts in zip(missing, results):
+            boundaries[i] = self.__region_boundary(districts)
+            self.__save(keywords[i], districts, boundaries[i])
+        return boundaries
+
+    def __save(self, keyword, districts, boundary):
+        """搜索结果 => 保存到本地（最佳结果及其下一级行政区）
+        """
+        if self.store is None or len(districts)==0 or boundary is None:
+            return
+
+        district = districts[0]
+        code = district.get("adcode")
+        self.store.put(code, boundary
+            , name = district.get("name")
+            , level = district.get("level")
+            , center = self.__str_or_none(district.get("center"))
+            , citycode = self.__str_or_none(district.get("citycode"))
+        )
+        self.store.alias(keyword, code)
+
+        for child in district.get("districts", []):
+            #街道的adcode与所属区县相同，不能作为键
+            if child.get("level") == "street" or child.get("adcode") == code:
+                continue
+            self.store.put(child.get("adcode")
+                , name = child.get("name")
+                , level = child.get("level")
+                , parent = code
+                , center = self.__str_or_none(child.get("center"))
+                , citycode = self.__str_or_none(child.get("citycode"))
+            )
+
+    @staticmethod
+    def __str_or_none(value):
+        #接口中空值为[]
+        return value if isinstance(value, str) and len(value)>0 else None
+
+    @staticmethod
+    def __region_boundary(disctrict):
+        """行政区的搜索结果 => 最佳结果的边界
+        """
+        if len(disctrict)==0:
+            return None
+        return utils.create_polygon_from_polyline(disctrict[0].get("polyline", None))
+
+    @staticmethod
+    def boundary_to_rect(boundary):
+        """边界 => Rect（minlng, maxlng, minlat, maxlat）
+        """
+        minlng, minlat, maxlng, maxlat = boundary.bounds
+        return minlng, maxlng, minlat, maxlat
 
-            return minlng, maxlng, minlat, maxlat
-        except:
+    @staticmethod
+    def __region_rect(disctrict):
+        """行政区的搜索结果 => 最佳结果的Rect（向量化计算，不构建几何对象）
+        """
+        if len(disctrict)==0:
             return []
+        return utils.polyline_bounds(disctrict[0].get("polyline", None))
     
     @staticmethod
-    def division_grid(region, col_num, row_num):
+    def division_rect(region, col_num, row_num):
         """
-        根据范围划分网格，获得每个网格的四边形边界
-        返回：经度和纬度用","分割，经度在前，纬度在后，坐标对用"|"分割。经纬度小数点后不得超过6位
-            多边形为矩形时，可传入左上右下两顶点坐标对；其他情况下首尾坐标对需相同。
+        根据范围划分网格，获得每个网格的矩形范围
+        返回：[minlng, maxlng, minlat, maxlat]的列表，按行优先排列
         """
         minlng, maxlng, minlat, maxlat = region
 
-        polylists = []
+        rects = []
         lat_step = (maxlat - minlat) / row_num
         lng_step = (maxlng - minlng) / col_num
 
@@ -96,10 +205,93 @@ class AMapRegionAPI(object):
                 right_lng = minlng + lng_step * (c+1)
                 down_lat = minlat + lat_step * r
                 up_lat = minlat + lat_step * (r+1)
-                # 经度lng在前，纬度lat在后。左上右下两顶点坐标对
-                poly_str = f"{left_lng},{up_lat}|{right_lng},{down_lat}"
-                polylists.append(poly_str)
-        return polylists
+                rects.append([left_lng, right_lng, down_lat, up_lat])
+        return rects
+
+    @staticmethod
+    def split_rect(rect):
+        """四叉树划分：将矩形等分为四个子矩形
+        """
+        return AMapRegionAPI.division_rect(rect, 2, 2)
+
+    @staticmethod
+    def rect_to_polygon_str(rect):
+        """矩形转为AMap的polygon参数（左上右下两顶点坐标对）
+        """
+        minlng, maxlng, minlat, maxlat = rect
+        # 经度lng在前，纬度lat在后。经纬度小数点后不得超过6位
+        return f"{minlng:.6f},{maxlat:.6f}|{maxlng:.6f},{minlat:.6f}"
+
+    @staticmethod
+    def division_grid(region, col_num, row_num):
+        """
+        根据范围划分网格，获得每个网格的四边形边界
+        返回：经度和纬度用","分割，经度在前，纬度在后，坐标对用"|"分割。经纬度小数点后不得超过6位
+            多边形为矩形时，可传入左上右下两顶点坐标对；其他情况下首尾坐标对需相同。
+        """
+        return [
+            AMapRegionAPI.rect_to_polygon_str(rect)
+            for rect in AMapRegionAPI.division_rect(region, col_num, row_num)
+        ]
+
+class GridClipper(object):
+    """按行政区边界裁剪网格
+    1. 丢弃与边界不相交的方格（如海上的方格），方格用空间索引（STRtree）批量查询
+    2. 请求时使用方格与边界的交集作为多边形，多边形接口只返回多边形内的POI，总数更少、页数更少
+    3. 交集的顶点过多时（URL长度有限），使用其凸包，仍过多则使用其外包矩形（都包含交集，不会漏下载）
+    :param boundary:        行政区边界，shapely的(Multi)Polygon
+    :param max_vertices:    请求的多边形最多的顶点数
+    """
+    def __init__(self, boundary, max_vertices=64) -> None:
+        self.boundary = boundary
+        self.max_vertices = max_vertices
+        self._polygon_strs = {}     #tuple(rect) -> 多边形字符串
+        shapely.prepare(self.boundary)
+
+    @staticmethod
+    def rect_to_box(rect):
+        minlng, maxlng, minlat, maxlat = rect
+        return shapely.box(minlng, minlat, maxlng, maxlat)
+
+    def clip(self, rects):
+        """丢弃与边界不相交的方格
+        :param rects: [minlng, maxlng, minlat, maxlat]的列表
+        :return: 与边界相交的方格（顺序不变）
+        """
+        if len(rects)==0:
+            return []
+        boxes = [self.rect_to_box(rect) for rect in rects]
+        tree = shapely.STRtree(boxes)
+        indices = sorted(tree.query(self.boundary, predicate="intersects"))
+        # 仅在边线上相接的方格（交集面积为0）也丢弃
+        return [rects[i] for i in indices if not shapely.touches(boxes[i], self.boundary)]
+
+    def polygon_str(self, rect):
+        """方格 => AMap的polygon参数（方格与边界的交集）
+        """
+        key = tuple(rect)
+        if key not in self._polygon_strs:
+            self._polygon_strs[key] = self.__polygon_str(rect)
+        return self._polygon_strs[key]
+
+    def __polygon_str(self, rect):
+        box = self.rect_to_box(rect)
+        if self.boundary.contains(box):     #方格在边界内 => 矩形
+            return AMapRegionAPI.rect_to_polygon_str(rect)
+
+        clipped = box.intersection(self.boundary)
+        if clipped.is_empty:
+            return AMapRegionAPI.rect_to_polygon_str(rect)
+
+        for shape in (clipped, clipped.convex_hull):
+            if shape.geom_type != "Polygon":    #多个部分 => 凸包
+                continue
+            coords = shape.exterior.coords      #首尾坐标对相同
+            if 4 <= len(coords) <= self.max_vertices + 1:
+                # 经度lng在前，纬度lat在后。经纬度小数点后不得超过6位
+                return "|".join(f"{lng:.6f},{lat:.6f}" for lng, lat in coords)
+
+        return AMapRegionAPI.rect_to_polygon_str(AMapRegionAPI.boundary_to_rect(clipped))
 
 if __name__ == '__main__':
     region_http = AMapRegionAPI(params["key"])
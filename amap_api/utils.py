@@ -1,5 +1,13 @@
+import json
+import warnings
+
+import numpy
+import shapely
 from shapely.geometry import point
 
+from common import httpcache
+from common import urllibagent
+
 def parse_point_str(point_str):
     tmp = point_str.split(',')
     return float(tmp[0]), float(tmp[1])
@@ -27,13 +35,185 @@ def parse_polyline_str(polyline_str):
     except:
         return []
 
+def parse_polyline_array(polyline_str):
+    """解析AMap HTTP Polyline字符串为numpy坐标数组（不在Python中逐个坐标解析）
+    :return: [ndarray(n, 2), ...]，每一部分为一个数组（lng, lat），解析失败时为[]
+    """
+    coords = _parse_polyline_coords(polyline_str)
+    if coords is None:
+        return []
+
+    # 每一部分的坐标数 = 分号数 + 1
+    counts = [part.count(';') + 1 for part in polyline_str.split('|')]
+    if sum(counts) != len(coords):
+        return []
+    return numpy.split(coords, numpy.cumsum(counts)[:-1])
+
+def iter_polyline_array(polyline_str):
+    """逐部分解析AMap HTTP Polyline字符串（惰性，每次只解析一部分）
+    :return: 生成器，每一部分为一个ndarray(n, 2)
+    """
+    if not isinstance(polyline_str, str):
+        return
+    for part in polyline_str.split('|'):
+        coords = _parse_polyline_coords(part)
+        if coords is not None:
+            yield coords
+
+def polyline_bounds(polyline_str):
+    """AMap HTTP Polyline字符串的范围（向量化，不构建几何对象）
+    :return: minlng, maxlng, minlat, maxlat，解析失败时为[]
+    """
+    coords = _parse_polyline_coords(polyline_str)
+    if coords is None or len(coords)==0:
+        return []
+    minlng, minlat = coords.min(axis=0).tolist()
+    maxlng, maxlat = coords.max(axis=0).tolist()
+    return minlng, maxlng, minlat, maxlat
+
+def _parse_polyline_coords(polyline_str):
+    """"lng,lat;lng,lat|lng,lat..." => ndarray(n, 2)，解析失败时为None
+    """
+    if not isinstance(polyline_str, str) or len(polyline_str)==0:
+        return None
+    flat_str = polyline_str.replace(';', ',').replace('|', ',')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)    #格式错误时，旧版numpy只解析到出错的位置
+            flat = numpy.fromstring(flat_str, dtype=numpy.float64, sep=',')
+    except ValueError:
+        return None
+    if len(flat) != flat_str.count(',') + 1 or len(flat) % 2 != 0:
+        return None
+    return flat.reshape(-1, 2)
+
+def create_polygon_from_polyline(polyline_str):
+    """AMap HTTP Polyline字符串 => shapely的(Multi)Polygon
+    行政区边界的polyline中，"|"分隔的每一部分为一个多边形（如海岛）
+    :return: 解析失败时为None
+    """
+    polygons = [shapely.polygons(coords) for coords in parse_polyline_array(polyline_str) if len(coords) >= 3]
+    if len(polygons)==0:
+        return None
+
+    # 修复自相交等无效的多边形，只保留面
+    polygons = numpy.array(polygons)
+    invalid = ~shapely.is_valid(polygons)
+    polygons[invalid] = shapely.make_valid(polygons[invalid])
+    parts = shapely.get_parts(polygons)
+    parts = [part for part in parts if part.geom_type in ("Polygon", "MultiPolygon")]
+    if len(parts)==0:
+        return None
+    return shapely.union_all(parts)
+
+#
+# POI字段
+#
+# 字段类型（未列出的为string）。编码类字段（adcode、citycode等）可能有前导0，保持为string
+FIELD_TYPES = {
+    "timestamp" : "timestamp",  #"2022-04-07 18:55:08"
+    "shopinfo" : "int64",       #"2"
+    "distance" : "int64",
+}
+
+#POI字段在内存中的存储方式（见common.poibuffer），未列出的字段为string
+FIELD_STORAGE = {
+    "type" : "category",
+    "typecode" : "code",        #6位编码，如"190105"
+    "adcode" : "code",
+    "pcode" : "code",
+    "adname" : "category",
+    "pname" : "category",
+    "cityname" : "category",
+    "citycode" : "category",    #位数不定，如"021"、"0592"
+    "business_area" : "category",
+    "shopinfo" : "int64",
+    "distance" : "int64",
+}
+
+def parse_field(field, value):
+    """解析POI字段的值为对应类型
+    高德地图的空字段为[]，解析为None；嵌套的对象转为JSON字符串
+    """
+    if value is None or (isinstance(value, list) and len(value)==0):
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+
+    _type = FIELD_TYPES.get(field, "string")
+    if _type == "int64":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if _type == "float64":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
 #
 # 网络请求
 # 
 def require_success(obj):
     status = obj.get("status", '0')
 
-    if status is '1':
+    if status == '1':
         return True
     
-    return False
\ No newline at end of file
+    return False
+
+def parse_count(obj):
+    """获得请求结果中的总数（count字段为字符串）
+    """
+    try:
+        return int(obj.get("count", 0))
+    except (TypeError, ValueError):
+        return 0
+
+def key_list(key):
+    """一个Key或多个Key => Key的列表
+    """
+    if isinstance(key, str):
+        return [key]
+    return list(key)
+
+# Key不可用的状态码（https://lbs.amap.com/api/webservice/guide/tools/info）
+KEY_EXHAUSTED_INFOCODES = [
+    "10001",    #INVALID_USER_KEY，key不正确或过期
+    "10003",    #DAILY_QUERY_OVER_LIMIT，访问已超出日访问量
+    "10044",    #USER_DAILY_QUERY_OVER_LIMIT，账号维度日调用量超出限制
+    "10045",    #USER_ABROAD_DAILY_QUERY_OVER_LIMIT，账号维度海外服务日调用量超出限制
+]
+
+def is_key_exhausted(obj):
+    """请求结果是否表示Key额度已用尽（或Key不可用）
+    """
+    return obj.get("infocode", "") in KEY_EXHAUSTED_INFOCODES
+
+def create_response_cache(cache_dir, ttl=None):
+    """创建响应缓存（仅缓存成功的响应）
+    :param cache_dir: 缓存文件夹，None为不缓存
+    :param ttl: 每个接口的有效期，{url: 秒}
+    """
+    if cache_dir is None:
+        return None
+    return httpcache.ResponseCache(cache_dir, ttl=ttl, accept=require_success)
+
+def create_agent(key, num_workers=1, http_cache=None, ttl=None):
+    """创建高德接口的请求代理：限额（每个Key 50/秒、30000/天）、Key池、响应缓存
+    限额是按Key计算的，限额器以Key命名（与接口无关），多个接口可共用同一个代理
+    :param key:         一个Key，或多个Key（Key池）
+    :param http_cache:  响应缓存的文件夹，None为不缓存
+    :param ttl:         每个接口的缓存有效期，{url: 秒}
+    """
+    return urllibagent.UrllibAgent(
+        "AMap"
+        ,urllibagent.RequestLimitsRule(50, 1, burst=5)      #50/秒，平滑发出
+        ,urllibagent.RequestLimitsRule(30000, 24 * 60 * 60) #30000/天
+        ,num_workers = num_workers
+        ,keys = key_list(key)
+        ,is_key_exhausted = is_key_exhausted
+        ,cache = create_response_cache(http_cache, ttl)
+    )
@@ -0,0 +1,409 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 模拟的高德接口（离线性能测试用）
+@Desc    :
+    1. /v3/place/polygon：多边形搜索POI。每个类型的POI为固定的随机点（部分聚集、部分均匀，部分POI属于多个类型），
+        按多边形筛选、分页返回，总数的上限与官方一致
+    2. /v3/config/district：行政区查询。任意关键字都返回同一个模拟的城市（不规则多边形）及其下一级行政区，
+        关键字为下一级行政区的adcode或名称时返回该行政区
+    3. 可设置延迟、POI密度、错误率（超出QPS），以及每个Key的额度（用尽后返回额度超限）
+    4. 回放：按请求参数（不含Key）匹配JSON Lines格式的录制文件，每行{"path", "params", "response"}；也可录制
+    5. /__stats：已处理的请求数（按接口、按Key），即消耗的额度
+
+    python -m benchmarks.mockserver --port 8765 --latency 0.02 --density 10000
+"""
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy
+import shapely
+
+POLYGON_PATH = "/v3/place/polygon"
+DISTRICT_PATH = "/v3/config/district"
+STATS_PATH = "/__stats"
+
+class MockAMap:
+    """模拟的高德接口（数据与逻辑，不含HTTP）
+    :param extent:      模拟城市的范围，[minlng, maxlng, minlat, maxlat]
+    :param density:     每个类型每平方度的POI数
+    :param clustered:   聚集在几个中心附近的POI的比例（其余均匀分布）
+    :param overlap:     同时属于其他类型的POI的比例（用于测试去重）
+    :param max_count:   一次查询最多返回的POI数（官方约为1000）
+    :param latency:     每个请求的平均延迟，单位：秒（指数分布）
+    :param error_rate:  返回"超出QPS"错误的比例
+    :param key_quota:   每个Key的额度，用尽后返回"额度超限"，None为不限
+    :param fixtures:    回放的录制文件（JSON Lines），None为不回放
+    :param record:      录制文件，生成的响应追加到此文件，None为不录制
+    :param seed:        随机种子
+    """
+    def __init__(self
+        , extent=(121.0, 122.0, 31.0, 32.0)
+        , density=10000
+        , clustered=0.5
+        , overlap=0.1
+        , max_count=1000
+        , latency=0.01
+        , error_rate=0.0
+        , key_quota=None
+        , fixtures=None
+        , record=None
+        , seed=0
+        ) -> None:
+        self.extent = list(extent)
+        self.density = density
+        self.clustered = clustered
+        self.overlap = overlap
+        self.max_count = max_count
+        self.latency = latency
+        self.error_rate = error_rate
+        self.key_quota = key_quota
+        self.record = record
+        self.seed = seed
+
+        self.boundary = self.__create_boundary()
+        self.children = self.__create_children()
+        shapely.prepare(self.boundary)
+        self.fixtures = self.load_fixtures(fixtures) if fixtures else {}
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.clouds = {}            #typecode -> (ids, x, y)
+        self.requests = {}          #path -> 请求数
+        self.keys = {}              #key -> 请求数
+        self.stats = {"errors" : 0, "replayed" : 0, "pois" : 0}
+
+    @staticmethod
+    def fixture_key(path, params):
+        """录制文件的匹配键：接口 + 规范化的参数（不含Key）
+        """
+        items = sorted((str(name), str(value)) for name, value in params.items() if name != "key")
+        return f"{path}?{urllib.parse.urlencode(items)}"
+
+    @classmethod
+    def load_fixtures(cls, fp):
+        fixtures = {}
+        with open(fp, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if len(line)==0:
+                    continue
+                record = json.loads(line)
+                fixtures[cls.fixture_key(record["path"], record["params"])] = record["response"]
+        return fixtures
+
+    def handle(self, path, params):
+        """处理一个请求
+        :return: 响应（可JSON序列化），接口不存在时为None
+        """
+        if path not in (POLYGON_PATH, DISTRICT_PATH):
+            return None
+
+        key = params.get("key", "")
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.keys[key] = self.keys.get(key, 0) + 1
+            used = self.keys[key]
+            failed = self.random.random() < self.error_rate
+            delay = self.random.expovariate(1 / self.latency) if self.latency > 0 else 0
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.key_quota is not None and used > self.key_quota:
+            return self.__error("USER_DAILY_QUERY_OVER_LIMIT", "10044")
+        if failed:
+            return self.__error("CUQPS_HAS_EXCEEDED_THE_LIMIT", "10021")
+
+        fixture_key = self.fixture_key(path, params)
+        if fixture_key in self.fixtures:
+            with self.lock:
+                self.stats["replayed"] += 1
+            return self.fixtures[fixture_key]
+
+        if path == POLYGON_PATH:
+            response = self.polygon(params)
+        else:
+            response = self.district(params)
+
+        if self.record is not None:
+            line = json.dumps({"path" : path, "params" : params, "response" : response}, ensure_ascii=False)
+            with self.lock:
+                with open(self.record, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        return response
+
+    def polygon(self, params):
+        """多边形搜索POI
+        """
+        try:
+            polygon = self.__parse_polygon(params["polygon"])
+            page = max(1, int(params.get("page", 1)))
+            offset = int(params.get("offset", 20))
+        except (KeyError, ValueError):
+            return self.__error("INVALID_PARAMS", "20000")
+
+        ids, x, y = self.__cloud(str(params.get("types", "")))
+        minx, miny, maxx, maxy = polygon.bounds
+        candidates = numpy.flatnonzero((x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy))
+        inside = candidates[shapely.contains_xy(polygon, x[candidates], y[candidates])]
+        inside = inside[:self.max_count]
+
+        rows = inside[(page - 1) * offset : page * offset]
+        pois = [self.__poi(ids[i], x[i], y[i], params.get("types", "")) for i in rows]
+        with self.lock:
+            self.stats["pois"] += len(pois)
+        return {
+            "status" : "1", "count" : str(len(inside)), "info" : "OK", "infocode" : "10000",
+            "suggestion" : {"keywords" : [], "cities" : []},
+            "pois" : pois
+        }
+
+    def district(self, params):
+        """行政区查询：关键字为下一级行政区的adcode或名称时，返回该行政区（带边界）；
+            否则返回模拟的城市（带边界），subdistrict>=1时带下一级行政区（2x2划分，不带边界，与官方一致）
+        """
+        keyword = str(params.get("keywords", ""))
+        subdistrict = int(params.get("subdistrict", 1) or 0)
+
+        for child in self.children:
+            if keyword in (child["adcode"], child["name"]):
+                return self.__district_response(child, [])
+
+        city = {"adcode" : "990100", "name" : keyword, "level" : "city", "geometry" : self.boundary}
+        return self.__district_response(city, self.children if subdistrict >= 1 else [])
+
+    def summary(self):
+        with self.lock:
+            return {
+                "requests" : dict(self.requests),
+                "total" : sum(self.requests.values()),
+                "keys" : dict(self.keys),
+                **self.stats
+            }
+
+    def __error(self, info, infocode):
+        with self.lock:
+            self.stats["errors"] += 1
+        return {"status" : "0", "info" : info, "infocode" : infocode}
+
+    def __create_boundary(self):
+        """模拟城市的边界：范围内的不规则多边形（有凹处，四角在边界外，用于测试裁剪）
+        """
+        minlng, maxlng, minlat, maxlat = self.extent
+        cx, cy = (minlng + maxlng) / 2, (minlat + maxlat) / 2
+        rx, ry = (maxlng - minlng) / 2, (maxlat - minlat) / 2
+        angles = numpy.linspace(0, 2 * numpy.pi, 48, endpoint=False)
+        radius = 0.8 + 0.15 * numpy.sin(3 * angles) + 0.05 * numpy.cos(7 * angles)
+        return shapely.Polygon(numpy.column_stack([cx + rx * radius * numpy.cos(angles), cy + ry * radius * numpy.sin(angles)]))
+
+    def __create_children(self):
+        """下一级行政区：边界按2x2划分
+        """
+        minlng, maxlng, minlat, maxlat = self.extent
+        lng_step = (maxlng - minlng) / 2
+        lat_step = (maxlat - minlat) / 2
+
+        children = []
+        for i, (c, r) in enumerate(((0, 0), (1, 0), (0, 1), (1, 1)), 1):
+            part = shapely.box(minlng + c * lng_step, minlat + r * lat_step, minlng + (c+1) * lng_step, minlat + (r+1) * lat_step)
+            children.append({
+                "adcode" : f"99010{i}", "name" : f"模拟{i}区", "level" : "district",
+                "geometry" : shapely.intersection(part, self.boundary)
+            })
+        return children
+
+    def __district_response(self, district, children):
+        def to_json(district, polyline):
+            center = district["geometry"].centroid
+            obj = {
+                "citycode" : "0999", "adcode" : district["adcode"], "name" : district["name"],
+                "level" : district["level"], "center" : f"{center.x:.6f},{center.y:.6f}", "districts" : []
+            }
+            if polyline:
+                obj["polyline"] = self.__polyline(district["geometry"])
+            return obj
+
+        district = to_json(district, True)
+        district["districts"] = [to_json(child, False) for child in children]
+        return {
+            "status" : "1", "info" : "OK", "infocode" : "10000", "count" : "1",
+            "suggestion" : {"keywords" : [], "cities" : []},
+            "districts" : [district]
+        }
+
+    def __cloud(self, typecode):
+        """某类型的POI（固定的随机点，位于边界内）
+        """
+        with self.lock:
+            if typecode in self.clouds:
+                return self.clouds[typecode]
+
+            base = self.__points("base")
+            own = self.__points(typecode)
+            rng = numpy.random.default_rng(self.__seed("overlap" + typecode))
+            shared = rng.random(len(base[0])) < self.overlap    #同时属于其他类型的POI
+
+            ids = numpy.concatenate([base[0][shared], own[0]])
+            x = numpy.concatenate([base[1][shared], own[1]])
+            y = numpy.concatenate([base[2][shared], own[2]])
+
+            order = numpy.argsort(ids, kind="stable")   #固定的返回顺序
+            cloud = (ids[order], x[order], y[order])
+            self.clouds[typecode] = cloud
+            return cloud
+
+    def __points(self, name):
+        minlng, maxlng, minlat, maxlat = self.extent
+        rng = numpy.random.default_rng(self.__seed(name))
+        n = int(self.density * (maxlng - minlng) * (maxlat - minlat))
+        n_clustered = int(n * self.clustered)
+
+        x = rng.uniform(minlng, maxlng, n)
+        y = rng.uniform(minlat, maxlat, n)
+        centers = rng.integers(0, 6, n_clustered)
+        center_x = rng.uniform(minlng, maxlng, 6)
+        center_y = rng.uniform(minlat, maxlat, 6)
+        x[:n_clustered] = center_x[centers] + rng.normal(0, (maxlng - minlng) * 0.03, n_clustered)
+        y[:n_clustered] = center_y[centers] + rng.normal(0, (maxlat - minlat) * 0.03, n_clustered)
+
+        inside = shapely.contains_xy(self.boundary, x, y)
+        ids = numpy.array([f"B{self.__seed(name) % 100000:05d}{i:07d}" for i in range(n)], dtype=object)
+        return ids[inside], x[inside], y[inside]
+
+    def __seed(self, name):
+        return int.from_bytes(hashlib.blake2b(f"{self.seed}-{name}".encode("utf-8"), digest_size=4).digest(), "little")
+
+    @staticmethod
+    def __poi(_id, lng, lat, typecode):
+        """一个POI（与extensions=all的字段一致）
+        """
+        return {
+            "parent" : [], "distance" : [], "pcode" : "990000", "importance" : [],
+            "biz_ext" : {"cost" : [], "rating" : "4.5"}, "recommend" : "0", "type" : "模拟;模拟;模拟",
+            "photos" : [{"title" : [], "url" : f"http://store.is.autonavi.com/showpic/{_id}"}],
+            "discount_num" : "0", "gridcode" : "4621646311", "typecode" : typecode, "shopinfo" : "0",
+            "poiweight" : [], "citycode" : "0999", "adname" : "模拟区", "children" : [], "alias" : [],
+            "tel" : [], "id" : _id, "tag" : [], "event" : [], "entr_location" : [], "indoor_map" : "0",
+            "email" : [], "timestamp" : "2026-10-18 00:00:00", "website" : [], "address" : f"模拟路{_id[-4:]}号",
+            "adcode" : "990101", "pname" : "模拟省", "biz_type" : [], "cityname" : "模拟市", "postcode" : [],
+            "match" : "0", "business_area" : [], "indoor_data" : {"cmsid" : [], "truefloor" : [], "cpid" : [], "floor" : []},
+            "childtype" : [], "exit_location" : [], "name" : f"模拟POI{_id}",
+            "location" : f"{lng:.6f},{lat:.6f}", "shopid" : [], "navi_poiid" : [], "groupbuy_num" : "0"
+        }
+
+    @staticmethod
+    def __parse_polygon(polygon_str):
+        """polygon参数：两个点为矩形（左上、右下），多个点为多边形
+        """
+        coords = [tuple(map(float, point.split(","))) for point in polygon_str.split("|")]
+        if len(coords) == 2:
+            (lng1, lat1), (lng2, lat2) = coords
+            return shapely.box(min(lng1, lng2), min(lat1, lat2), max(lng1, lng2), max(lat1, lat2))
+        return shapely.Polygon(coords)
+
+    @staticmethod
+    def __polyline(boundary):
+        """边界 => AMap HTTP Polyline字符串，"|"分隔每一个多边形
+        """
+        return "|".join(
+            ";".join(f"{lng:.6f},{lat:.6f}" for lng, lat in part.exterior.coords)
+            for part in shapely.get_parts(boundary)
+        )
+
+class MockAMapServer:
+    """模拟的高德接口的HTTP服务（HTTP/1.1长连接，支持gzip）
+    :param port:    端口，0为随机选择
+    :param options: 见MockAMap
+    """
+    def __init__(self, port=0, host="127.0.0.1", **options) -> None:
+        self.amap = MockAMap(**options)
+        amap = self.amap
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                if url.path == STATS_PATH:
+                    response = amap.summary()
+                else:
+                    response = amap.handle(url.path, params)
+                if response is None:
+                    self.send_error(404)
+                    return
+
+                body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json;charset=UTF-8")
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body, 1)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程中运行
+        """
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def serve(port_queue=None, **options):
+    """运行服务直到进程结束（用于子进程），端口放入port_queue
+    """
+    server = MockAMapServer(**options)
+    if port_queue is not None:
+        port_queue.put(server.server.server_address[1])
+    server.server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="模拟的高德接口")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.01, help="平均延迟，单位：秒")
+    parser.add_argument("--density", type=float, default=10000, help="每个类型每平方度的POI数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回超出QPS错误的比例")
+    parser.add_argument("--key-quota", type=int, default=None, help="每个Key的额度")
+    parser.add_argument("--fixtures", default=None, help="回放的录制文件（JSON Lines）")
+    parser.add_argument("--record", default=None, help="录制文件")
+    args = parser.parse_args()
+
+    server = MockAMapServer(args.port
+        , latency = args.latency
+        , density = args.density
+        , error_rate = args.error_rate
+        , key_quota = args.key_quota
+        , fixtures = args.fixtures
+        , record = args.record
+    )
+    print(f"模拟的高德接口：{server.url}{POLYGON_PATH}、{server.url}{DISTRICT_PATH}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,412 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 离线性能测试（不消耗额度）
+@Desc    :
+    1. 在子进程中运行模拟的高德接口（见benchmarks.mockserver），AMapPOIAPI、AMapRegionAPI的URL指向它
+    2. 每个场景在单独的子进程中运行（峰值内存互不影响），工作目录为临时文件夹（限额器存档、输出不写入工程）
+        limiter：     限额器与Key池的开销（不请求）
+        agent：       UrllibAgent并发请求（请求、解码的吞吐）
+        poi：         AMapPOIAPI下载（行政区查询、裁剪网格、自适应划分、去重、保存）
+        postprocess： 对下载结果做坐标转换、逆地理编码、合并
+    3. 统计每秒请求数、每秒POI数、峰值内存（RSS）、每个POI消耗的额度（模拟接口收到的请求数 / POI数）
+    4. 结果保存为JSON；指定--baseline时与之比较，变差超过--tolerance则返回非0（用于发现性能退化）
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scenarios poi --latency 0.05 --error-rate 0.01 --out bench.json
+    python -m benchmarks.run --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import multiprocessing
+
+from benchmarks import mockserver
+
+SCENARIOS = ("limiter", "agent", "poi", "postprocess")
+
+#比较基准时的指标方向：越大越好、越小越好
+HIGHER_IS_BETTER = ("ops_per_second", "requests_per_second", "pois_per_second", "features_per_second")
+LOWER_IS_BETTER = ("peak_rss_mb", "quota_per_poi")
+
+#模拟的POI类型
+TYPENAMECODES = [
+    ["餐饮服务", "050000"],
+    ["购物服务", "060000"],
+    ["生活服务", "070000"],
+    ["商务住宅", "120000"],
+]
+
+def peak_rss_mb():
+    """本进程的峰值内存（RSS），单位：MB，不支持的平台为None
+    """
+    try:
+        import resource
+    except ImportError:     #Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Linux为KB，macOS为字节
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+def server_stats(url):
+    """模拟接口已处理的请求数（即消耗的额度）
+    """
+    import urllib.request
+    with urllib.request.urlopen(url + mockserver.STATS_PATH, timeout=10) as response:
+        return json.loads(response.read())
+
+def bench_keys(config):
+    return [f"bench-key-{i:02d}" for i in range(config["num_keys"])]
+
+def create_agent(config, name="AMap"):
+    """与utils.create_agent相同的请求代理，每个Key的QPS可设置
+    """
+    from amap_api import utils
+    from common import urllibagent
+
+    return urllibagent.UrllibAgent(
+        name
+        ,urllibagent.RequestLimitsRule(config["qps"], 1, burst=5)
+        ,urllibagent.RequestLimitsRule(10**9, 24 * 60 * 60)     #模拟接口：日额度由--key-quota控制
+        ,num_workers = config["num_workers"]
+        ,keys = bench_keys(config)
+        ,is_key_exhausted = utils.is_key_exhausted
+    )
+
+#
+# 场景（在子进程中运行，返回指标）
+#
+def bench_limiter(config, url):
+    """限额器与Key池的开销：规则不限速，测量每次获取份额的耗时
+    """
+    from common import limiter
+
+    n = config["limiter_ops"]
+    rule = limiter.RequestLimitsRule(10**9, 1)
+
+    single = limiter.RequestLimiter("bench-limiter", rule)
+    start_time = time.perf_counter()
+    for _ in range(n):
+        single.wait()
+    single_seconds = time.perf_counter() - start_time
+
+    pool = limiter.KeyPool("bench-pool", bench_keys(config), rule)
+    start_time = time.perf_counter()
+    for _ in range(n):
+        pool.acquire()
+    pool_seconds = time.perf_counter() - start_time
+
+    return {
+        "ops" : n,
+        "seconds" : round(single_seconds + pool_seconds, 3),
+        "ops_per_second" : round(n / single_seconds, 1),
+        "key_pool_ops_per_second" : round(n / pool_seconds, 1),
+    }
+
+def bench_agent(config, url):
+    """UrllibAgent并发请求：随机方格的第一页POI
+    """
+    from amap_api import poi
+
+    agent = create_agent(config, "BenchAgent")
+    minlng, maxlng, minlat, maxlat = config["extent"]
+    rng = random.Random(config["seed"])
+    size = (maxlng - minlng) / 8
+
+    many_params = []
+    for i in range(config["agent_requests"]):
+        lng = rng.uniform(minlng, maxlng - size)
+        lat = rng.uniform(minlat, maxlat - size)
+        many_params.append({
+            "polygon" : f"{lng:.6f},{lat + size:.6f}|{lng + size:.6f},{lat:.6f}",
+            "keywords" : TYPENAMECODES[i % len(TYPENAMECODES)][0],
+            "types" : TYPENAMECODES[i % len(TYPENAMECODES)][1],
+            "offset" : "20", "page" : "1", "extensions" : "all", "output" : "json",
+            "city" : config["city"], "citylimit" : True
+        })
+
+    start_time = time.perf_counter()
+    results = agent.request_many(poi.AMapPOIAPI.URL, many_params)
+    seconds = time.perf_counter() - start_time
+
+    pois = sum(len(result.get("pois", [])) for result in results)
+    timing = agent.mean_timing()
+    return {
+        "requests" : len(many_params),
+        "seconds" : round(seconds, 3),
+        "requests_per_second" : round(len(many_params) / seconds, 1),
+        "pois" : pois,
+        "pois_per_second" : round(pois / seconds, 1),
+        "mean_decode_ms" : round(timing["decode"] * 1000, 3),
+        "decoder" : agent.decoder.backend,
+        "metrics" : agent.metrics.stats(),
+    }
+
+def bench_poi(config, url):
+    """AMapPOIAPI下载：行政区查询、裁剪网格、自适应划分、去重、保存
+    """
+    from amap_api import poi
+
+    agent = create_agent(config)
+    api = poi.AMapPOIAPI(
+        bench_keys(config)
+        , config["city"]
+        , TYPENAMECODES[:config["num_types"]]
+        , save_field = ["id", "name", "type", "typecode", "address", "adcode", "adname", "timestamp"]
+        , out_dir = "poi"
+        , num_row = config["grid"]
+        , num_col = config["grid"]
+        , num_per_save = config["num_per_save"]
+        , load_cache = False
+        , adaptive = True
+        , num_workers = config["num_workers"]
+        , out_format = config["out_format"]
+        , agent = agent
+        , clip = True
+        , boundary_store = "boundary.geodoer.sqlite"
+    )
+
+    start_time = time.perf_counter()
+    api.start()
+    seconds = time.perf_counter() - start_time
+
+    stats = agent.metrics.stats()
+    requests = stats["counters"].get("requests_total", 0)
+    pois = api.state["poi_count"]
+    return {
+        "requests" : requests,
+        "seconds" : round(seconds, 3),
+        "requests_per_second" : round(requests / seconds, 1),
+        "pois" : pois,
+        "pois_per_second" : round(pois / seconds, 1),
+        "duplicates" : api.state["dup_count"],
+        "splits" : api.state["split_count"],
+        "metrics" : stats,
+    }
+
+def bench_postprocess(config, url):
+    """后处理：先下载（不计时），再对结果做坐标转换、逆地理编码、合并
+    """
+    from amap_api import region
+    from common import boundarystore
+    from common import geoindex
+    from others import post_processing
+
+    bench_poi(config, url)
+
+    in_files = [file for file in post_processing.osutils.get_all_file("poi") if post_processing.is_gis_data(file)]
+    os.makedirs("wgs84", exist_ok=True)
+    os.makedirs("geocoded", exist_ok=True)
+
+    # 逆地理编码的索引：模拟城市的下一级行政区 + 10x10网格
+    store = boundarystore.BoundaryStore("boundary.geodoer.sqlite")
+    regionutil = region.AMapRegionAPI(bench_keys(config), agent=create_agent(config), boundary_store=store)
+    city = store.resolve(config["city"])
+    regionutil.get_boundaries([child["code"] for child in store.children(city)])
+    indexes = {
+        "district" : geoindex.PolygonIndex.from_store(store, "district"),
+        "grid_id" : geoindex.GridIndex(config["extent"], 10, 10),
+    }
+
+    timing = {}
+    features = 0
+
+    start_time = time.perf_counter()
+    for file in in_files:
+        post_processing.gcj02_to_wgs84(file, post_processing.osutils.get_outfp(file, "wgs84", "parquet"))
+    timing["gcj02_to_wgs84"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for file in post_processing.osutils.get_all_file("wgs84"):
+        features += post_processing.reverse_geocode(file, post_processing.osutils.get_outfp(file, "geocoded"), indexes)
+    timing["reverse_geocode"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    merged = post_processing.merge_dataset("geocoded", "merged.parquet", dedup_field="id")
+    timing["merge_dataset"] = time.perf_counter() - start_time
+
+    seconds = sum(timing.values())
+    return {
+        "features" : features,
+        "merged" : merged,
+        "seconds" : round(seconds, 3),
+        "features_per_second" : round(features / seconds, 1),
+        "stage_seconds" : {name : round(value, 3) for name, value in timing.items()},
+    }
+
+BENCHES = {
+    "limiter" : bench_limiter,
+    "agent" : bench_agent,
+    "poi" : bench_poi,
+    "postprocess" : bench_postprocess,
+}
+
+def run_scenario(name, config, url, queue):
+    """子进程：在临时文件夹中运行一个场景，结果放入queue
+    """
+    if not config["verbose"]:   #不输出下载进度
+        sys.stdout = open(os.devnull, "w", encoding="utf-8")
+
+    from amap_api import poi
+    from amap_api import region
+
+    poi.AMapPOIAPI.URL = url + mockserver.POLYGON_PATH
+    region.AMapRegionAPI.URL = url + mockserver.DISTRICT_PATH
+
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as work_dir:
+            os.chdir(work_dir)
+            before = server_stats(url)
+            result = BENCHES[name](config, url)
+            after = server_stats(url)
+
+            # 消耗的额度：模拟接口收到的请求数（含错误、重试）
+            result["quota"] = after["total"] - before["total"]
+            result["server_errors"] = after["errors"] - before["errors"]
+            result["replayed"] = after["replayed"] - before["replayed"]
+            if "pois" in result:
+                result["quota_per_poi"] = round(result["quota"] / max(1, result["pois"]), 4)
+            result["peak_rss_mb"] = peak_rss_mb()
+            os.chdir(os.path.dirname(work_dir))
+        queue.put((name, result, None))
+    except Exception as e:
+        queue.put((name, None, repr(e)))
+
+def run(config, scenarios):
+    """运行模拟接口与各场景
+    :return: {场景: 指标}
+    """
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+    server = context.Process(target=mockserver.serve, args=(port_queue,), kwargs=config["server"], daemon=True)
+    server.start()
+
+    results = {}
+    try:
+        url = f"http://127.0.0.1:{port_queue.get(timeout=60)}"
+        for name in scenarios:
+            queue = context.Queue()
+            process = context.Process(target=run_scenario, args=(name, config, url, queue))
+            process.start()
+            _name, result, error = queue.get()
+            process.join()
+
+            if error is not None:
+                print(f"[{name}] [Error] {error}")
+                results[name] = {"error" : error}
+                continue
+            results[name] = result
+            print(f"[{name}] " + "，".join(f"{key}={value}" for key, value in summary(result).items()))
+    finally:
+        server.terminate()
+        server.join()
+    return results
+
+def summary(result):
+    """结果中用于比较的指标
+    """
+    return {key : result[key] for key in HIGHER_IS_BETTER + LOWER_IS_BETTER + ("seconds", "quota") if result.get(key) is not None}
+
+def compare(results, baseline, tolerance):
+    """与基准比较
+    :param tolerance: 允许变差的比例（如0.2为20%）
+    :return: 变差超过tolerance的指标，[(场景, 指标, 基准值, 当前值)]
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name, None)
+        if base is None or "error" in result:
+            continue
+
+        for key in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            old, new = base.get(key, None), result.get(key, None)
+            if not old or new is None:
+                continue
+            change = (old - new) / old if key in HIGHER_IS_BETTER else (new - old) / old
+            if change > tolerance:
+                regressions.append((name, key, old, new))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="离线性能测试（模拟的高德接口，不消耗额度）")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--out", default="bench-results.geodoer.json", help="结果文件")
+    parser.add_argument("--baseline", default=None, help="基准结果文件，变差超过--tolerance时返回1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许变差的比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="输出各场景的下载进度")
+    #模拟接口
+    parser.add_argument("--latency", type=float, default=0.01, help="平均延迟，单位：秒")
+    parser.add_argument("--density", type=float, default=10000, help="每个类型每平方度的POI数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回超出QPS错误的比例")
+    parser.add_argument("--key-quota", type=int, default=None, help="每个Key的额度，用尽后停用（测试Key池）")
+    parser.add_argument("--fixtures", default=None, help="回放的录制文件（JSON Lines，每行{path, params, response}）")
+    parser.add_argument("--record", default=None, help="把生成的响应录制到此文件")
+    #下载
+    parser.add_argument("--num-workers", type=int, default=8, help="并发请求数")
+    parser.add_argument("--num-keys", type=int, default=4, help="Key数")
+    parser.add_argument("--qps", type=float, default=50, help="每个Key的QPS")
+    parser.add_argument("--num-types", type=int, default=len(TYPENAMECODES), help="POI类型数")
+    parser.add_argument("--grid", type=int, default=3, help="初始网格的行列数")
+    parser.add_argument("--out-format", default="geojsonl", choices=["geojsonl", "parquet", "geojson"])
+    parser.add_argument("--agent-requests", type=int, default=500, help="agent场景的请求数")
+    parser.add_argument("--limiter-ops", type=int, default=20000, help="limiter场景的获取份额次数")
+    args = parser.parse_args()
+
+    extent = [121.0, 122.0, 31.0, 32.0]
+    config = {
+        "city" : "模拟市",
+        "extent" : extent,
+        "seed" : args.seed,
+        "verbose" : args.verbose,
+        "num_workers" : args.num_workers,
+        "num_keys" : args.num_keys,
+        "qps" : args.qps,
+        "num_types" : args.num_types,
+        "grid" : args.grid,
+        "num_per_save" : 5000,
+        "out_format" : args.out_format,
+        "agent_requests" : args.agent_requests,
+        "limiter_ops" : args.limiter_ops,
+        "server" : {
+            "extent" : extent,
+            "latency" : args.latency,
+            "density" : args.density,
+            "error_rate" : args.error_rate,
+            "key_quota" : args.key_quota,
+            "fixtures" : os.path.abspath(args.fixtures) if args.fixtures else None,
+            "record" : os.path.abspath(args.record) if args.record else None,
+            "seed" : args.seed,
+        },
+    }
+
+    results = run(config, args.scenarios)
+    report = {
+        "time" : time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python" : platform.python_version(),
+        "platform" : platform.platform(),
+        "config" : config,
+        "results" : results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"结果已保存到{args.out}")
+
+    failed = [name for name, result in results.items() if "error" in result]
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, key, old, new in regressions:
+            print(f"[Regression] {name}.{key}: {old} => {new}")
+        if regressions:
+            sys.exit(1)
+        print(f"与基准{args.baseline}相比，没有超过{args.tolerance:.0%}的退化")
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,199 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 行政区边界的本地存储
+@Desc    :
+    1. 以行政区编码（adcode）为键，保存边界（zlib压缩的WKB）、范围、名称、级别与上下级关系
+    2. 保存在SQLite数据库中，范围建有R树索引（SQLite R*Tree），可在本地查询"某点位于哪些行政区"
+    3. 记录搜索关键字对应的编码，再次搜索时直接从磁盘读取，不必请求接口
+"""
+import zlib
+import sqlite3
+import threading
+
+import shapely
+
+class BoundaryStore:
+    """行政区边界的本地存储（SQLite + R树）
+    :param fp: 数据库文件
+    """
+    def __init__(self, fp="boundary.geodoer.sqlite") -> None:
+        self.fp = fp
+        self._lock = threading.Lock()
+        self._conn = self.__connect()
+        self._geometries = {}   #code -> 边界（已解压、已解析的缓存）
+
+    def put(self, code, geometry=None, name=None, level=None, parent=None, center=None, citycode=None):
+        """保存一个行政区（已存在则更新，值为None的字段保持不变）
+        :param code:        行政区编码（adcode）
+        :param geometry:    边界，shapely的(Multi)Polygon
+        :param parent:      上级行政区的编码
+        :param center:      中心点，"lng,lat"
+        """
+        blob = None
+        bounds = (None, None, None, None)
+        if geometry is not None:
+            blob = zlib.compress(shapely.to_wkb(geometry))
+            minx, miny, maxx, maxy = geometry.bounds
+            bounds = (minx, maxx, miny, maxy)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO districts (code, name, level, parent, center, citycode, minx, maxx, miny, maxy, geometry) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(code) DO UPDATE SET "
+                "name=COALESCE(excluded.name, name), level=COALESCE(excluded.level, level), "
+                "parent=COALESCE(excluded.parent, parent), center=COALESCE(excluded.center, center), "
+                "citycode=COALESCE(excluded.citycode, citycode), "
+                "minx=COALESCE(excluded.minx, minx), maxx=COALESCE(excluded.maxx, maxx), "
+                "miny=COALESCE(excluded.miny, miny), maxy=COALESCE(excluded.maxy, maxy), "
+                "geometry=COALESCE(excluded.geometry, geometry)",
+                (code, name, level, parent, center, citycode, *bounds, blob)
+            )
+            if geometry is not None:
+                _id = self._conn.execute("SELECT id FROM districts WHERE code=?", (code,)).fetchone()[0]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO districts_rtree (id, minx, maxx, miny, maxy) VALUES (?, ?, ?, ?, ?)",
+                    (_id, *bounds)
+                )
+                self._geometries.pop(code, None)
+
+    def alias(self, keyword, code):
+        """记录搜索关键字（名称、citycode等）对应的行政区编码
+        """
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO aliases (keyword, code) VALUES (?, ?)", (str(keyword), code))
+
+    def resolve(self, keyword):
+        """搜索关键字 => 行政区编码（关键字本身为已保存的编码时，即为该编码）
+        :return: 编码，未保存时为None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT code FROM aliases WHERE keyword=?", (str(keyword),)).fetchone()
+            if row is None:
+                row = self._conn.execute("SELECT code FROM districts WHERE code=?", (str(keyword),)).fetchone()
+        return None if row is None else row[0]
+
+    def get(self, code):
+        """行政区的属性
+        :return: {"code", "name", "level", "parent", "center", "citycode", "rect"}，不存在时为None
+        """
+        rows = self.__query("WHERE code=?", (code,))
+        return rows[0] if len(rows)>0 else None
+
+    def geometry(self, code):
+        """行政区的边界
+        :return: shapely的(Multi)Polygon，不存在（或未保存边界）时为None
+        """
+        if code in self._geometries:
+            return self._geometries[code]
+
+        with self._lock:
+            row = self._conn.execute("SELECT geometry FROM districts WHERE code=?", (code,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+
+        geometry = shapely.from_wkb(zlib.decompress(row[0]))
+        shapely.prepare(geometry)
+        self._geometries[code] = geometry
+        return geometry
+
+    def rect(self, code):
+        """行政区的范围
+        :return: minlng, maxlng, minlat, maxlat，不存在（或未保存边界）时为None
+        """
+        district = self.get(code)
+        return None if district is None else district["rect"]
+
+    def children(self, code):
+        """下级行政区
+        """
+        return self.__query("WHERE parent=? ORDER BY code", (code,))
+
+    def parents(self, code):
+        """所有上级行政区（由近到远）
+        """
+        parents = []
+        visited = {code}
+        district = self.get(code)
+        while district is not None and district["parent"] is not None and district["parent"] not in visited:
+            visited.add(district["parent"])
+            district = self.get(district["parent"])
+            if district is not None:
+                parents.append(district)
+        return parents
+
+    def contains(self, lng, lat, level=None):
+        """点位于哪些行政区（R树筛选候选，再精确判断）
+        :param level: 只返回此级别的行政区（如"district"），None为所有级别
+        :return: 包含此点的行政区，按范围从小到大排序
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.code FROM districts_rtree r JOIN districts d ON d.id = r.id "
+                "WHERE r.minx<=? AND r.maxx>=? AND r.miny<=? AND r.maxy>=?",
+                (lng, lng, lat, lat)
+            ).fetchall()
+
+        districts = []
+        for (code,) in rows:
+            district = self.get(code)
+            if level is not None and district["level"] != level:
+                continue
+            if shapely.contains_xy(self.geometry(code), lng, lat):
+                districts.append(district)
+
+        districts.sort(key=lambda d: (d["rect"][1] - d["rect"][0]) * (d["rect"][3] - d["rect"][2]))
+        return districts
+
+    def codes(self):
+        """所有已保存边界的行政区编码
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT code FROM districts WHERE geometry IS NOT NULL ORDER BY code")]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM districts").fetchone()[0]
+
+    def close(self):
+        if self._conn is None:
+            return
+        self._conn.close()
+        self._conn = None
+
+    def __query(self, where, args):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT code, name, level, parent, center, citycode, minx, maxx, miny, maxy FROM districts " + where,
+                args
+            ).fetchall()
+        return [
+            {
+                "code" : code,
+                "name" : name,
+                "level" : level,
+                "parent" : parent,
+                "center" : center,
+                "citycode" : citycode,
+                "rect" : None if minx is None else (minx, maxx, miny, maxy)
+            }
+            for code, name, level, parent, center, citycode, minx, maxx, miny, maxy in rows
+        ]
+
+    def __connect(self):
+        conn = sqlite3.connect(self.fp, timeout=60, check_same_thread=False)
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS districts ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "code TEXT NOT NULL UNIQUE, "
+                "name TEXT, level TEXT, parent TEXT, center TEXT, citycode TEXT, "
+                "minx REAL, maxx REAL, miny REAL, maxy REAL, "
+                "geometry BLOB)"       #zlib压缩的WKB
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS districts_parent ON districts (parent)")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS districts_rtree USING rtree(id, minx, maxx, miny, maxy)")
+            conn.execute("CREATE TABLE IF NOT EXISTS aliases (keyword TEXT PRIMARY KEY, code TEXT NOT NULL)")
+        return conn
@@ -0,0 +1,158 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : HTTP长连接池
+@Desc    :
+    1. 每个host保存空闲的连接（HTTP/1.1 keep-alive），各线程共用，不必每次请求都重新握手
+    2. 请求gzip压缩，并自动解压
+    3. 统计每次请求的耗时：连接、首字节（TTFB）、读取响应体
+    4. 代理与urllib一致（HTTP(S)_PROXY、NO_PROXY或系统设置）：HTTPS经代理的CONNECT隧道，HTTP直接发给代理
+"""
+import gzip
+import time
+import base64
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+
+class ConnectionPool:
+    """HTTP(S)长连接池
+        每个host保存空闲的连接，请求时取出一个（没有则新建），请求完成后放回
+        连接不属于某个线程，线程池换了新线程也能复用
+    :param timeout: 连接与读取的超时时间，单位：秒
+    """
+    def __init__(self, timeout=30) -> None:
+        self.timeout = timeout
+        self.proxies = urllib.request.getproxies()  #{scheme: 代理的url}
+        self._idle = {}     #(scheme, netloc) -> 空闲的连接
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        """取出此url的host的一个空闲连接，没有则新建
+        :return: (是否为新建的连接, 连接)
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            idle = self._idle.get(key, None)
+            if idle:
+                return False, idle.pop()
+        return True, self.__connection(parts, self.__proxy(parts))
+
+    def release(self, url, conn):
+        """请求完成，放回连接
+        """
+        parts = urllib.parse.urlsplit(url)
+        with self._lock:
+            self._idle.setdefault((parts.scheme, parts.netloc), []).append(conn)
+
+    def close(self):
+        """关闭所有空闲的连接
+        """
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn in idle]
+            self._idle = {}
+        for conn in conns:
+            conn.close()
+
+    def request(self, url, headers=None):
+        """GET请求（复用连接）
+        :return: (响应体, 耗时)。耗时为{"connect", "ttfb", "body"}，单位：秒
+        """
+        headers = dict(headers or {})
+        headers["Accept-Encoding"] = "gzip"
+        headers["Connection"] = "keep-alive"
+
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        proxy = self.__proxy(parts)
+        if proxy is not None and parts.scheme != "https":  #HTTP代理：请求行为完整的url
+            path = urllib.parse.urlunsplit((parts.scheme, parts.netloc, path, "", ""))
+            headers.update(self.__proxy_headers(proxy))
+
+        is_new, conn = self.acquire(url)
+        try:
+            try:
+                response, data, timing = self.__request(conn, path, headers)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if is_new:
+                    raise
+                # 复用的连接已被服务端关闭 => 新建连接重试一次
+                conn = self.__connection(parts, proxy)
+                response, data, timing = self.__request(conn, path, headers)
+        except Exception:
+            conn.close()
+            raise
+
+        if response.getheader("Connection", "").lower() == "close":
+            conn.close()
+        else:
+            self.release(url, conn)
+
+        if response.status != 200:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+
+        if response.getheader("Content-Encoding", "").lower() == "gzip":
+            data = gzip.decompress(data)
+        return data, timing
+
+    def __proxy(self, parts):
+        """此host使用的代理（urlsplit的结果），不使用代理为None
+        """
+        proxy = self.proxies.get(parts.scheme, None)
+        if not proxy or urllib.request.proxy_bypass(parts.hostname or ""):
+            return None
+        if "://" not in proxy:
+            proxy = "http://" + proxy
+        return urllib.parse.urlsplit(proxy)
+
+    @staticmethod
+    def __proxy_headers(proxy):
+        """代理的认证（代理的url中含用户名、密码时）
+        """
+        if proxy.username is None:
+            return {}
+        credentials = "{}:{}".format(
+            urllib.parse.unquote(proxy.username), urllib.parse.unquote(proxy.password or "")
+        )
+        return {"Proxy-Authorization" : "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")}
+
+    def __connection(self, parts, proxy=None):
+        if proxy is None:
+            if parts.scheme == "https":
+                return http.client.HTTPSConnection(parts.netloc, timeout=self.timeout)
+            return http.client.HTTPConnection(parts.netloc, timeout=self.timeout)
+
+        #经代理：连接代理；HTTPS再通过CONNECT建立到目标host的隧道
+        netloc = proxy.hostname if proxy.port is None else f"{proxy.hostname}:{proxy.port}"
+        if parts.scheme == "https":
+            conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            conn.set_tunnel(parts.hostname, parts.port, headers=self.__proxy_headers(proxy))
+            return conn
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    @staticmethod
+    def __request(conn, path, headers):
+        timing = {"connect" : 0.0, "ttfb" : 0.0, "body" : 0.0}
+
+        start_time = time.perf_counter()
+        if conn.sock is None:
+            conn.connect()
+        connect_time = time.perf_counter()
+        timing["connect"] = connect_time - start_time
+
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        ttfb_time = time.perf_counter()
+        timing["ttfb"] = ttfb_time - connect_time
+
+        data = response.read()
+        timing["body"] = time.perf_counter() - ttfb_time
+        return response, data, timing
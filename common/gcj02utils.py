@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import math
 
+import numpy
+
 x_pi = 3.14159265358979324 * 3000.0 / 180.0
 pi = 3.1415926535897932384626  # π
 a = 6378245.0  # 长半轴
@@ -85,4 +87,110 @@ def out_of_china(lng, lat):
         return True
     if lat < 0.8293 or lat > 55.8271:
         return True
-    return False
\ No newline at end of file
+    return False
+
+
+#
+# 数组版本：一次转换整个坐标数组，与标量版本逐位一致
+#
+def wgs84togcj02_array(lng, lat):
+    """
+    WGS84转GCJ02(火星坐标系)，数组版本
+    :param lng:WGS84坐标系的经度数组
+    :param lat:WGS84坐标系的纬度数组
+    :return: (经度数组, 纬度数组)，国外的坐标不做偏移
+    """
+    lng, lat = _as_arrays(lng, lat)
+    dlng, dlat = _offset_array(lng, lat)
+    outside = out_of_china_array(lng, lat)
+    return (
+        numpy.where(outside, lng, lng + dlng),
+        numpy.where(outside, lat, lat + dlat)
+    )
+
+
+def gcj02towgs84_array(lng, lat):
+    """
+    GCJ02(火星坐标系)转GPS84，数组版本
+    :param lng:火星坐标系的经度数组
+    :param lat:火星坐标系纬度数组
+    :return: (经度数组, 纬度数组)，国外的坐标不做偏移
+    """
+    lng, lat = _as_arrays(lng, lat)
+    dlng, dlat = _offset_array(lng, lat)
+    outside = out_of_china_array(lng, lat)
+    mglng = lng + dlng
+    mglat = lat + dlat
+    return (
+        numpy.where(outside, lng, lng * 2 - mglng),
+        numpy.where(outside, lat, lat * 2 - mglat)
+    )
+
+
+def transformlat_array(lng, lat):
+    ret = -100.0 + 2.0 * lng + 3.0 * lat + 0.2 * lat * lat + \
+        0.1 * lng * lat + 0.2 * numpy.sqrt(numpy.fabs(lng))
+    ret += (20.0 * _sin(6.0 * lng * pi) + 20.0 *
+            _sin(2.0 * lng * pi)) * 2.0 / 3.0
+    ret += (20.0 * _sin(lat * pi) + 40.0 *
+            _sin(lat / 3.0 * pi)) * 2.0 / 3.0
+    ret += (160.0 * _sin(lat / 12.0 * pi) + 320 *
+            _sin(lat * pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def transformlng_array(lng, lat):
+    ret = 300.0 + lng + 2.0 * lat + 0.1 * lng * lng + \
+        0.1 * lng * lat + 0.1 * numpy.sqrt(numpy.fabs(lng))
+    ret += (20.0 * _sin(6.0 * lng * pi) + 20.0 *
+            _sin(2.0 * lng * pi)) * 2.0 / 3.0
+    ret += (20.0 * _sin(lng * pi) + 40.0 *
+            _sin(lng / 3.0 * pi)) * 2.0 / 3.0
+    ret += (150.0 * _sin(lng / 12.0 * pi) + 300.0 *
+            _sin(lng / 30.0 * pi)) * 2.0 / 3.0
+    return ret
+
+
+def out_of_china_array(lng, lat):
+    """
+    判断是否在国内（逐元素），不在国内不做偏移
+    :return: bool数组
+    """
+    return (lng < 72.004) | (lng > 137.8347) | (lat < 0.8293) | (lat > 55.8271)
+
+
+def _as_arrays(lng, lat):
+    return numpy.asarray(lng, dtype=numpy.float64), numpy.asarray(lat, dtype=numpy.float64)
+
+
+def _offset_array(lng, lat):
+    """GCJ02相对WGS84的偏移量（与标量版本的计算顺序一致）
+    """
+    dlat = transformlat_array(lng - 105.0, lat - 35.0)
+    dlng = transformlng_array(lng - 105.0, lat - 35.0)
+    radlat = lat / 180.0 * pi
+    magic = _sin(radlat)
+    magic = 1 - ee * magic * magic
+    sqrtmagic = numpy.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrtmagic) * pi)
+    dlng = (dlng * 180.0) / (a / sqrtmagic * _cos(radlat) * pi)
+    return dlng, dlat
+
+
+def _exact_ufunc(ufunc, func):
+    """numpy的SIMD实现（如AVX512）可能与math相差1ULP，不一致时退回math，保证与标量版本逐位一致
+    探测的范围覆盖实际的参数：国内经度lng-105在[-33, 33]内，6.0 * lng * pi最大约为±620
+    """
+    lng = numpy.linspace(72.004 - 105.0, 137.8347 - 105.0, 20011)
+    probe = numpy.concatenate([
+        numpy.linspace(-700.0, 700.0, 40009),
+        6.0 * lng * pi,
+        2.0 * lng * pi,
+    ])
+    if numpy.array_equal(ufunc(probe), [func(x) for x in probe.tolist()]):
+        return ufunc
+    return numpy.vectorize(func, otypes=[numpy.float64])
+
+
+_sin = _exact_ufunc(numpy.sin, math.sin)
+_cos = _exact_ufunc(numpy.cos, math.cos)
@@ -0,0 +1,141 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 点所在区域的批量查询（逆地理编码，不请求接口）
+@Desc    :
+    1. PolygonIndex：多边形（如行政区边界）建STRtree，先按外包矩形筛选候选，再按多边形分组向量化判断点是否在内
+    2. GridIndex：规则网格，直接按坐标计算行列号
+    3. 输入为坐标数组，输出为与之一一对应的编码数组，每分钟可处理数百万个点
+"""
+import numpy
+import shapely
+
+class PolygonIndex:
+    """多边形索引
+    :param codes:       多边形的编码（如adcode）
+    :param geometries:  多边形，shapely的(Multi)Polygon，与codes一一对应
+    """
+    def __init__(self, codes, geometries) -> None:
+        self.codes = numpy.array(codes, dtype=object)
+        self.geometries = numpy.array(geometries, dtype=object)
+        if len(self.codes) != len(self.geometries):
+            raise ValueError("codes与geometries的数量不一致")
+        self.areas = shapely.area(self.geometries)
+        self._tree = None
+
+    def __getstate__(self):
+        #下划线开头的属性（STRtree）不参与序列化，用时重建
+        return {name : value for name, value in self.__dict__.items() if not name.startswith("_")}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._tree = None
+
+    @classmethod
+    def from_store(cls, store, level=None, codes=None):
+        """由行政区边界的本地存储（见common.boundarystore）创建
+        :param level: 只使用此级别的行政区（如"district"），None为所有级别
+        :param codes: 只使用这些行政区，None为所有已保存边界的行政区
+        """
+        codes = store.codes() if codes is None else list(codes)
+        if level is not None:
+            codes = [code for code in codes if (store.get(code) or {}).get("level") == level]
+
+        geometries = [store.geometry(code) for code in codes]
+        return cls(
+            [code for code, geometry in zip(codes, geometries) if geometry is not None],
+            [geometry for geometry in geometries if geometry is not None]
+        )
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup_index(self, x, y):
+        """点所在多边形的下标（位于多个多边形内时，取面积最小的）
+        :param x, y: 经度、纬度数组
+        :return: int64数组，不在任何多边形内为-1
+        """
+        x = numpy.asarray(x, dtype=numpy.float64)
+        y = numpy.asarray(y, dtype=numpy.float64)
+        result = numpy.full(len(x), -1, dtype=numpy.int64)
+        if len(x)==0 or len(self.codes)==0:
+            return result
+
+        # 按外包矩形筛选候选(点, 多边形)，再按多边形分组精确判断
+        valid = numpy.flatnonzero(numpy.isfinite(x) & numpy.isfinite(y))
+        point_idx, poly_idx = self.__tree().query(shapely.points(x[valid], y[valid]))
+        point_idx = valid[point_idx]
+
+        order = numpy.argsort(poly_idx, kind="stable")
+        point_idx = point_idx[order]
+        poly_idx = poly_idx[order]
+        best_area = numpy.full(len(x), numpy.inf)
+
+        starts = numpy.flatnonzero(numpy.r_[True, poly_idx[1:] != poly_idx[:-1]])
+        ends = numpy.r_[starts[1:], len(poly_idx)]
+        for start, end in zip(starts, ends):
+            i = poly_idx[start]
+            candidates = point_idx[start:end]
+            inside = candidates[shapely.contains_xy(self.geometries[i], x[candidates], y[candidates])]
+
+            # 重叠的多边形（如不同级别的行政区），取面积最小的
+            inside = inside[self.areas[i] < best_area[inside]]
+            result[inside] = i
+            best_area[inside] = self.areas[i]
+
+        return result
+
+    def lookup(self, x, y):
+        """点所在多边形的编码
+        :param x, y: 经度、纬度数组
+        :return: 编码数组（object），不在任何多边形内为None
+        """
+        idx = self.lookup_index(x, y)
+        codes = numpy.full(len(idx), None, dtype=object)
+        found = idx >= 0
+        codes[found] = self.codes[idx[found]]
+        return codes
+
+    def __tree(self):
+        if self._tree is None:
+            shapely.prepare(self.geometries)
+            self._tree = shapely.STRtree(self.geometries)
+        return self._tree
+
+class GridIndex:
+    """规则网格索引
+        方格编号与AMapRegionAPI.division_rect一致：按行优先排列，第r行（由南向北）第c列的编号为r*num_col+c
+    :param rect:    范围，[minlng, maxlng, minlat, maxlat]
+    :param num_col: 列数
+    :param num_row: 行数
+    """
+    def __init__(self, rect, num_col, num_row) -> None:
+        self.rect = list(rect)
+        self.num_col = num_col
+        self.num_row = num_row
+
+    def __len__(self):
+        return self.num_col * self.num_row
+
+    def lookup(self, x, y):
+        """点所在方格的编号
+        :param x, y: 经度、纬度数组
+        :return: int64数组，不在范围内为-1
+        """
+        minlng, maxlng, minlat, maxlat = self.rect
+        x = numpy.asarray(x, dtype=numpy.float64)
+        y = numpy.asarray(y, dtype=numpy.float64)
+
+        with numpy.errstate(invalid="ignore"):
+            col = numpy.floor((x - minlng) / (maxlng - minlng) * self.num_col)
+            row = numpy.floor((y - minlat) / (maxlat - minlat) * self.num_row)
+
+        # 最东、最北边界上的点归入最后一列、最后一行
+        col[x == maxlng] = self.num_col - 1
+        row[y == maxlat] = self.num_row - 1
+
+        inside = (col >= 0) & (col < self.num_col) & (row >= 0) & (row < self.num_row)
+        result = numpy.full(len(x), -1, dtype=numpy.int64)
+        result[inside] = row[inside].astype(numpy.int64) * self.num_col + col[inside].astype(numpy.int64)
+        return result
@@ -0,0 +1,202 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : HTTP响应的磁盘缓存
+@Desc    :
+    1. 以规范化后的请求参数（排除Key等参数）的哈希为键，相同的请求直接从磁盘读取，不消耗额度
+    2. 每个接口可设置不同的有效期（TTL）
+    3. 总大小超过上限时，按最近最少使用（LRU）淘汰
+    4. gzip压缩存储，并统计命中率
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+from common.jsoncodec import JSONDecoder
+
+class ResponseCache:
+    """HTTP响应的磁盘缓存
+    :param cache_dir:       缓存文件夹
+    :param ttl:             有效期，单位：秒。一个数值（所有接口），或{url: 秒}（每个接口），None为永久有效
+    :param max_size:        缓存的总大小上限，单位：字节
+    :param exclude_params:  不参与键计算的参数（如Key）
+    :param accept:          判断响应是否可缓存，默认全部缓存
+    :param decoder:         读取缓存的JSON解码器（common.jsoncodec.JSONDecoder），None为使用最快的已安装后端
+    """
+    def __init__(self, cache_dir="cache-http.geodoer"
+        , ttl=None
+        , max_size=1024 * 1024 * 1024
+        , exclude_params=("key",)
+        , accept=None
+        , decoder=None
+        ) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        self.exclude_params = set(exclude_params)
+        self.accept = accept
+        self.decoder = decoder or JSONDecoder()
+
+        self._lock = threading.Lock()
+        self._index = OrderedDict()     #key -> 文件大小，按最近使用排序（最久未使用的在前）
+        self._size = 0
+        self.reset_stats()
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self.__load_index()
+
+    def reset_stats(self):
+        """重置统计
+        """
+        self.stats = {
+            "hits" : 0,
+            "misses" : 0,
+            "expired" : 0,
+            "evictions" : 0
+        }
+
+    def hit_rate(self):
+        """命中率
+        """
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0
+
+    def key(self, url, params):
+        """规范化的请求 => 键
+        """
+        items = sorted(
+            (str(name), str(value)) for name, value in params.items()
+            if name not in self.exclude_params
+        )
+        normalized = f"{url}?{urllib.parse.urlencode(items)}"
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get(self, url, params):
+        """读取缓存
+        :return: 缓存的响应，不存在或已过期时为None
+        """
+        key = self.key(url, params)
+        fp = self.__path(key)
+
+        with self._lock:
+            if key not in self._index:
+                self.stats["misses"] += 1
+                return None
+            self._index.move_to_end(key)
+
+        try:
+            with gzip.open(fp, "rb") as f:
+                entry = self.decoder.decode(f.read())     #直接从bytes解码
+        except (OSError, ValueError):
+            self.__remove(key)
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        ttl = self.__ttl(url)
+        if ttl is not None and time.time() - entry["time"] > ttl:
+            self.__remove(key)
+            with self._lock:
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self.stats["hits"] += 1
+        try:
+            os.utime(fp)    #更新最近使用时间，重启后仍可恢复LRU顺序
+        except OSError:
+            pass
+        return entry["data"]
+
+    def put(self, url, params, data):
+        """写入缓存
+        :return: 是否写入
+        """
+        if self.accept is not None and not self.accept(data):
+            return False
+
+        key = self.key(url, params)
+        fp = self.__path(key)
+        os.makedirs(os.path.dirname(fp), exist_ok=True)
+
+        entry = {"time" : time.time(), "url" : url, "data" : data}
+        tmp_fp = f"{fp}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_fp, "wt", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_fp, fp)
+
+        size = os.path.getsize(fp)
+        with self._lock:
+            self._size += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self.__evict()
+        return True
+
+    def clear(self):
+        """清空缓存
+        """
+        for key in list(self._index):
+            self.__remove(key)
+
+    @property
+    def size(self):
+        """缓存的总大小，单位：字节
+        """
+        return self._size
+
+    def __len__(self):
+        return len(self._index)
+
+    def __ttl(self, url):
+        if isinstance(self.ttl, dict):
+            return self.ttl.get(url, None)
+        return self.ttl
+
+    def __path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def __remove(self, key):
+        with self._lock:
+            self._size -= self._index.pop(key, 0)
+        try:
+            os.remove(self.__path(key))
+        except OSError:
+            pass
+
+    def __evict(self):
+        """淘汰最久未使用的缓存，直到总大小不超过上限（调用时需持有锁）
+        """
+        while self._size > self.max_size and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self.__path(key))
+            except OSError:
+                pass
+
+    def __load_index(self):
+        """扫描缓存文件夹，按文件修改时间恢复LRU顺序
+        """
+        entries = []
+        for sub_dir in os.listdir(self.cache_dir):
+            sub_path = os.path.join(self.cache_dir, sub_dir)
+            if not os.path.isdir(sub_path):
+                continue
+            for fn in os.listdir(sub_path):
+                if not fn.endswith(".json.gz"):
+                    continue
+                st = os.stat(os.path.join(sub_path, fn))
+                entries.append((st.st_mtime, fn[:-len(".json.gz")], st.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
@@ -0,0 +1,107 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 紧凑的ID集合
+@Desc    :
+    1. 只保存ID的64位哈希（每个ID 8字节，Python的set中每个字符串ID约100字节）
+    2. 哈希保存在有序的numpy数组中，新加入的先放入小的缓冲集合，积累到一定数量再合并
+    3. 不同ID哈希相同的概率约为 n²/2^65，千万级ID可忽略
+"""
+import hashlib
+
+import numpy
+
+class IdSet:
+    """紧凑的ID集合
+    :param merge_size: 缓冲集合达到此大小时合并到有序数组
+    """
+    def __init__(self, merge_size=65536) -> None:
+        self.merge_size = merge_size
+        self._sorted = numpy.empty(0, dtype=numpy.uint64)
+        self._pending = set()
+
+    @staticmethod
+    def hash(_id):
+        """ID => 64位哈希
+        """
+        digest = hashlib.blake2b(str(_id).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    def __len__(self):
+        return len(self._sorted) + len(self._pending)
+
+    def __contains__(self, _id):
+        return self.__contains_hash(self.hash(_id))
+
+    def add(self, _id):
+        """加入一个ID
+        :return: 是否为新的ID
+        """
+        h = self.hash(_id)
+        if self.__contains_hash(h):
+            return False
+
+        self._pending.add(h)
+        if len(self._pending) >= self.merge_size:
+            self.__merge()
+        return True
+
+    def add_many(self, ids):
+        """加入多个ID（向量化）
+        :return: bool数组，每个ID是否为新的ID（同一批中重复的ID，只有第一个为新的）
+        """
+        hashes = numpy.fromiter((self.hash(_id) for _id in ids), dtype=numpy.uint64)
+        if len(hashes)==0:
+            return numpy.zeros(0, dtype=bool)
+
+        self.__merge()
+
+        # 此批中第一次出现，且不在集合中
+        is_new = numpy.zeros(len(hashes), dtype=bool)
+        _, first = numpy.unique(hashes, return_index=True)
+        is_new[first] = True
+        is_new &= ~self.__isin_sorted(hashes)
+
+        self._sorted = numpy.union1d(self._sorted, hashes[is_new])
+        return is_new
+
+    def hashes(self):
+        """所有ID的哈希（有序）
+        """
+        self.__merge()
+        return self._sorted
+
+    def save(self, fp):
+        """保存到文件（numpy .npy格式）
+        """
+        with open(fp, "wb") as f:
+            numpy.save(f, self.hashes())
+
+    @classmethod
+    def load(cls, fp, merge_size=65536):
+        """从文件加载
+        """
+        idset = cls(merge_size)
+        with open(fp, "rb") as f:
+            idset._sorted = numpy.load(f)
+        return idset
+
+    def __contains_hash(self, h):
+        if h in self._pending:
+            return True
+        return bool(self.__isin_sorted(numpy.array([h], dtype=numpy.uint64))[0])
+
+    def __isin_sorted(self, hashes):
+        if len(self._sorted)==0:
+            return numpy.zeros(len(hashes), dtype=bool)
+        idx = numpy.searchsorted(self._sorted, hashes)
+        idx[idx == len(self._sorted)] = 0
+        return self._sorted[idx] == hashes
+
+    def __merge(self):
+        if len(self._pending)==0:
+            return
+        pending = numpy.fromiter(self._pending, dtype=numpy.uint64, count=len(self._pending))
+        self._sorted = numpy.union1d(self._sorted, pending)
+        self._pending = set()
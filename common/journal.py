@@ -0,0 +1,122 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 追加写入的日志
+@Desc    :
+    1. 每行一个JSON记录，只追加、不改写，写入后可同步到磁盘（fsync）
+    2. 重启时按顺序重放记录以恢复状态；崩溃时写了一半的最后一行会被忽略
+    3. 日志过长时可压缩（用一组新记录原子地替换）
+"""
+import os
+import json
+
+class Journal:
+    """追加写入的日志
+    :param fp:      日志文件
+    :param fsync:   每次追加后是否同步到磁盘
+    """
+    def __init__(self, fp, fsync=True) -> None:
+        self.fp = fp
+        self.fsync = fsync
+        self._file = None
+
+    def append(self, record):
+        """追加一条记录
+        """
+        self.append_many([record])
+
+    def append_many(self, records):
+        """追加多条记录（一次写入、一次同步）
+        """
+        if len(records)==0:
+            return
+
+        lines = [json.dumps(record, ensure_ascii=False) for record in records]
+        f = self.__open()
+        f.write("\n".join(lines) + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def replay(self):
+        """按顺序读取所有记录
+        """
+        if not os.path.exists(self.fp):
+            return
+
+        with open(self.fp, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):     #崩溃时写了一半的最后一行
+                    break
+                line = line.strip()
+                if len(line)==0:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+
+    def compact(self, records):
+        """压缩：用records原子地替换整个日志
+        """
+        self.close()
+
+        tmp_fp = f"{self.fp}.tmp"
+        with open(tmp_fp, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_fp, self.fp)
+
+    def clear(self):
+        """清空日志
+        """
+        self.close()
+        if os.path.exists(self.fp):
+            os.remove(self.fp)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+
+    def __open(self):
+        if self._file is None:
+            out_dir = os.path.dirname(self.fp)
+            if out_dir and not os.path.exists(out_dir):
+                os.makedirs(out_dir)
+            self.__truncate_torn_line()
+            self._file = open(self.fp, "a", encoding="utf-8")
+        return self._file
+
+    def __truncate_torn_line(self):
+        """截掉崩溃时写了一半的最后一行，以免与新记录连在一起
+        """
+        if not os.path.exists(self.fp):
+            return
+
+        with open(self.fp, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+
+            # 向前找到最后一个换行符
+            pos = size - 1
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                idx = chunk.rfind(b"\n")
+                if idx >= 0:
+                    pos = pos - step + idx + 1
+                    break
+                pos -= step
+            f.truncate(pos)
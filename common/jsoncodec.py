@@ -0,0 +1,62 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 可插拔的JSON解码
+@Desc    :
+    1. 按顺序选择已安装的后端：orjson > ujson > json（标准库），也可指定
+    2. 直接从响应的bytes解码，不先转成str
+    3. 投影：列表中的每个对象只保留指定字段（如POI只保留save_field），之后处理、暂存的对象更小
+"""
+import json
+
+BACKENDS = ("orjson", "ujson", "json")
+
+def load_backend(name=None):
+    """加载JSON后端
+    :param name: 后端名称（见BACKENDS），None为第一个已安装的
+    :return: (名称, loads函数)，loads接受bytes或str
+    """
+    names = BACKENDS if name is None else (name,)
+    for _name in names:
+        if _name == "json":
+            return "json", json.loads
+        try:
+            module = __import__(_name)
+        except ImportError:
+            if name is not None:
+                raise
+            continue
+        return _name, module.loads
+    return "json", json.loads
+
+class JSONDecoder:
+    """JSON解码器
+    :param backend: 后端名称（见BACKENDS），None为第一个已安装的
+    """
+    def __init__(self, backend=None) -> None:
+        self.backend, self._loads = load_backend(backend)
+
+    def decode(self, data):
+        """bytes（UTF-8）或str => 对象
+        """
+        return self._loads(data)
+
+    @staticmethod
+    def project(obj, project):
+        """投影：obj[key]中的每个对象只保留fields中的字段
+        :param project: {key: fields}，如{"pois" : ["id", "name", "location"]}，None为不投影
+        :return: 投影后的obj（原地修改）
+        """
+        if not project or not isinstance(obj, dict):
+            return obj
+
+        for key, fields in project.items():
+            items = obj.get(key, None)
+            if not isinstance(items, list):
+                continue
+            obj[key] = [
+                {field : item[field] for field in fields if field in item} if isinstance(item, dict) else item
+                for item in items
+            ]
+        return obj
@@ -1,64 +1,143 @@
 import time
-import os
-import jsonpickle
+import threading
+import asyncio
+import copy
+import hashlib
+from collections import deque
+
+from common import journal
 
 class RequestLimitsRule:
-    """限额规则
-    每time_range，只能处理limit次
+    """限额规则（滑动窗口）
+    任意time_range时间内，只能处理limit次（不存在固定窗口边界处的突发）
+    可选令牌桶：令牌以limit/time_range的速率匀速补充，桶容量为burst，使请求平滑地发出
     :param limit:       限额，单位：次
     :param time_range:  时间范围，单位：秒
+    :param burst:       令牌桶容量（允许的突发请求数），None为不平滑
     """
-    def __init__(self, limit=400, time_range=60) -> None:
+    def __init__(self, limit=400, time_range=60, burst=None) -> None:
         self.limit = limit
         self.time_range = time_range
+        self.burst = burst
 
         self.reset()
 
+    @property
+    def rate(self):
+        """令牌补充速率，单位：次/秒
+        """
+        return self.limit / self.time_range
+
+    def delay(self, cur_time=None):
+        """距离下一次份额还需等待的时间，单位：秒
+        """
+        if cur_time is None:
+            cur_time = time.time()
+        self.__expire(cur_time)
+
+        wait_time = 0
+        if len(self.history) >= self.limit:   #窗口内已满 => 等待最早的一次请求移出窗口
+            wait_time = self.history[0] + self.time_range - cur_time
+
+        if self.burst is not None:
+            tokens = self.__tokens(cur_time)
+            if tokens < 1:
+                wait_time = max(wait_time, (1 - tokens) / self.rate)
+
+        return max(wait_time, 0)
+
+    def acquire(self, cur_time=None):
+        """消耗一次份额（不检查是否超额，应先调用delay）
+        """
+        if cur_time is None:
+            cur_time = time.time()
+
+        if self.burst is not None:
+            self.tokens = self.__tokens(cur_time) - 1
+            self.token_time = cur_time
+
+        self.history.append(cur_time)
+        self.count += 1
+
+    def try_acquire(self):
+        """尝试获得一次份额，不等待
+        :return: 是否获得
+        """
+        cur_time = time.time()
+        if self.delay(cur_time) > 0:
+            return False
+
+        self.acquire(cur_time)
+        return True
+
     def wait(self):
         """等待一次份额
         """
-        if self.start_time:   #已经开始计时
-            # 没有超流量
-            if self.count < self.limit:
-                self.count += 1
+        while True:
+            cur_time = time.time()
+            wait_time = self.delay(cur_time)
+            if wait_time <= 0:
+                self.acquire(cur_time)
                 return
 
-            # 超流量
-            end_time = self.start_time + self.time_range
+            self.sleep(wait_time, cur_time)
+
+    def sleep(self, wait_time, cur_time=None):
+        """睡眠，较长时打印提示
+        """
+        if cur_time is None:
             cur_time = time.time()
 
-            #如果没有到结束时间 => 睡眠到结束时间
-            if cur_time < end_time:
-                wait_time = end_time - cur_time
-                print("当前时间{}; 已超额（{}/{}）; 将等待{}s（{} -> {}）".format(
-                    self.__time_to_str(cur_time),
-                    self.count,
-                    self.limit,
-                    wait_time,
-                    self.__time_to_str(self.start_time),
-                    self.__time_to_str(end_time)
-                ))
-                time.sleep(wait_time)
-            
-            #已经到了结束时间
-            self.__start()
-            return
-        else: #第一次请求
-            self.__start()
-            return
+        if wait_time >= 1:
+            print("当前时间{}; 已超额（{}/{}）; 将等待{}s（-> {}）".format(
+                self.__time_to_str(cur_time),
+                len(self.history),
+                self.limit,
+                wait_time,
+                self.__time_to_str(cur_time + wait_time)
+            ))
+        time.sleep(wait_time)
 
     def reset(self):
         """重置
         """
-        self.count = 0
-        self.start_time = None
+        self.count = 0              #已消耗的份额（统计）
+        self.history = deque()      #窗口内每次请求的时间
+        self.tokens = self.burst    #令牌桶中的令牌数
+        self.token_time = None      #令牌桶上次更新的时间
+
+    def used(self, cur_time=None):
+        """窗口内已用的份额
+        """
+        if cur_time is None:
+            cur_time = time.time()
+        self.__expire(cur_time)
+        return len(self.history)
+
+    def headroom(self, cur_time=None):
+        """窗口内剩余份额的比例，0~1
+        """
+        if cur_time is None:
+            cur_time = time.time()
+        self.__expire(cur_time)
+        return 1 - len(self.history) / self.limit
 
     def is_over(self):
-        """此轮限额已结束
+        """此轮限额已结束（窗口内已无请求）
         """
-        end_time = self.start_time + self.time_range
-        cur_time = time.time()
-        return cur_time > end_time
+        self.__expire(time.time())
+        return len(self.history)==0
+
+    def __expire(self, cur_time):
+        """移出窗口外的请求
+        """
+        while self.history and self.history[0] + self.time_range <= cur_time:
+            self.history.popleft()
+
+    def __tokens(self, cur_time):
+        if self.token_time is None:
+            return self.tokens
+        return min(self.burst, self.tokens + (cur_time - self.token_time) * self.rate)
 
     def __time_to_str(self, ct):
         local_time = time.localtime(ct)
@@ -72,52 +151,70 @@ class RequestLimitsRule:
         """
         return self.time_range < rhs.time_range
 
-    def __start(self):
-        """计时开始
-        """
-        self.count = 1
-        self.start_time = time.time()
-
 class RequestLimiter:
     """限额器，内部支持多个限额规则
+    线程安全：多个线程可共享同一个限额器
     :param many_request_limits: 一个RequestLimitsRule 或 多个RequestLimitsRule
     """
     def __init__(self, name="default", *many_request_limits):
         self.name = name
+        self._lock = threading.Lock()
 
         #init rules
         self.rules = []
         for rule in many_request_limits:
-            if type(rule) != RequestLimitsRule:
+            if not isinstance(rule, RequestLimitsRule):
                 raise Exception("Please pass in one or more RequestLimitsRules.")
         self.rules += many_request_limits
         self.rules.sort(reverse=True) #降序排序，先考虑时间间隔大的限额规则
 
-        #存在缓存，加载状态
-        if os.path.exists(self.__cache_file):
-            with open(self.__cache_file, encoding="utf-8") as f:
-                self = jsonpickle.decode(f.read())
-
-                #加载状态之后，检查是否都over
-                if self.is_over():
-                    self.reset()
-
-                return
+        #存在日志，重放每次请求的时间，恢复状态（没有规则时不限额，也不存档）
+        self._journal = journal.Journal(self.__journal_file, fsync=False) if self.rules else None
+        self._journal_size = 0
+        if self._journal is not None:
+            self.__load_journal()
 
     @property
-    def __cache_file(self)->str:
-        return f"cache-{self.__class__.__name__}-{self.name}.json"
+    def __journal_file(self)->str:
+        return f"cache-{self.__class__.__name__}-{self.name}.jsonl"
 
     def __del__(self):
+        if getattr(self, "_journal", None) is None:
+            return
         if self.is_over(): #结束 -> 不保存
-            if os.path.exists(self.__cache_file): #存在 -> 删除
-                os.remove(self.__cache_file)
+            self._journal.clear()
+            return
+        self._journal.close()
+
+    def __load_journal(self):
+        cur_time = time.time()
+        max_range = max([rule.time_range for rule in self.rules], default=0)
+        times = sorted(
+            record["t"] for record in self._journal.replay()
+            if cur_time - record["t"] < max_range
+        )
+        for t in times:
+            for rule in self.rules:
+                rule.acquire(t)
+        self.__compact_journal(times)
+
+    def __compact_journal(self, times):
+        """只保留仍在窗口内的请求时间
+        """
+        self._journal.compact([{"t" : t} for t in times])
+        self._journal_size = len(times)
+
+    def __record(self, cur_time):
+        """记录一次请求的时间（调用时需持有锁）
+        """
+        if self._journal is None:
             return
+        self._journal.append({"t" : cur_time})
+        self._journal_size += 1
 
-        #保存状态
-        _str = jsonpickle.encode(self)
-        with open(self.__cache_file, "w", encoding="utf-8") as f:
-            f.write(_str)
+        # 日志过长 => 压缩（时间范围最大的规则中保存着窗口内所有的请求）
+        if self.rules and self._journal_size > 4 * self.rules[0].limit + 1000:
+            self.__compact_journal(list(self.rules[0].history))
 
     def reset(self):
         """重置所有限额
@@ -125,20 +222,161 @@ class RequestLimiter:
         for rule in self.rules:
             rule.reset()
 
+    def delay(self, cur_time=None):
+        """距离下一次限额还需等待的时间（所有规则中最长的），单位：秒
+        """
+        if cur_time is None:
+            cur_time = time.time()
+        with self._lock:    #规则的delay会移出窗口外的请求（修改history），须与wait互斥
+            return self.__delay(cur_time)
+
+    def try_acquire(self):
+        """尝试获得下一次限额，不等待
+        :return: 是否获得（所有规则都有份额时才消耗）
+        """
+        with self._lock:
+            return self.__try_acquire(time.time())[0]
+
     def wait(self):
-        """等待下一次限额
+        """等待下一次限额（睡眠时不持有锁，其他线程可查询delay、headroom，醒来后重新尝试）
         """
+        while True:
+            with self._lock:
+                cur_time = time.time()
+                acquired, wait_time = self.__try_acquire(cur_time)
+                if acquired:
+                    return
+                rule = self.__slowest_rule(cur_time)
+            rule.sleep(wait_time, cur_time)
+
+    async def acquire_async(self):
+        """等待下一次限额（协程，等待时不阻塞事件循环）
+        """
+        while True:
+            with self._lock:
+                acquired, wait_time = self.__try_acquire(time.time())
+            if acquired:
+                return
+            await asyncio.sleep(wait_time)
+
+    def __try_acquire(self, cur_time):
+        """:return: (是否获得, 还需等待的时间)
+        """
+        wait_time = self.__delay(cur_time)
+        if wait_time > 0:
+            return False, wait_time
+
         for rule in self.rules:
-            rule.wait()
+            rule.acquire(cur_time)
+        self.__record(cur_time)
+        return True, 0
+
+    def __delay(self, cur_time):
+        return max([rule.delay(cur_time) for rule in self.rules], default=0)
+
+    def __slowest_rule(self, cur_time):
+        return max(self.rules, key=lambda rule: rule.delay(cur_time))
 
     def is_over(self):
         """此论限额是否结束
         """
         flag = True
-        for rule in self.rules:
-            flag &= rule.is_over()
+        with self._lock:
+            for rule in self.rules:
+                flag &= rule.is_over()
         return flag
 
+    def headroom(self):
+        """剩余份额的比例（所有规则中最小的），0~1
+        """
+        cur_time = time.time()
+        with self._lock:
+            return min([rule.headroom(cur_time) for rule in self.rules], default=1)
+
+    def usage(self):
+        """时间范围最大的规则（如每天）中，已用的份额与限额
+        :return: (已用, 限额)
+        """
+        with self._lock:
+            if len(self.rules)==0:
+                return 0, 0
+            return self.rules[0].used(), self.rules[0].limit
+
+class KeyPool:
+    """多Key池，每个Key有独立的限额器（独立的规则与存档）
+    获取Key时，选择可立即请求且余量最多的Key；Key额度用尽时停用
+    :param name:                名称
+    :param keys:                多个Key
+    :param many_request_limits: 每个Key的限额规则（每个Key复制一份）
+    :param retire_time:         停用的时长，单位：秒，默认一天
+    每个Key的限额器以完整Key的哈希命名（见key_id），存档互不影响
+    """
+    def __init__(self, name, keys, *many_request_limits, retire_time=24 * 60 * 60):
+        if len(keys)==0:
+            raise Exception("Please pass in one or more keys.")
+
+        self.name = name
+        self.retire_time = retire_time
+        self.limiters = {}      #key -> RequestLimiter
+        self.retired = {}       #key -> 停用的时间
+        self._lock = threading.Lock()
+
+        for key in keys:
+            self.limiters[key] = RequestLimiter(
+                f"{name}-{self.key_id(key)}",
+                *copy.deepcopy(many_request_limits)
+            )
+
+    @staticmethod
+    def key_id(key):
+        """Key的短标识：完整Key的哈希（前8位），不同Key的末几位可能相同
+        """
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+
+    def active_keys(self):
+        """未停用的Key
+        """
+        cur_time = time.time()
+        with self._lock:
+            for key, retired_time in list(self.retired.items()):
+                if cur_time - retired_time >= self.retire_time:
+                    del self.retired[key]
+            return [key for key in self.limiters if key not in self.retired]
+
+    def acquire(self):
+        """等待并获得一次份额
+        :return: 使用的Key
+        """
+        keys = self.active_keys()
+        if len(keys)==0:
+            raise Exception(f"All keys of {self.name} are retired.")
+
+        cur_time = time.time()
+        key = min(keys, key=lambda key: (
+            self.limiters[key].delay(cur_time),
+            -self.limiters[key].headroom()
+        ))
+        self.limiters[key].wait()
+        return key
+
+    def retire(self, key):
+        """停用Key（如额度已用尽）
+        """
+        with self._lock:
+            if key not in self.retired:
+                print(f"Key(...{key[-6:]}, {self.key_id(key)})已停用")
+            self.retired[key] = time.time()
+
+    def usage(self):
+        """每个Key已用的份额（见RequestLimiter.usage）
+        :return: {key: (已用, 限额, 是否已停用)}
+        """
+        active = set(self.active_keys())
+        return {
+            key : (*limiter.usage(), key not in active)
+            for key, limiter in self.limiters.items()
+        }
+
 if __name__ == '__main__':
     limiter = RequestLimiter("test",
         RequestLimitsRule(300, 3),  #1秒限额50
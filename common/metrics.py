@@ -0,0 +1,308 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 运行指标与性能分析
+@Desc    :
+    1. 计数器（如请求数、POI数）、数值（如重复率）、直方图（如请求耗时、每次请求的POI数），线程安全
+    2. stats()获取汇总（含每秒速率、分位数），可定期追加到JSON Lines日志
+    3. 可开启Prometheus文本格式的HTTP接口（/metrics）
+    4. profile()用cProfile运行（含线程池中的线程），并按网络、限额等待、CPU汇总耗时
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+#耗时的直方图分桶，单位：秒
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Histogram:
+    """直方图（固定分桶）
+    :param buckets: 各桶的上界（升序），最后还有一个+Inf桶
+    """
+    def __init__(self, buckets=TIME_BUCKETS) -> None:
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """分位数（在桶内线性插值的估计值）
+        """
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count > 0 and cumulative + count >= rank:
+                lower = self.buckets[i-1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def summary(self):
+        return {
+            "count" : self.count,
+            "sum" : round(self.sum, 6),
+            "mean" : round(self.sum / self.count, 6) if self.count else None,
+            "p50" : self.quantile(0.5),
+            "p90" : self.quantile(0.9),
+            "p99" : self.quantile(0.99)
+        }
+
+class Metrics:
+    """运行指标
+    :param namespace: Prometheus指标名的前缀（如"amap" => amap_requests_total）
+    """
+    def __init__(self, namespace=None) -> None:
+        self.namespace = namespace
+        self.start_time = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._log_thread = None
+        self._log_stop = None
+        self._server = None
+
+    def inc(self, name, value=1):
+        """计数器增加value
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        """设置数值
+        """
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value, buckets=TIME_BUCKETS):
+        """直方图记录一个值
+        :param buckets: 第一次记录时的分桶
+        """
+        with self._lock:
+            histogram = self.histograms.get(name, None)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def timer(self, name):
+        """计时（with语句），耗时记录到直方图name
+        """
+        return _Timer(self, name)
+
+    def reset(self):
+        with self._lock:
+            self.start_time = time.time()
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    def stats(self):
+        """汇总
+        :return: {"time", "uptime", "counters", "rates"（每秒）, "gauges", "histograms"（次数、总和、均值、分位数）}
+        """
+        with self._lock:
+            uptime = max(time.time() - self.start_time, 1e-6)
+            return {
+                "time" : time.strftime("%Y-%m-%d %H:%M:%S"),
+                "uptime" : round(uptime, 3),
+                "counters" : dict(self.counters),
+                "rates" : {name : round(value / uptime, 3) for name, value in self.counters.items()},
+                "gauges" : dict(self.gauges),
+                "histograms" : {name : histogram.summary() for name, histogram in self.histograms.items()}
+            }
+
+    def prometheus(self):
+        """Prometheus文本格式（https://prometheus.io/docs/instrumenting/exposition_formats/）
+        """
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                name = self.__metric_name(name)
+                lines += [f"# TYPE {name} counter", f"{name} {value}"]
+            for name, value in sorted(self.gauges.items()):
+                name = self.__metric_name(name)
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+            for name, histogram in sorted(self.histograms.items()):
+                name = self.__metric_name(name)
+                lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for upper, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{upper}"}} {cumulative}')
+                lines += [f"{name}_sum {histogram.sum}", f"{name}_count {histogram.count}"]
+        return "\n".join(lines) + "\n"
+
+    def log(self, fp, **extra):
+        """追加一行JSON（stats()与extra）到日志
+        """
+        out_dir = os.path.dirname(fp)
+        if out_dir and not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        with open(fp, "a", encoding="utf-8") as f:
+            f.write(json.dumps({**self.stats(), **extra}, ensure_ascii=False) + "\n")
+
+    def start_log(self, fp, interval=60):
+        """每interval秒追加一行JSON到日志（后台线程），stop_log()时再追加最后一行
+        """
+        self.stop_log()
+        self._log_stop = threading.Event()
+
+        def run(stop):
+            while not stop.wait(interval):
+                self.log(fp)
+            self.log(fp)
+
+        self._log_thread = threading.Thread(target=run, args=(self._log_stop,), daemon=True)
+        self._log_thread.start()
+
+    def stop_log(self):
+        if self._log_thread is None:
+            return
+        self._log_stop.set()
+        self._log_thread.join()
+        self._log_thread = None
+        self._log_stop = None
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """开启Prometheus的HTTP接口（后台线程）：GET /metrics为Prometheus文本，GET /stats为JSON
+        :return: 实际监听的端口（port为0时随机选择）
+        """
+        if self._server is not None:
+            return self._server.server_port
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path in ("/", "/metrics"):
+                    body = metrics.prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/stats":
+                    body = json.dumps(metrics.stats(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_port
+
+    def close(self):
+        """停止日志与HTTP接口
+        """
+        self.stop_log()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __metric_name(self, name):
+        return name if not self.namespace else f"{self.namespace}_{name}"
+
+class _Timer:
+    def __init__(self, metrics, name) -> None:
+        self.metrics = metrics
+        self.name = name
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start_time)
+        return False
+
+#
+# 性能分析
+#
+#内置函数 => 耗时的类别（函数名中含有这些字符串）
+PROFILE_CATEGORIES = (
+    ("quota", ("time.sleep",)),                     #限额等待
+    ("network", ("_socket.", "_ssl.", "select.")),  #网络
+    ("idle", ("_thread.lock", "_thread.RLock")),     #等待其他线程
+)
+
+def profile(func, fp="profile.geodoer.prof", top=30):
+    """用cProfile运行func（含运行期间新建的线程），保存结果，打印耗时最多的函数与耗时汇总
+    :param fp:  结果文件（可用snakeviz等工具查看），None为不保存
+    :param top: 打印的函数数
+    :return: func的返回值
+    """
+    profilers = []
+    lock = threading.Lock()
+
+    def profile_thread(frame, event, arg):
+        #新线程中第一次调用：改为用cProfile分析此线程
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  #Python 3.12+：cProfile已分析所有线程
+            return
+        with lock:
+            profilers.append(profiler)
+
+    main_profiler = cProfile.Profile()
+    threading.setprofile(profile_thread)
+    main_profiler.enable()
+    try:
+        return func()
+    finally:
+        main_profiler.disable()
+        threading.setprofile(None)
+
+        stats = pstats.Stats(main_profiler)
+        with lock:
+            for profiler in profilers:
+                stats.add(profiler)
+        if fp is not None:
+            stats.dump_stats(fp)
+
+        stats.sort_stats("cumulative").print_stats(top)
+        summary = profile_summary(stats)
+        print("[Profile] 耗时（各线程合计）：网络{network:.1f}s，限额等待{quota:.1f}s，CPU {cpu:.1f}s，等待其他线程{idle:.1f}s".format(**summary))
+        if fp is not None:
+            print(f"[Profile] 结果已保存到{fp}")
+
+def profile_summary(stats):
+    """按类别汇总各函数自身的耗时（tottime）
+    :return: {"network", "quota", "cpu", "idle"}，单位：秒
+    """
+    summary = {"network" : 0.0, "quota" : 0.0, "cpu" : 0.0, "idle" : 0.0}
+    for (filename, line, name), (cc, nc, tt, ct, callers) in stats.stats.items():
+        category = "cpu"
+        if filename == "~":     #内置函数
+            for _category, patterns in PROFILE_CATEGORIES:
+                if any(pattern in name for pattern in patterns):
+                    category = _category
+                    break
+        summary[category] += tt
+    return summary
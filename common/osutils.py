@@ -1,9 +1,11 @@
 import os
 
-def get_all_file(root_path,all_files=[]):
+def get_all_file(root_path,all_files=None):
     '''
     递归函数，遍历该文档目录和子目录下的所有文件，获取其path
     '''
+    if all_files is None:
+        all_files = []
     files = os.listdir(root_path)
     for file in files:
         if not os.path.isdir(root_path + '/' + file):   # not a dir
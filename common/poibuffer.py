@@ -0,0 +1,174 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 紧凑的点数据缓冲区
+@Desc    :
+    1. 坐标保存在float64数组中（每个点16字节），不创建几何对象，需要时再批量创建
+    2. 属性按列保存，每列按存储方式选择紧凑的表示：
+        string：  字符串列表
+        category：字典编码（每个值4字节的序号 + 不重复的值），适合重复多的字段（如type、adname）
+        code：    定长的数字编码（如adcode、typecode）保存为整数，读取时补齐前导0
+        int64：   整数
+    3. 不能按存储方式表示的值（如空值、"050000|060000"这样的多个编码）单独保存，读取时原样还原
+"""
+from array import array
+
+import numpy
+import shapely
+
+class POIBuffer:
+    """紧凑的点数据缓冲区
+    :param fields:  字段
+    :param storage: 字段的存储方式，{字段: "string" | "category" | "code" | "int64"}，未列出的字段为string
+    :param width:   code字段的位数
+    """
+    def __init__(self, fields, storage=None, width=6) -> None:
+        storage = storage or {}
+        self.fields = list(fields)
+        self._x = array("d")
+        self._y = array("d")
+        self._columns = {field : _create_column(storage.get(field, "string"), width) for field in self.fields}
+
+    def __len__(self):
+        return len(self._x)
+
+    def extend(self, attr, coords):
+        """加入一批点（按列整批编码，如一页POI）
+        :param attr:    属性，{字段: [值, ...]}，缺少的字段为None
+        :param coords:  坐标，[(lng, lat), ...]
+        """
+        self._x.extend([coord[0] for coord in coords])
+        self._y.extend([coord[1] for coord in coords])
+        for field, column in self._columns.items():
+            values = attr.get(field, None)
+            column.extend(values if values is not None else [None] * len(coords))
+
+    def columns(self, start=0):
+        """属性（从第start个点起）
+        :return: {字段: [值, ...]}
+        """
+        return {field : column.decode(start) for field, column in self._columns.items()}
+
+    def coords(self, start=0):
+        """坐标（从第start个点起）
+        :return: (n, 2)的float64数组
+        """
+        return numpy.column_stack([
+            numpy.frombuffer(self._x, dtype=numpy.float64)[start:],
+            numpy.frombuffer(self._y, dtype=numpy.float64)[start:]
+        ])
+
+    def geometry(self, start=0):
+        """几何对象（从第start个点起），批量创建
+        :return: shapely的Point数组
+        """
+        coords = self.coords(start)
+        return shapely.points(coords[:, 0], coords[:, 1])
+
+    def nbytes(self):
+        """占用内存的估计值（不含string列与字典中的字符串）
+        """
+        return self._x.itemsize * len(self._x) * 2 + sum(column.nbytes() for column in self._columns.values())
+
+    def clear(self):
+        self._x = array("d")
+        self._y = array("d")
+        for column in self._columns.values():
+            column.clear()
+
+def _create_column(kind, width):
+    if kind == "category":
+        return _CategoryColumn()
+    if kind == "code":
+        return _IntColumn(width)
+    if kind == "int64":
+        return _IntColumn()
+    return _StringColumn()
+
+class _StringColumn:
+    def __init__(self) -> None:
+        self.values = []
+
+    def extend(self, values):
+        self.values.extend(values)
+
+    def decode(self, start):
+        return self.values[start:]
+
+    def nbytes(self):
+        return 8 * len(self.values)
+
+    def clear(self):
+        self.values = []
+
+class _CategoryColumn:
+    """字典编码：每个值保存为其在dictionary中的序号
+    """
+    def __init__(self) -> None:
+        self.codes = array("i")
+        self.dictionary = []    #不重复的值
+        self.index = {}         #值 -> 序号
+
+    def extend(self, values):
+        index = self.index
+        for value in values:
+            if value not in index:
+                index[value] = len(self.dictionary)
+                self.dictionary.append(value)
+        self.codes.extend([index[value] for value in values])
+
+    def decode(self, start):
+        dictionary = self.dictionary
+        return [dictionary[i] for i in self.codes[start:]]
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes)
+
+    def clear(self):
+        #字典也清空，否则会随整个任务增长（内存不再与每批的大小相当）
+        self.codes = array("i")
+        self.dictionary = []
+        self.index = {}
+
+class _IntColumn:
+    """整数。width不为None时为定长的数字编码（字符串），读取时补齐前导0
+    不能表示为整数的值保存在others中
+    """
+    def __init__(self, width=None) -> None:
+        self.width = width
+        self.values = array("q")
+        self.others = {}    #行 -> 原值
+
+    def extend(self, values):
+        row = len(self.values)
+        ints = []
+        for value in values:
+            if self.width is None:
+                ok = type(value) is int and -2**63 <= value < 2**63
+            else:
+                ok = type(value) is str and len(value) == self.width and value.isdigit() and value.isascii()
+
+            if ok:
+                ints.append(int(value))
+            else:
+                self.others[row] = value
+                ints.append(0)
+            row += 1
+        self.values.extend(ints)
+
+    def decode(self, start):
+        values = self.values[start:].tolist()
+        if self.width is not None:
+            values = [f"{value:0{self.width}d}" for value in values]
+        for row, value in self.others.items():
+            if row >= start:
+                values[row - start] = value
+        return values
+
+    def nbytes(self):
+        return self.values.itemsize * len(self.values)
+
+    def clear(self):
+        self.values = array("q")
+        self.others = {}
@@ -0,0 +1,313 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 点数据的流式输出
+@Desc    :
+    1. 分批追加写入同一个文件，不构建GeoDataFrame，内存占用与数据总量无关
+    2. 写入前不必知道数据总量，中断后重新打开会继续追加；新任务开始时reset()删除上次任务的输出
+    3. GeoParquet：列式存储，字段有类型，每批为一个行组（Row Group）
+    4. mark()记录已写入的位置，崩溃后可rollback()到该位置，撤销写了一半（或未记录）的批次
+    5. GeoParquet分块写入多个文件，每个文件关闭后才完整；is_durable()判断已写入的内容是否都已完整
+        新建文件时通过on_open记录（如写入进度日志），rollback()、repair()只处理此任务新建的文件
+"""
+import os
+import json
+
+import numpy
+
+class GeoJSONSeqSink:
+    """换行分隔的GeoJSON（GeoJSONSeq，每行一个Feature），GDAL/geopandas可直接读取
+    :param fp:      输出文件（建议后缀名为.geojsonl）
+    :param fsync:   每批写入后是否同步到磁盘
+    """
+    ext = "geojsonl"
+
+    def __init__(self, fp, fsync=False) -> None:
+        self.fp = fp
+        self.fsync = fsync
+        self.count = 0          #已写入的要素数
+        self._file = None
+
+    def write(self, attr, coords):
+        """写入一批点
+        :param attr:    属性，{字段: [值, ...]}
+        :param coords:  坐标，[(lng, lat), ...]或(n, 2)的数组
+        """
+        if len(coords)==0:
+            return
+        if isinstance(coords, numpy.ndarray):
+            coords = coords.tolist()
+
+        fields = list(attr.keys())
+        lines = []
+        for i, (lng, lat) in enumerate(coords):
+            feature = {
+                "type" : "Feature",
+                "properties" : {field : attr[field][i] for field in fields},
+                "geometry" : {"type" : "Point", "coordinates" : [lng, lat]}
+            }
+            lines.append(json.dumps(feature, ensure_ascii=False))
+        lines.append("")
+
+        f = self.__open()
+        f.write("\n".join(lines))
+        self.flush()
+        self.count += len(coords)
+
+    def is_durable(self):
+        """已写入的内容是否都已完整保存（每批写入后即刷新到磁盘）
+        """
+        return True
+
+    def flush(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def mark(self):
+        """当前已写入的位置
+        """
+        self.flush()
+        size = os.path.getsize(self.fp) if os.path.exists(self.fp) else 0
+        return {"size" : size, "count" : self.count}
+
+    def rollback(self, mark):
+        """回滚到mark()记录的位置：截掉之后写入的内容
+        """
+        self.close()
+        if os.path.exists(self.fp) and os.path.getsize(self.fp) > mark["size"]:
+            with open(self.fp, "rb+") as f:
+                f.truncate(mark["size"])
+        self.count = mark["count"]
+
+    def reset(self):
+        """删除已有的输出文件（新任务开始时，不追加到上次任务的输出）
+        """
+        self.close()
+        if os.path.exists(self.fp):
+            os.remove(self.fp)
+        self.count = 0
+
+    def repair(self):
+        """截掉崩溃时写了一半的最后一行（不用进度日志回滚时，如任务队列）
+        """
+        self.close()
+        if not os.path.exists(self.fp):
+            return
+        with open(self.fp, "rb+") as f:
+            data = f.read()
+            if len(data) > 0 and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def __open(self):
+        if self._file is None:
+            out_dir = os.path.dirname(self.fp)
+            if out_dir and not os.path.exists(out_dir):
+                os.makedirs(out_dir)
+            self._file = open(self.fp, "a", encoding="utf-8")
+        return self._file
+
+class GeoParquetSink:
+    """GeoParquet（几何列为WKB编码的点），每批写入一个行组
+    Parquet文件关闭后无法追加，重新打开时若文件已存在，则写入新文件<name>-<n>.parquet
+    Parquet的文件尾在关闭时才写入，未关闭的文件在崩溃后无法读取，mark()只记录已关闭的文件
+    :param fp:          输出文件（后缀名为.parquet）
+    :param schema:      字段类型，{字段: "string" | "int64" | "float64" | "timestamp"}，未列出的字段为string
+    :param part_rows:   每个文件的要素数达到part_rows时关闭此文件，之后写入新文件。None为close()时才关闭
+    :param on_open:     新建文件之前的回调on_open(文件)，用于记录此任务新建的文件（崩溃后赋给files）
+    """
+    ext = "parquet"
+
+    #GeoParquet元数据（https://geoparquet.org）。高德地图为火星坐标，不属于标准坐标系，crs为未知
+    GEO_METADATA = {
+        "version" : "1.0.0",
+        "primary_column" : "geometry",
+        "columns" : {
+            "geometry" : {
+                "encoding" : "WKB",
+                "geometry_types" : ["Point"],
+                "crs" : None
+            }
+        }
+    }
+
+    def __init__(self, fp, schema=None, part_rows=None, on_open=None) -> None:
+        self.fp = fp
+        self.schema = dict(schema or {})
+        self.part_rows = part_rows
+        self.on_open = on_open
+        self.count = 0          #已写入的要素数
+        self.part_count = 0     #当前文件（未关闭）中的要素数
+        self.files = []         #此任务新建的文件（最后一个可能未关闭）
+        self._writer = None
+
+    def write(self, attr, coords):
+        """写入一批点（一个行组）
+        :param attr:    属性，{字段: [值, ...]}
+        :param coords:  坐标，[(lng, lat), ...]或(n, 2)的数组
+        """
+        if len(coords)==0:
+            return
+
+        import pyarrow
+
+        columns = {}
+        for field, values in attr.items():
+            columns[field] = self.__to_array(field, values)
+        columns["geometry"] = self.__to_wkb(coords)
+
+        table = pyarrow.table(columns)
+        self.__open(table.schema).write_table(table)
+        self.count += len(coords)
+        self.part_count += len(coords)
+        if self.part_rows is not None and self.part_count >= self.part_rows:
+            self.close()
+
+    def is_durable(self):
+        """已写入的内容是否都已完整保存（当前没有未关闭的文件）
+        """
+        return self._writer is None
+
+    def flush(self):
+        pass    #每批已写成一个完整的行组，文件关闭时才完整
+
+    def mark(self):
+        """当前已完整保存的位置（已关闭的文件）
+        """
+        files = self.files if self._writer is None else self.files[:-1]
+        return {"files" : list(files), "count" : self.count - self.part_count}
+
+    def rollback(self, mark):
+        """回滚到mark()记录的位置：删除之后新建的文件（files中、不在mark中的文件）
+        """
+        self.close()
+        for fp in self.files:
+            if fp not in mark["files"] and os.path.exists(fp):
+                os.remove(fp)
+        self.files = list(mark["files"])
+        self.count = mark["count"]
+
+    def reset(self):
+        """删除已有的输出文件<name>.parquet、<name>-<n>.parquet（新任务开始时，不与上次任务的输出混在一起）
+        """
+        self.close()
+        for fp in self.__existing_files():
+            os.remove(fp)
+        self.files = []
+        self.count = 0
+
+    def repair(self):
+        """删除崩溃时未关闭的文件（没有文件尾，无法读取）（不用进度日志回滚时，如任务队列）
+        只检查files中的文件（此任务新建的文件）
+        :return: 删除的文件
+        """
+        self.close()
+        kept = []
+        removed = []
+        for fp in self.files:
+            if not os.path.exists(fp):  #记录之后、新建之前崩溃
+                continue
+            with open(fp, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - 4))
+                if size >= 12 and f.read(4) == b"PAR1":    #文件尾以PAR1结束
+                    kept.append(fp)
+                    continue
+            os.remove(fp)
+            removed.append(fp)
+        self.files = kept
+        return removed
+
+    def close(self):
+        """关闭当前文件（之后写入新文件）
+        """
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        self.part_count = 0
+
+    def __to_array(self, field, values):
+        import pyarrow
+
+        _type = self.schema.get(field, "string")
+        if _type == "timestamp":
+            return pyarrow.array(values, type=pyarrow.string()).cast(pyarrow.timestamp("s"))
+        if _type in ("int64", "float64"):
+            return pyarrow.array(values, type=getattr(pyarrow, _type)())
+        return pyarrow.array(
+            [None if value is None else str(value) for value in values],
+            type=pyarrow.string()
+        )
+
+    @staticmethod
+    def __to_wkb(coords):
+        """坐标 => WKB的点（小端、Point，每个21字节），整批一次构造
+        """
+        import pyarrow
+
+        coords = numpy.asarray(coords, dtype=numpy.float64).reshape(-1, 2)
+        n = len(coords)
+        wkb = numpy.empty(n, dtype=numpy.dtype([("order", "u1"), ("type", "<u4"), ("x", "<f8"), ("y", "<f8")]))
+        wkb["order"] = 1
+        wkb["type"] = 1
+        wkb["x"] = coords[:, 0]
+        wkb["y"] = coords[:, 1]
+
+        offsets = numpy.arange(0, (n + 1) * wkb.itemsize, wkb.itemsize, dtype=numpy.int32)
+        return pyarrow.Array.from_buffers(
+            pyarrow.binary(), n,
+            [None, pyarrow.py_buffer(offsets), pyarrow.py_buffer(wkb.tobytes())]
+        )
+
+    def __open(self, schema):
+        if self._writer is not None:
+            return self._writer
+
+        import pyarrow.parquet
+
+        out_dir = os.path.dirname(self.fp)
+        if out_dir and not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+
+        fp = self.fp
+        n = 0
+        while os.path.exists(fp):
+            n += 1
+            fp = self.__numbered_file(n)
+
+        if self.on_open is not None:
+            self.on_open(fp)
+
+        metadata = dict(schema.metadata or {})
+        metadata[b"geo"] = json.dumps(self.GEO_METADATA).encode("utf-8")
+        self._writer = pyarrow.parquet.ParquetWriter(fp, schema.with_metadata(metadata))
+        self.files.append(fp)
+        return self._writer
+
+    def __numbered_file(self, n):
+        if n == 0:
+            return self.fp
+        stem = os.path.splitext(self.fp)[0]
+        return f"{stem}-{n}.{self.ext}"
+
+    def __existing_files(self):
+        """已存在的<name>.parquet、<name>-<n>.parquet
+        """
+        files = []
+        n = 0
+        while os.path.exists(self.__numbered_file(n)):
+            files.append(self.__numbered_file(n))
+            n += 1
+        return files
@@ -6,38 +6,167 @@
 @Desc    : 
     1. 可添加请求限制器，用于限流
     2. 提供状态保存与加载
+    3. 可并发请求（线程池），多个线程共享同一个限额器
+    4. 可使用多个Key（Key池），每个Key独立限额，额度用尽时自动停用
+    5. 复用HTTP长连接（keep-alive）、gzip压缩，并统计每次请求的耗时
+    6. 可添加响应的磁盘缓存，命中时不请求、不消耗额度
+    7. 响应直接从bytes解码（见common.jsoncodec，优先使用orjson等更快的后端），并统计解码耗时
+    8. 记录运行指标（见common.metrics）：请求数、请求与解码耗时、限额等待时间、缓存命中等
 """
-import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import urllib
-import urllib.request
+import urllib.parse
 
-from common.limiter import RequestLimitsRule, RequestLimiter
+from common.limiter import RequestLimitsRule, RequestLimiter, KeyPool
+from common.connpool import ConnectionPool
+from common.jsoncodec import JSONDecoder
+from common.metrics import Metrics
 
 class UrllibAgent(RequestLimiter):
     headers={"User-Agent":"Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/63.0.3239.132 Safari/537.36 QIHU 360SE"}
 
     """Urllib代理层
-    不支持并发，本身带Key请求，速度也提不起来
+    request为同步请求；request_many使用线程池并发请求，所有线程共享同一个限额器
+    :param num_workers:         并发请求数（同时在途的请求数）
+    :param keys:                多个Key。设置后，每次请求从Key池中选择余量最多的Key，填入params[key_param]
+                                限额规则用于每个Key（见KeyPool），代理本身不再限额、不存档
+    :param key_param:           Key的参数名
+    :param is_key_exhausted:    判断请求结果是否表示Key额度已用尽，返回True时停用该Key并换Key重试
+    :param timeout:             连接与读取的超时时间，单位：秒
+    :param cache:               响应缓存（common.httpcache.ResponseCache），None为不缓存
+    :param decoder:             JSON解码器（common.jsoncodec.JSONDecoder），None为使用最快的已安装后端
+    :param metrics:             运行指标（common.metrics.Metrics），None则新建。使用此代理的接口也记录到这里
     """
-    def __init__(self, name, *many_request_limits) -> None:
-        super().__init__(name, *many_request_limits)
+    def __init__(self, name, *many_request_limits
+        , num_workers=1
+        , keys=None
+        , key_param="key"
+        , is_key_exhausted=None
+        , timeout=30
+        , cache=None
+        , decoder=None
+        , metrics=None
+        ) -> None:
+        #Key池：每个Key有自己的限额器，代理本身的限额器不使用，不创建规则与存档
+        super().__init__(name, *([] if keys else many_request_limits))
+        self.num_workers = num_workers
+        self.pool = ConnectionPool(timeout)
+        self.cache = cache
+        self.decoder = decoder or JSONDecoder()
+        self.metrics = metrics or Metrics(name.lower())
+        self._timing_lock = threading.Lock()
+        self.reset_timing()
+
+        self.key_pool = None
+        self.key_param = key_param
+        self.is_key_exhausted = is_key_exhausted
+        if keys:
+            self.key_pool = KeyPool(name, keys, *many_request_limits)
     
-    def request(self, url, params):
+    def request(self, url, params, project=None):
+        """请求
+        :param project: 投影，{key: fields}，结果中obj[key]的每个对象只保留fields中的字段（见JSONDecoder.project）
+            缓存中保存的是完整的结果
+        """
+        obj = None
+        if self.cache is not None:
+            obj = self.cache.get(url, params)   #命中缓存 => 不请求
+            self.metrics.inc("cache_misses_total" if obj is None else "cache_hits_total")
+
+        if obj is None:
+            obj = self.__request_with_quota(url, params)
+            if self.cache is not None:
+                self.cache.put(url, params, obj)
+        return self.decoder.project(obj, project)
+
+    def __request_with_quota(self, url, params):
+        if self.key_pool is None:
+            with self.metrics.timer("limiter_wait_seconds"):
+                self.wait()   #等待一次份额
+            return self.__request(url, params)
+
+        while True:
+            with self.metrics.timer("limiter_wait_seconds"):
+                key = self.key_pool.acquire()    #选择Key，并等待一次份额
+            obj = self.__request(url, {**params, self.key_param: key})
+
+            if self.is_key_exhausted is not None and self.is_key_exhausted(obj):
+                self.key_pool.retire(key)   #额度用尽 => 停用，换Key重试
+                self.metrics.inc("keys_retired_total")
+                continue
+            return obj
+
+    def __request(self, url, params):
         param_str = urllib.parse.urlencode(params)
         req_url = f'{url}?{param_str}'
 
-        self.wait()   #等待一次份额
+        try:
+            data, timing = self.pool.request(req_url, self.headers)
 
-        req=urllib.request.Request(url=req_url,
-            headers=self.headers
-        )
+            start_time = time.perf_counter()
+            obj = self.decoder.decode(data)     #直接从bytes解码
+            timing["decode"] = time.perf_counter() - start_time
+        except Exception:
+            self.metrics.inc("request_errors_total")
+            raise
 
-        with urllib.request.urlopen(req) as f:
-            data = f.read()
-            data = data.decode('utf-8')
-            obj = json.loads(data)
-            return obj
+        self.__add_timing(timing)
+        self.metrics.inc("requests_total")
+        self.metrics.inc("response_bytes_total", len(data))
+        self.metrics.observe("request_seconds", timing["connect"] + timing["ttfb"] + timing["body"])
+        self.metrics.observe("decode_seconds", timing["decode"])
+        return obj
+
+    def reset_timing(self):
+        """重置耗时统计
+        """
+        self.timing = {     #累计耗时，单位：秒
+            "count" : 0,
+            "connect" : 0.0,
+            "ttfb" : 0.0,
+            "body" : 0.0,
+            "decode" : 0.0
+        }
+        self.last_timing = {}   #最近一次请求的耗时
+
+    def mean_timing(self):
+        """平均每次请求的耗时，单位：秒
+        """
+        count = max(1, self.timing["count"])
+        return {
+            "connect" : self.timing["connect"] / count,
+            "ttfb" : self.timing["ttfb"] / count,
+            "body" : self.timing["body"] / count,
+            "decode" : self.timing["decode"] / count
+        }
+
+    def __add_timing(self, timing):
+        with self._timing_lock:
+            self.timing["count"] += 1
+            for name, value in timing.items():
+                self.timing[name] += value
+            self.last_timing = timing
+
+    def request_many(self, url, many_params, num_workers=None, project=None):
+        """并发请求
+        :param many_params: 多组请求参数
+        :param num_workers: 并发请求数，默认为self.num_workers
+        :param project:     投影，见request
+        :return: 与many_params顺序一致的请求结果
+        """
+        many_params = list(many_params)
+        if num_workers is None:
+            num_workers = self.num_workers
+        num_workers = min(num_workers, len(many_params))
+
+        if num_workers <= 1:
+            return [self.request(url, params, project) for params in many_params]
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            return list(executor.map(lambda params: self.request(url, params, project), many_params))
 
 if __name__ == '__main__':
     urllib_agent = UrllibAgent("test"
@@ -0,0 +1,247 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 持久化的任务队列
+@Desc    :
+    1. 任务保存在SQLite数据库中，多个进程（或共享同一文件的多台机器）可同时领取任务
+    2. 优先级：先领取优先级高的任务，同优先级先进先出
+    3. 租约：领取的任务在租约到期前未完成，可被重新领取（进程崩溃后任务不会丢失）
+    4. 重试：失败的任务按指数退避延后重试，超过最大次数则标记为失败
+    5. 任务以key去重，重复加入同一任务会被忽略
+"""
+import json
+import time
+import sqlite3
+import threading
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+class Task:
+    """领取到的任务
+    """
+    def __init__(self, id, key, payload, priority, attempts) -> None:
+        self.id = id
+        self.key = key
+        self.payload = payload      #任务内容（可JSON序列化）
+        self.priority = priority
+        self.attempts = attempts    #已领取的次数（含此次）
+
+    def __repr__(self) -> str:
+        return f"Task({self.key}, priority={self.priority}, attempts={self.attempts})"
+
+class WorkQueue:
+    """持久化的任务队列（SQLite）
+    :param fp:              数据库文件
+    :param lease_time:      租约时长，单位：秒
+    :param max_attempts:    最多领取次数，超过则标记为失败
+    :param backoff:         第一次重试的延迟，单位：秒，之后每次翻倍
+    :param max_backoff:     重试延迟的上限，单位：秒
+    """
+    def __init__(self, fp
+        , lease_time=300
+        , max_attempts=5
+        , backoff=1.0
+        , max_backoff=300
+        ) -> None:
+        self.fp = fp
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._conn = self.__connect()
+
+    def put(self, key, payload, priority=0):
+        """加入一个任务
+        :return: 是否加入（key已存在则忽略）
+        """
+        return self.put_many([(key, payload, priority)]) == 1
+
+    def put_many(self, tasks):
+        """加入多个任务
+        :param tasks: [(key, payload, priority), ...]
+        :return: 新加入的任务数
+        """
+        rows = [(key, json.dumps(payload, ensure_ascii=False), priority) for key, payload, priority in tasks]
+        with self.__transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (key, payload, priority, status, attempts, not_before) "
+                "VALUES (?, ?, ?, 'pending', 0, 0)",
+                rows
+            )
+            return conn.total_changes - before
+
+    def lease(self, owner, n=1):
+        """领取最多n个任务（待处理的，或租约已过期的）
+        :param owner: 领取者
+        :return: [Task, ...]
+        """
+        cur_time = time.time()
+        with self.__transaction() as conn:
+            # 租约过期、且已达最多领取次数 => 失败
+            conn.execute(
+                "UPDATE tasks SET status='failed', owner=NULL WHERE status='leased' AND lease_until<? AND attempts>=?",
+                (cur_time, self.max_attempts)
+            )
+            rows = conn.execute(
+                "SELECT id, key, payload, priority, attempts FROM tasks "
+                "WHERE (status='pending' AND not_before<=?) OR (status='leased' AND lease_until<?) "
+                "ORDER BY priority DESC, id LIMIT ?",
+                (cur_time, cur_time, n)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET status='leased', owner=?, lease_until=?, attempts=attempts+1 WHERE id=?",
+                [(owner, cur_time + self.lease_time, row[0]) for row in rows]
+            )
+
+        return [
+            Task(_id, key, json.loads(payload), priority, attempts + 1)
+            for _id, key, payload, priority, attempts in rows
+        ]
+
+    def extend(self, tasks, owner):
+        """续租
+        :return: 续租成功的任务数（租约已被他人领取的任务不能续租）
+        """
+        until = time.time() + self.lease_time
+        with self.__transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE tasks SET lease_until=? WHERE id=? AND owner=? AND status='leased'",
+                [(until, task.id, owner) for task in tasks]
+            )
+            return conn.total_changes - before
+
+    def done(self, tasks):
+        """完成任务
+        """
+        with self.__transaction() as conn:
+            conn.executemany(
+                "UPDATE tasks SET status='done', owner=NULL, error=NULL WHERE id=?",
+                [(task.id,) for task in tasks]
+            )
+
+    def retry(self, task, error=None):
+        """任务失败，延后重试（超过最多领取次数则标记为失败）
+        :return: 是否还会重试
+        """
+        if task.attempts >= self.max_attempts:
+            with self.__transaction() as conn:
+                conn.execute(
+                    "UPDATE tasks SET status='failed', owner=NULL, error=? WHERE id=?",
+                    (error, task.id)
+                )
+            return False
+
+        delay = min(self.max_backoff, self.backoff * 2 ** (task.attempts - 1))
+        with self.__transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status='pending', owner=NULL, not_before=?, error=? WHERE id=?",
+                (time.time() + delay, error, task.id)
+            )
+        return True
+
+    def release(self, tasks):
+        """放弃领取的任务（不计入领取次数），可立即被重新领取
+        """
+        with self.__transaction() as conn:
+            conn.executemany(
+                "UPDATE tasks SET status='pending', owner=NULL, attempts=MAX(0, attempts-1) WHERE id=? AND status='leased'",
+                [(task.id,) for task in tasks]
+            )
+
+    def requeue_failed(self):
+        """将失败的任务重新加入队列（重置领取次数）
+        :return: 重新加入的任务数
+        """
+        with self.__transaction() as conn:
+            return conn.execute(
+                "UPDATE tasks SET status='pending', attempts=0, not_before=0 WHERE status='failed'"
+            ).rowcount
+
+    def counts(self):
+        """各状态的任务数
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        counts = {PENDING : 0, LEASED : 0, DONE : 0, FAILED : 0}
+        counts.update(dict(rows))
+        return counts
+
+    def is_drained(self):
+        """是否已没有待处理、处理中的任务
+        """
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def set_meta(self, name, value):
+        """保存任务的元数据（如参数），可JSON序列化
+        """
+        with self.__transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                (name, json.dumps(value, ensure_ascii=False))
+            )
+
+    def get_meta(self, name, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name=?", (name,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def close(self):
+        if self._conn is None:
+            return
+        self._conn.close()
+        self._conn = None
+
+    def __connect(self):
+        conn = sqlite3.connect(self.fp, timeout=60, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")     #读写互不阻塞（数据库文件须在本地文件系统上）
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "key TEXT NOT NULL UNIQUE, "
+            "payload TEXT NOT NULL, "
+            "priority INTEGER NOT NULL DEFAULT 0, "
+            "status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "not_before REAL NOT NULL DEFAULT 0, "      #重试：此时间之后才可领取
+            "owner TEXT, "
+            "lease_until REAL, "
+            "error TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, priority DESC, id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        return conn
+
+    def __transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+class _Transaction:
+    """写事务（BEGIN IMMEDIATE：开始时即获得写锁，多个进程同时领取时不会领到同一任务）
+    """
+    def __init__(self, conn, lock) -> None:
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
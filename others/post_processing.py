@@ -1,70 +1,152 @@
 #对爬取结果进行后处理
+import os
+import json
+import numpy
 import pandas
 import geopandas
-from shapely.geometry import point
-from shapely.geometry import linestring
-from shapely.geometry import polygon
+import shapely
 
 from common import gcj02utils
 from common import osutils
+from common import idset
 
 from shutil import copyfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+#本工程的自定义文件（参数文件、任务文件、缓存文件），不是GIS数据。下载的POI分块文件（*.geodoer.json）是GIS数据
+NOT_GIS_FILES = ["params.geodoer.json", "task.geodoer.json", "progress.geodoer.json"]
 
 def is_gis_data(file):
-    if "geodoer" in file:
-        return False #geodoer为本工程的自定义文件（如参数文件、缓存文件），不是GIS数据
+    basename = os.path.basename(file)
+    if basename in NOT_GIS_FILES or basename.startswith("cache-"):
+        return False
 
     ext = osutils.get_ext(file)
 
-    if ext not in ["shp", "json"]:
+    if ext not in ["shp", "json", "geojsonl", "parquet"]:
         return False
     
     return True
 
+#读取矢量数据（GeoParquet按列读取）
+def read_gis(fp, columns=None):
+    """
+    :param columns: 只读取的属性列，None为全部（几何列总会读取）
+    """
+    ext = osutils.get_ext(fp)
+
+    if ext == "parquet":
+        if columns is not None:
+            columns = list(columns) + ["geometry"]
+        return geopandas.read_parquet(fp, columns=columns)
+
+    if columns is None:
+        return geopandas.read_file(fp)
+    return geopandas.read_file(fp, columns=list(columns))
+
+#写出矢量数据（根据后缀名选择格式）
+def write_gis(gdf, fp):
+    ext = osutils.get_ext(fp)
+
+    if ext == "parquet":
+        gdf.to_parquet(fp)
+    elif ext == "geojsonl":
+        gdf.to_file(fp, driver="GeoJSONSeq", encoding="utf-8")
+    else:
+        gdf.to_file(fp, encoding="utf-8")
+
+#将几何数组中的所有坐标由gcj02转成wgs84（支持所有几何类型，保留内环、多部件等结构）
+def gcj02_to_wgs84_geometry(geoms):
+    """
+    :param geoms: 几何数组（GeoSeries 或 shapely几何对象的数组）
+    :return: 转换后的shapely几何对象数组
+    """
+    geoms = numpy.array(geoms, dtype=object)   #复制，不修改原几何
+
+    # 一次取出所有坐标，整体转换后写回；有Z值的几何分开处理，保留Z值
+    has_z = shapely.has_z(geoms)
+    for mask, include_z in ((~has_z, False), (has_z, True)):
+        if not mask.any():
+            continue
+        coords = shapely.get_coordinates(geoms[mask], include_z=include_z)
+        coords[:, 0], coords[:, 1] = gcj02utils.gcj02towgs84_array(coords[:, 0], coords[:, 1])
+        geoms[mask] = shapely.set_coordinates(geoms[mask], coords)
+    return geoms
+
 #将gcj02转成wgs84
 def gcj02_to_wgs84(in_fp, out_fp):
-    gdf = geopandas.read_file(in_fp)
+    gdf = read_gis(in_fp)
 
     # GCJ02转WGS84
-    for i in range(0, len(gdf)):
-        geom = gdf.geometry[i]  # 获取空间属性，即GeoSeries
-        geom_type = geom.geom_type
-        
-        if geom_type == "Point":
-            lng,lat = geom.x, geom.y  # x=117.967657, y=24.472853
-            lng,lat = gcj02utils.gcj02towgs84(lng, lat)
-            gdf.geometry[i] = point.Point(lng, lat)
-            pass
-        elif geom_type == "LineString":
-            old_pnts = geom.coords #获得坐标串
-            new_pnts = [] #新坐标
-            for old_pnt in old_pnts:
-                lng, lat = old_pnt
-                lng, lat = gcj02utils.gcj02towgs84(lng, lat) #转换
-                new_pnts.append( (lng, lat) )
-            gdf.geometry[i] = linestring.LineString(new_pnts)
-            pass
-        elif geom_type == "Polygon":
-            old_pnts = geom.exterior.coords #获得坐标串
-            new_pnts = [] #新坐标
-            for old_pnt in old_pnts:
-                lng, lat = old_pnt
-                lng, lat = gcj02utils.gcj02towgs84(lng, lat) #转换
-                new_pnts.append( (lng, lat) )
-            gdf.geometry[i] = polygon.Polygon(new_pnts)
-            pass
-        else:
-            return False
+    gdf = gdf.set_geometry(gcj02_to_wgs84_geometry(gdf.geometry))
 
     # 设置成WGS84，并保存
-    gdf.crs = {'init' :'epsg:4326'}
-    gdf.to_file(out_fp, encoding="utf-8")
+    gdf = gdf.set_crs("EPSG:4326", allow_override=True)
+    write_gis(gdf, out_fp)
+    return True
+
+#输出文件是否比输入文件新（已处理过，可跳过）
+def is_up_to_date(in_fp, out_fp):
+    if not os.path.exists(out_fp):
+        return False
+    return os.path.getmtime(out_fp) >= os.path.getmtime(in_fp)
+
+#并行批处理：每个任务为(func, in_fp, out_fp, *args)，使用进程池
+def run_batch(tasks, num_workers=None, force=False):
+    """
+    :param num_workers: 进程数，None为CPU核数，1为不使用进程池
+    :param force: 为False时，跳过输出文件比输入文件新的任务
+    :return: 失败的任务，[(in_fp, 错误信息)]
+    """
+    if not force:
+        skipped = [task for task in tasks if is_up_to_date(task[1], task[2])]
+        tasks = [task for task in tasks if not is_up_to_date(task[1], task[2])]
+        if skipped:
+            print(f"跳过{len(skipped)}个已处理的文件")
+
+    errors = []
+    total = len(tasks)
+
+    def on_done(i, in_fp, error):
+        if error is None:
+            print(f"[{i}/{total}] {in_fp}")
+        else:
+            print(f"[{i}/{total}] [Error] {in_fp}: {error}")
+            errors.append((in_fp, error))
+
+    if num_workers == 1:
+        for i, (func, *args) in enumerate(tasks, 1):
+            try:
+                func(*args)
+                on_done(i, args[0], None)
+            except Exception as e:
+                on_done(i, args[0], repr(e))
+        return errors
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(*task) : task[1] for task in tasks}
+        for i, future in enumerate(as_completed(futures), 1):
+            error = future.exception()
+            on_done(i, futures[future], None if error is None else repr(error))
+    return errors
+
+#格式转换（根据out_fp的后缀名选择格式）
+def format_conversion(in_fp, out_fp, columns=None):
+    gdf = read_gis(in_fp, columns)
+    write_gis(gdf, out_fp)
     return True
 
-#将gcj02转成wgs84（批量）
-def gcj02_to_wgs84_batch(in_dir, out_dir, new_ext = "json"):
+#将gcj02转成wgs84（批量，并行）
+def gcj02_to_wgs84_batch(in_dir, out_dir, new_ext = "json", num_workers=None, force=False):
+    """
+    :param num_workers: 进程数，None为CPU核数
+    :param force: 为False时，跳过输出文件比输入文件新的文件
+    :return: 失败的文件，[(文件, 错误信息)]
+    """
     all_files = osutils.get_all_file(in_dir)
+    os.makedirs(out_dir, exist_ok=True)
 
+    tasks = []
     for file in all_files:
         if not is_gis_data(file):
             copyfile(file,
@@ -72,44 +154,313 @@ def gcj02_to_wgs84_batch(in_dir, out_dir, new_ext = "json"):
             )
             continue
 
-        try:
-            out_fp = osutils.get_outfp(file, out_dir, new_ext)
-            gcj02_to_wgs84(file, out_fp)
-        except Exception as e:
-            print(f"[Error] {e.message}")
-            pass
-    pass
+        out_fp = osutils.get_outfp(file, out_dir, new_ext)
+        tasks.append((gcj02_to_wgs84, file, out_fp))
+
+    return run_batch(tasks, num_workers, force)
 
-#格式转换
-def format_conversion_batch(in_dir, out_dir, new_ext):
+#格式转换（批量，并行。new_ext为parquet时输出GeoParquet）
+def format_conversion_batch(in_dir, out_dir, new_ext, columns=None, num_workers=None, force=False):
+    """
+    :param columns: 只转换的属性列，None为全部
+    :param num_workers: 进程数，None为CPU核数
+    :param force: 为False时，跳过输出文件比输入文件新的文件
+    :return: 失败的文件，[(文件, 错误信息)]
+    """
     all_files = osutils.get_all_file(in_dir)
+    os.makedirs(out_dir, exist_ok=True)
 
+    tasks = []
     for file in all_files:
         if not is_gis_data(file):
             continue
 
         out_fp = osutils.get_outfp(file, out_dir, new_ext)
-        gdf = geopandas.read_file(file)
-        gdf.to_file(out_fp, encoding="utf-8")
+        tasks.append((format_conversion, file, out_fp, columns))
+
+    return run_batch(tasks, num_workers, force)
+
+#分块读取矢量数据（GeoParquet按行组读取，其他格式用GDAL的Arrow接口顺序读取，都只读一遍），每块为一个GeoDataFrame
+def iter_gis_chunks(fp, chunk_size=100000, columns=None):
+    ext = osutils.get_ext(fp)
+
+    if ext == "parquet":
+        import pyarrow.parquet
+
+        parquet_file = pyarrow.parquet.ParquetFile(fp)
+        geo = json.loads(parquet_file.schema_arrow.metadata[b"geo"])
+        geom_col = geo["primary_column"]
+        crs = geo["columns"][geom_col].get("crs", "OGC:CRS84")
+
+        read_columns = None if columns is None else list(columns) + [geom_col]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=read_columns):
+            yield _batch_to_gdf(batch, geom_col, crs)
+        return
+
+    import pyogrio.raw
+
+    kwargs = {} if columns is None else {"columns" : list(columns)}
+    with pyogrio.raw.open_arrow(fp, batch_size=chunk_size, use_pyarrow=True, **kwargs) as (meta, reader):
+        geom_col = meta["geometry_name"] or "wkb_geometry"
+        for batch in reader:
+            if batch.num_rows > 0:
+                yield _batch_to_gdf(batch, geom_col, meta["crs"])
+
+#Arrow的一批数据（几何列为WKB） => GeoDataFrame
+def _batch_to_gdf(batch, geom_col, crs):
+    geoms = shapely.from_wkb(batch.column(geom_col).to_numpy(zero_copy_only=False))
+    df = batch.drop_columns([geom_col]).to_pandas()
+    return geopandas.GeoDataFrame(df, geometry=geoms, crs=crs)
+
+#读取矢量数据的字段类型（不读取数据）
+def read_gis_schema(fp, columns=None):
+    """
+    :return: {字段: pandas dtype}（不含几何列）
+    """
+    ext = osutils.get_ext(fp)
+
+    if ext == "parquet":
+        import pyarrow.parquet
+
+        schema = pyarrow.parquet.read_schema(fp)
+        geom_col = json.loads(schema.metadata[b"geo"])["primary_column"]
+        dtypes = schema.empty_table().drop_columns([geom_col]).to_pandas().dtypes
+    else:
+        dtypes = geopandas.read_file(fp, rows=slice(0, 0)).dtypes
+        dtypes = dtypes[[name for name in dtypes.index if name != "geometry"]]
+
+    return {
+        name : dtype for name, dtype in dtypes.items()
+        if columns is None or name in columns
+    }
+
+#合并多个文件的字段类型：字段取并集，类型不一致的字段统一为字符串
+def reconcile_schema(schemas):
+    schema = {}
+    for _schema in schemas:
+        for name, dtype in _schema.items():
+            if name not in schema:
+                schema[name] = dtype
+            elif schema[name] != dtype:
+                schema[name] = numpy.dtype(object)
+    return schema
 
-#将in_dir中的矢量数据全部合并成一个文件
-def merge_dataset(in_dir, out_fp):
+#将一块数据对齐到合并后的字段类型
+def align_chunk(gdf, schema):
+    geom = gdf.geometry
+    df = pandas.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    df = df.reindex(columns=list(schema.keys()))
+
+    for name, dtype in schema.items():
+        if df[name].dtype == dtype:
+            continue
+        if dtype == object:
+            df[name] = df[name].map(lambda value: None if pandas.isna(value) else str(value)).astype(object)
+        else:
+            try:
+                df[name] = df[name].astype(dtype)
+            except (TypeError, ValueError):
+                df[name] = df[name].astype("float64")   #整型列中有空值
+
+    return geopandas.GeoDataFrame(df, geometry=geom.values, crs=gdf.crs)
+
+#字段类型（见reconcile_schema） => pyarrow的Schema（不含几何列），字符串列为string
+def arrow_schema(schema):
+    import pyarrow
+
+    fields = []
+    for name, dtype in schema.items():
+        if pandas.api.types.is_string_dtype(dtype):
+            _type = pyarrow.string()
+        else:
+            empty = pandas.DataFrame({name : pandas.Series([], dtype=dtype)})
+            _type = pyarrow.Schema.from_pandas(empty, preserve_index=False).field(name).type
+        fields.append(pyarrow.field(name, _type))
+    return pyarrow.schema(fields)
+
+#流式写出GeoParquet（每块为一个行组）
+class GeoParquetWriter:
+    """
+    :param schema: 字段类型，{字段: pandas dtype}（见reconcile_schema），每块都转为此类型
+        None为按第一块推断（第一块中全为空的列为string），之后的块转为第一块的类型
+    """
+    def __init__(self, fp, schema=None) -> None:
+        self.fp = fp
+        self.schema = None if schema is None else arrow_schema(schema)
+        self.writer = None
+
+    def write(self, gdf):
+        import pyarrow
+        import pyarrow.parquet
+
+        df = pandas.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        if self.schema is None:
+            schema = pyarrow.Schema.from_pandas(df, preserve_index=False)
+            self.schema = pyarrow.schema([
+                field.with_type(pyarrow.string()) if pyarrow.types.is_null(field.type) else field
+                for field in schema
+            ])
+
+        table = pyarrow.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        table = table.append_column("geometry", pyarrow.array(shapely.to_wkb(gdf.geometry.values), type=pyarrow.binary()))
+
+        if self.writer is None:
+            geo = {
+                "version" : "1.0.0",
+                "primary_column" : "geometry",
+                "columns" : {
+                    "geometry" : {
+                        "encoding" : "WKB",
+                        "geometry_types" : [],
+                        "crs" : None if gdf.crs is None else gdf.crs.to_json_dict()
+                    }
+                }
+            }
+            metadata = dict(table.schema.metadata or {})
+            metadata[b"geo"] = json.dumps(geo).encode("utf-8")
+            self.writer = pyarrow.parquet.ParquetWriter(self.fp, table.schema.with_metadata(metadata))
+
+        self.writer.write_table(table.replace_schema_metadata(self.writer.schema.metadata))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+#将in_dir中的矢量数据全部合并成一个文件（流式，内存占用与数据总量无关）
+def merge_dataset(in_dir, out_fp, columns=None, dedup_field=None, chunk_size=100000):
+    """
+    :param out_fp: 输出文件，后缀名为parquet时输出GeoParquet，为gpkg时输出GeoPackage（推荐，Shapefile会截断字段名且有2GB上限）
+    :param columns: 只合并的属性列，None为全部
+    :param dedup_field: 按此字段去重（如POI的id），None为不去重
+    :param chunk_size: 每次读取的要素数
+    :return: 写出的要素数
+    """
+    all_files = osutils.get_all_file(in_dir)
+    dataset = [file for file in all_files if is_gis_data(file)]
+
+    # 先读取所有文件的字段类型，得到合并后的字段
+    schema = reconcile_schema([read_gis_schema(file, columns) for file in dataset])
+
+    if os.path.exists(out_fp):
+        os.remove(out_fp)
+
+    ids = idset.IdSet() if dedup_field is not None else None
+    parquet_writer = GeoParquetWriter(out_fp, schema) if osutils.get_ext(out_fp) == "parquet" else None
+    count = 0
+    crs = None
+
+    try:
+        for i, file in enumerate(dataset, 1):
+            for gdf in iter_gis_chunks(file, chunk_size, columns):
+                gdf = align_chunk(gdf, schema)
+
+                if ids is not None:
+                    gdf = gdf[ids.add_many(gdf[dedup_field].tolist())]
+                if len(gdf) == 0:
+                    continue
+
+                # 以第一块数据的坐标系为准
+                if crs is None:
+                    crs = gdf.crs
+                elif gdf.crs != crs:
+                    gdf = gdf.set_crs(crs, allow_override=True) if gdf.crs is None else gdf.to_crs(crs)
+
+                if parquet_writer is not None:
+                    parquet_writer.write(gdf)
+                else:
+                    gdf.to_file(out_fp, encoding="utf-8", mode="w" if count == 0 else "a")
+                count += len(gdf)
+            print(f"[{i}/{len(dataset)}] {file}，已合并{count}个要素")
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    return count
+
+#要素的代表点坐标（点要素为其坐标，其他要素为其内部的一点）
+def representative_xy(geoms):
+    geoms = numpy.asarray(geoms, dtype=object)
+    x = shapely.get_x(geoms)
+    y = shapely.get_y(geoms)
+
+    not_point = numpy.flatnonzero(shapely.get_type_id(geoms) != 0)
+    if len(not_point) > 0:
+        points = shapely.point_on_surface(geoms[not_point])
+        x[not_point] = shapely.get_x(points)
+        y[not_point] = shapely.get_y(points)
+    return x, y
+
+#逆地理编码：为每个要素添加所在区域的编码（流式，不请求接口）
+def reverse_geocode(in_fp, out_fp, indexes, chunk_size=100000):
+    """
+    :param out_fp: 输出文件，后缀名为parquet、geojsonl、gpkg等可逐块写出的格式（GeoJSON不能追加写入，不支持）
+    :param indexes: {字段: 区域索引}，区域索引为common.geoindex的PolygonIndex（编码如adcode）或GridIndex（方格编号）
+        如{"district" : geoindex.PolygonIndex.from_store(store, "district"), "grid_id" : geoindex.GridIndex(rect, 10, 10)}
+    :param chunk_size: 每次读取的要素数
+    :return: 写出的要素数
+    """
+    ext = osutils.get_ext(out_fp)
+    if ext == "json":
+        raise Exception(f"GeoJSON不能逐块写出，请输出为geojsonl、gpkg或parquet：{out_fp}")
+
+    if os.path.exists(out_fp):
+        os.remove(out_fp)
+
+    parquet_writer = None
+    if ext == "parquet":
+        #输出的字段类型：输入的字段 + 各索引的编码（按空查询的结果得到类型）
+        schema = read_gis_schema(in_fp)
+        for field, index in indexes.items():
+            schema[field] = index.lookup(numpy.empty(0), numpy.empty(0)).dtype
+        parquet_writer = GeoParquetWriter(out_fp, schema)
+    count = 0
+
+    try:
+        for gdf in iter_gis_chunks(in_fp, chunk_size):
+            x, y = representative_xy(gdf.geometry.values)
+            for field, index in indexes.items():
+                gdf[field] = index.lookup(x, y)
+
+            if parquet_writer is not None:
+                parquet_writer.write(gdf)
+            else:
+                kwargs = {"driver" : "GeoJSONSeq"} if ext == "geojsonl" else {}
+                gdf.to_file(out_fp, encoding="utf-8", mode="w" if count == 0 else "a", **kwargs)
+            count += len(gdf)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+    return count
+
+#逆地理编码（批量，并行）
+def reverse_geocode_batch(in_dir, out_dir, indexes, new_ext=None, chunk_size=100000, num_workers=None, force=False):
+    """
+    :param indexes: {字段: 区域索引}，见reverse_geocode
+    :param new_ext: 输出的后缀名，None为与输入相同（GeoJSON输入则输出为geojsonl，见reverse_geocode）
+    :param num_workers: 进程数，None为CPU核数
+    :param force: 为False时，跳过输出文件比输入文件新的文件
+    :return: 失败的文件，[(文件, 错误信息)]
+    """
     all_files = osutils.get_all_file(in_dir)
-    dataset = []
+    os.makedirs(out_dir, exist_ok=True)
 
+    tasks = []
     for file in all_files:
-        if is_gis_data(file):
-            dataset.append(file)
+        if not is_gis_data(file):
+            continue
+
+        ext = new_ext
+        if ext is None and osutils.get_ext(file) == "json":
+            ext = "geojsonl"
+        out_fp = osutils.get_outfp(file, out_dir, ext)
+        tasks.append((reverse_geocode, file, out_fp, indexes, chunk_size))
 
-    gdf = pandas.concat([
-        geopandas.read_file(file) for file in dataset
-    ]).pipe(geopandas.GeoDataFrame)
-    gdf.to_file(out_fp)
-    pass
+    return run_batch(tasks, num_workers, force)
 
 if __name__ == '__main__':
     in_dir = r"E:\python\DownloadGeoData\上海_gcj02"
     out_dir = r"E:\python\DownloadGeoData\上海_wgs84"
     gcj02_to_wgs84_batch(in_dir, out_dir)
-    merge_dataset(in_dir, out_dir + r"\merge.shp")
+    merge_dataset(in_dir, out_dir + r"\merge.gpkg", dedup_field="id")
     pass
\ No newline at end of file
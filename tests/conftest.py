@@ -0,0 +1,80 @@
+"""
+@Author  : geodoer
+@Time    :  2026/10/18
+@Email   : geodoer@163.com
+@Func    : 测试的公共夹具
+@Desc    :
+    1. 模拟的高德接口（见benchmarks.mockserver）在后台线程中运行，AMapPOIAPI、AMapRegionAPI的URL指向它
+    2. 每个测试的工作目录为临时文件夹（限额器存档、输出不写入工程）
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import mockserver
+
+#模拟城市的范围（与mockserver.MockAMap的默认值相同）
+EXTENT = (121.0, 122.0, 31.0, 32.0)
+
+TYPENAMECODES = [
+    ["餐饮服务", "050000"],
+    ["购物服务", "060000"],
+]
+
+KEYS = [f"test-key-{i:02d}" for i in range(8)]
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture(scope="session")
+def mock_server():
+    server = mockserver.MockAMapServer(latency=0.0, density=1500, seed=0).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def mock_url(mock_server, monkeypatch):
+    from amap_api import poi
+    from amap_api import region
+
+    monkeypatch.setattr(poi.AMapPOIAPI, "URL", mock_server.url + mockserver.POLYGON_PATH)
+    monkeypatch.setattr(region.AMapRegionAPI, "URL", mock_server.url + mockserver.DISTRICT_PATH)
+    return mock_server.url
+
+def create_poi_api(out_dir, **kwargs):
+    """下载模拟城市的POI（2x2网格、自适应划分），kwargs覆盖默认参数
+    """
+    from amap_api import poi
+
+    options = dict(
+        save_field = ["id", "name", "typecode"],
+        out_dir = str(out_dir),
+        num_row = 2,
+        num_col = 2,
+        num_per_save = 200,
+        adaptive = True,
+        num_workers = 4,
+        out_format = "geojsonl",
+        rect = EXTENT,
+    )
+    options.update(kwargs)
+    return poi.AMapPOIAPI(KEYS, "上海", TYPENAMECODES, **options)
+
+def read_output(out_dir):
+    """读取输出文件夹中的所有POI（GeoDataFrame）
+    """
+    import pandas
+    from others import post_processing
+
+    files = sorted(
+        file for file in post_processing.osutils.get_all_file(str(out_dir))
+        if post_processing.is_gis_data(file)
+    )
+    return pandas.concat([post_processing.read_gis(file) for file in files], ignore_index=True)
@@ -0,0 +1,42 @@
+import json
+import urllib.request
+
+from benchmarks import mockserver
+from conftest import KEYS, TYPENAMECODES, read_output
+
+def district_requests(url):
+    with urllib.request.urlopen(url + mockserver.STATS_PATH, timeout=10) as response:
+        return json.loads(response.read())["requests"].get(mockserver.DISTRICT_PATH, 0)
+
+def create_batch(out_dir, **kwargs):
+    from amap_api import batch
+
+    return batch.AMapPOIBatch(KEYS, ["上海"]
+        , out_dir = str(out_dir)
+        , num_workers = 4
+        , typenamecodes = TYPENAMECODES
+        , save_field = ["id", "name"]
+        , num_row = 2
+        , num_col = 2
+        , out_format = "geojsonl"
+        , clip = True
+        , **kwargs
+    )
+
+def test_batch_saves_boundaries_and_metrics(mock_url, workdir):
+    out_dir = workdir / "batch"
+    before = district_requests(mock_url)
+    create_batch(out_dir, metrics_log=str(workdir / "metrics.jsonl")).start()
+    assert district_requests(mock_url) > before
+    assert (out_dir / "boundary.geodoer.sqlite").exists()
+
+    lines = (workdir / "metrics.jsonl").read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["counters"]["requests_total"] > 0
+
+    #重新运行：边界从本地读取，不再请求行政区接口
+    before = district_requests(mock_url)
+    create_batch(out_dir).start()
+    assert district_requests(mock_url) == before
+
+    pois = read_output(out_dir / "上海")
+    assert len(pois) == pois["id"].nunique() > 0
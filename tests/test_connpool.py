@@ -0,0 +1,57 @@
+import json
+import base64
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from benchmarks import mockserver
+from common import connpool
+
+@pytest.fixture
+def http_proxy():
+    """转发HTTP请求的代理，记录收到的请求行与认证头
+    """
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            seen.append((self.path, self.headers.get("Proxy-Authorization")))
+            opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+            with opener.open(self.path, timeout=10) as response:
+                body = response.read()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"127.0.0.1:{server.server_address[1]}", seen
+    server.shutdown()
+    server.server_close()
+
+def test_request_through_http_proxy(mock_server, http_proxy, monkeypatch):
+    address, seen = http_proxy
+    monkeypatch.setenv("HTTP_PROXY", f"http://user:p%40ss@{address}")
+    monkeypatch.delenv("NO_PROXY", raising=False)
+    monkeypatch.delenv("no_proxy", raising=False)
+
+    url = mock_server.url + mockserver.STATS_PATH
+    data, _ = connpool.ConnectionPool().request(url)
+    assert "requests" in json.loads(data)
+    assert seen == [(url, "Basic " + base64.b64encode(b"user:p@ss").decode("ascii"))]
+
+def test_no_proxy_bypasses_proxy(mock_server, http_proxy, monkeypatch):
+    address, seen = http_proxy
+    monkeypatch.setenv("HTTP_PROXY", f"http://{address}")
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+
+    connpool.ConnectionPool().request(mock_server.url + mockserver.STATS_PATH)
+    assert seen == []
@@ -0,0 +1,20 @@
+import numpy
+
+from common import gcj02utils
+
+def test_array_matches_scalar():
+    rng = numpy.random.default_rng(0)
+    lng = numpy.r_[rng.uniform(72.0, 138.0, 20000), [0.0, 150.0, 100.0]]
+    lat = numpy.r_[rng.uniform(0.8, 56.0, 20000), [0.0, 30.0, 60.0]]   #最后3个在国外
+
+    for array_func, scalar_func in (
+        (gcj02utils.gcj02towgs84_array, gcj02utils.gcj02towgs84),
+        (gcj02utils.wgs84togcj02_array, gcj02utils.wgs84togcj02),
+    ):
+        out_lng, out_lat = array_func(lng, lat)
+        expected = numpy.array([scalar_func(x, y) for x, y in zip(lng.tolist(), lat.tolist())])
+        #逐位一致
+        assert numpy.array_equal(out_lng, expected[:, 0])
+        assert numpy.array_equal(out_lat, expected[:, 1])
+
+    assert gcj02utils.gcj02towgs84_array(lng[-3:], lat[-3:])[0].tolist() == lng[-3:].tolist()
@@ -0,0 +1,41 @@
+import numpy
+import shapely
+
+from common import geoindex
+
+def brute_force(geometries, x, y):
+    """逐个多边形判断，取面积最小的
+    """
+    result = numpy.full(len(x), -1, dtype=numpy.int64)
+    for j in range(len(x)):
+        best = numpy.inf
+        for i, geometry in enumerate(geometries):
+            if geometry.contains(shapely.Point(x[j], y[j])) and geometry.area < best:
+                result[j] = i
+                best = geometry.area
+    return result
+
+def test_polygon_index_matches_brute_force():
+    rng = numpy.random.default_rng(0)
+    geometries = []
+    for _ in range(30):     #重叠、嵌套的多边形
+        cx, cy = rng.uniform(0, 10, 2)
+        geometries.append(shapely.Point(cx, cy).buffer(rng.uniform(0.3, 3.0), 8))
+    geometries.append(shapely.MultiPolygon([shapely.box(-1, -1, 0.5, 0.5), shapely.box(9.5, 9.5, 11, 11)]))
+    geometries.append(shapely.box(2, 2, 8, 8).difference(shapely.box(4, 4, 6, 6)))    #有洞
+
+    x = rng.uniform(-2, 12, 3000)
+    y = rng.uniform(-2, 12, 3000)
+    x[:2] = numpy.nan   #无效坐标
+
+    index = geoindex.PolygonIndex([f"code-{i}" for i in range(len(geometries))], geometries)
+    expected = brute_force(geometries, x, y)
+    assert numpy.array_equal(index.lookup_index(x, y), expected)
+
+    codes = index.lookup(x, y)
+    assert all(code is None if i < 0 else code == f"code-{i}" for code, i in zip(codes, expected))
+
+def test_grid_index():
+    index = geoindex.GridIndex([0, 10, 0, 5], 10, 5)
+    codes = index.lookup([0.5, 9.5, 10, 0.5, -1, 5.5], [0.5, 0.5, 5, 4.5, 1, 2.5])
+    assert codes.tolist() == [0, 9, 49, 40, -1, 25]
@@ -0,0 +1,82 @@
+import time
+import threading
+
+from common import limiter
+
+def acquire_times(acquire, num_threads, num_per_thread):
+    """多个线程同时获取份额，返回每次获得份额的时间
+    """
+    times = []
+    lock = threading.Lock()
+
+    def run():
+        for _ in range(num_per_thread):
+            result = acquire()
+            with lock:
+                times.append((time.time(), result))
+
+    threads = [threading.Thread(target=run) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(times)
+
+def max_in_window(times, time_range):
+    """任意time_range时间内的最多次数（时间在获得份额之后才记录，窗口留出20ms的误差）
+    """
+    time_range -= 0.02
+    most = 0
+    start = 0
+    for end in range(len(times)):
+        while times[end] - times[start] >= time_range:
+            start += 1
+        most = max(most, end - start + 1)
+    return most
+
+def test_sliding_window_limit():
+    rule = limiter.RequestLimitsRule(10, 0.5)
+    requests = limiter.RequestLimiter("test-window", rule)
+    times = [t for t, _ in acquire_times(requests.wait, 8, 5)]
+
+    assert max_in_window(times, 0.5) <= 10
+    assert times[-1] - times[0] >= 1.5 - 0.05    #40次 = 10次 + 3个窗口
+
+def test_token_bucket_rate():
+    rule = limiter.RequestLimitsRule(20, 1, burst=2)
+    requests = limiter.RequestLimiter("test-bucket", rule)
+    times = [t for t, _ in acquire_times(requests.wait, 4, 8)]
+
+    #前2次为突发，之后按20次/秒匀速发出
+    assert times[-1] - times[0] >= (32 - 2) / 20 - 0.05
+    assert max_in_window(times, 0.25) <= 2 + 0.25 * 20 + 1
+
+def test_key_pool_limits_each_key():
+    keys = ["key-000001", "key-000002", "key-000003"]
+    pool = limiter.KeyPool("test-pool", keys, limiter.RequestLimitsRule(10, 0.5))
+    result = acquire_times(pool.acquire, 8, 9)
+
+    assert max_in_window([t for t, _ in result], 0.5) <= 30
+    for key in keys:
+        times = [t for t, used in result if used == key]
+        assert len(times) > 0
+        assert max_in_window(times, 0.5) <= 10
+
+def test_keys_with_same_suffix_have_separate_journals():
+    keys = ["aaaa-123456", "bbbb-123456"]
+    pool = limiter.KeyPool("test-suffix", keys, limiter.RequestLimitsRule(10, 60))
+    for _ in range(3):
+        pool.limiters[keys[0]].wait()
+    del pool
+
+    #重新创建：由存档恢复，每个Key只恢复自己的请求
+    pool = limiter.KeyPool("test-suffix", keys, limiter.RequestLimitsRule(10, 60))
+    assert pool.usage() == {keys[0] : (3, 10, False), keys[1] : (0, 10, False)}
+
+def test_agent_with_keys_has_no_limiter_journal(workdir):
+    from common import urllibagent
+
+    agent = urllibagent.UrllibAgent("test-agent", limiter.RequestLimitsRule(10, 60), keys=["key-000001"])
+    assert agent.rules == []
+    assert len(agent.key_pool.limiters["key-000001"].rules) == 1
+    assert not (workdir / "cache-UrllibAgent-test-agent.jsonl").exists()
@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+import subprocess
+
+import pytest
+
+from conftest import create_poi_api, read_output
+
+@pytest.mark.parametrize("out_format", ["geojsonl", "parquet"])
+def test_new_job_replaces_previous_output(mock_url, workdir, out_format):
+    """同一城市重新下载（不恢复进度）：删除上次的输出，而不是追加到其后
+    """
+    out_dir = workdir / "poi"
+    create_poi_api(out_dir, out_format=out_format).start()
+    first = read_output(out_dir)
+    assert len(first) == first["id"].nunique() > 0
+
+    create_poi_api(out_dir, out_format=out_format, load_cache=False).start()
+    second = read_output(out_dir)
+    assert len(second) == second["id"].nunique() == len(first)
+
+#子进程：下载，after次请求之后直接退出（模拟崩溃，不保存、不关闭文件）
+CRASH_SCRIPT = """
+import os
+import sys
+sys.path.insert(0, {tests!r})
+from conftest import create_poi_api
+from amap_api import poi
+from common import urllibagent
+
+poi.AMapPOIAPI.URL = {url!r}
+poi.AMapPOIAPI.PART_ROWS = {part_rows!r}
+
+request = urllibagent.UrllibAgent.request
+count = [0]
+def crash(self, *args, **kwargs):
+    count[0] += 1
+    if count[0] > {after!r}:
+        os._exit(3)
+    return request(self, *args, **kwargs)
+urllibagent.UrllibAgent.request = crash
+
+create_poi_api({out_dir!r}, out_format={out_format!r}).start()
+"""
+
+@pytest.mark.parametrize("out_format", ["geojsonl", "parquet"])
+def test_resume_after_crash(mock_url, workdir, monkeypatch, out_format):
+    """多次崩溃后恢复进度：结果与一次下载完成的相同（没有重复、没有遗漏）
+    """
+    from amap_api import poi
+
+    monkeypatch.setattr(poi.AMapPOIAPI, "PART_ROWS", 300)
+    create_poi_api(workdir / "full", out_format=out_format).start()
+    full = read_output(workdir / "full")
+
+    out_dir = workdir / "crash"
+    for after in (25, 30):
+        script = CRASH_SCRIPT.format(
+            tests=os.path.dirname(os.path.abspath(__file__)), url=poi.AMapPOIAPI.URL,
+            part_rows=300, after=after, out_dir=str(out_dir), out_format=out_format
+        )
+        process = subprocess.run([sys.executable, "-c", script], cwd=str(workdir), capture_output=True)
+        assert process.returncode == 3, process.stderr.decode("utf-8", "replace")
+
+    api = create_poi_api(out_dir, out_format=out_format)
+    assert api.state["poi_count"] > 0   #已恢复进度
+    api.start()
+    resumed = read_output(out_dir)
+    assert len(resumed) == resumed["id"].nunique() == full["id"].nunique()
+    assert set(resumed["id"]) == set(full["id"])
+
+def test_queue_mode_completes(mock_url, workdir):
+    """任务队列：两个worker并发领取任务，所有任务完成，合并去重后与进度日志模式的结果相同
+    """
+    from common import workqueue
+    from others import post_processing
+
+    create_poi_api(workdir / "journal").start()
+    expected = read_output(workdir / "journal")
+
+    queue = str(workdir / "queue.sqlite")
+    create_poi_api(workdir / "queue", queue=queue).expand()
+    workers = [create_poi_api(workdir / "queue", queue=queue) for _ in range(2)]
+    threads = [
+        threading.Thread(target=worker.run_worker, args=(f"w{i}", 0.05))
+        for i, worker in enumerate(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    counts = workqueue.WorkQueue(queue).counts()
+    assert counts[workqueue.FAILED] == 0
+    assert counts[workqueue.DONE] == sum(counts.values())
+
+    merged = post_processing.merge_dataset(str(workdir / "queue"), str(workdir / "merged.parquet"), dedup_field="id")
+    assert merged == expected["id"].nunique()
@@ -0,0 +1,24 @@
+import shapely
+
+from common import gcj02utils
+from others import post_processing
+
+def test_gcj02_to_wgs84_geometry_keeps_z():
+    geoms = [
+        shapely.Point(121.5, 31.2),
+        shapely.LineString([(121.5, 31.2, 10.0), (121.6, 31.3, 20.0)]),
+        None,
+        shapely.Polygon([(121.0, 31.0), (121.1, 31.0), (121.1, 31.1)]),
+    ]
+    result = post_processing.gcj02_to_wgs84_geometry(geoms)
+
+    assert result[2] is None
+    assert shapely.has_z(result).tolist() == [False, True, False, False]
+    for before, after in zip(geoms, result):
+        if before is None:
+            continue
+        expected = [
+            (*gcj02utils.gcj02towgs84(x, y), *rest)
+            for x, y, *rest in shapely.get_coordinates(before, include_z=shapely.has_z(before)).tolist()
+        ]
+        assert shapely.get_coordinates(after, include_z=shapely.has_z(after)).tolist() == [list(c) for c in expected]
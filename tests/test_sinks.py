@@ -0,0 +1,55 @@
+import os
+
+from common import sinks
+
+def write_points(sink, n, start=0):
+    ids = [str(i) for i in range(start, start + n)]
+    sink.write({"id" : ids}, [(121.0 + i * 1e-4, 31.0) for i in range(n)])
+
+def test_parquet_rollback_only_removes_files_it_opened(tmp_path):
+    fp = str(tmp_path / "city.parquet")
+    other = sinks.GeoParquetSink(fp)    #其他任务的输出
+    write_points(other, 5)
+    other.close()
+
+    opened = []
+    sink = sinks.GeoParquetSink(fp, part_rows=10, on_open=opened.append)
+    mark = sink.mark()
+    write_points(sink, 10)      #达到part_rows，关闭此文件
+    write_points(sink, 5, 10)
+    assert opened == sink.files and len(opened) == 2
+
+    #崩溃后重启：由记录的新建文件回滚
+    resumed = sinks.GeoParquetSink(fp, part_rows=10)
+    resumed.files = opened
+    resumed.rollback(mark)
+    assert os.path.exists(fp)
+    assert not any(os.path.exists(file) for file in opened)
+
+def test_parquet_repair_only_checks_files_it_opened(tmp_path):
+    fp = str(tmp_path / "city.parquet")
+    with open(fp, "wb") as f:   #不是此任务新建的文件，即使不完整也不删除
+        f.write(b"PAR1")
+
+    sink = sinks.GeoParquetSink(fp, part_rows=10)
+    write_points(sink, 10)
+    write_points(sink, 5, 10)
+    sink.close()
+    complete, torn = sink.files
+    with open(torn, "rb+") as f:    #模拟崩溃：第二个文件没有文件尾
+        f.truncate(os.path.getsize(torn) - 8)
+
+    resumed = sinks.GeoParquetSink(fp, part_rows=10)
+    resumed.files = [complete, torn]
+    assert resumed.repair() == [torn]
+    assert resumed.files == [complete]
+    assert os.path.exists(fp)
+
+def test_reset_removes_previous_output(tmp_path):
+    for sink in (sinks.GeoJSONSeqSink(str(tmp_path / "city.geojsonl")), sinks.GeoParquetSink(str(tmp_path / "city.parquet"), part_rows=10)):
+        write_points(sink, 10)
+        write_points(sink, 5, 10)
+        sink.close()
+        sink.reset()
+        assert os.listdir(tmp_path) == []
+        assert sink.count == 0